@@ -7,6 +7,31 @@ import { Progress } from '@/components/ui/progress'
 import { Upload, Camera, Loader2, AlertTriangle, Info, X } from 'lucide-react'
 import '../App.css'
 
+// Bytes per upload request, and attempts per chunk before giving up
+const UPLOAD_CHUNK_SIZE = 1024 * 1024
+const UPLOAD_RETRIES = 5
+// Longest side of the preview sent for the quality check
+const QUALITY_PREVIEW_SIZE = 1024
+
+const API_URL = 'http://localhost:5000/api/analysis/images'
+
+const authHeaders = () => {
+  const token = localStorage.getItem('accessToken')
+  return token ? { 'Authorization': `Bearer ${token}` } : {}
+}
+
+// Downscaled JPEG copy of the photo: the quality check does not need the full image
+const makePreview = async (file) => {
+  const bitmap = await createImageBitmap(file)
+  const scale = Math.min(1, QUALITY_PREVIEW_SIZE / Math.max(bitmap.width, bitmap.height))
+  const canvas = document.createElement('canvas')
+  canvas.width = Math.round(bitmap.width * scale)
+  canvas.height = Math.round(bitmap.height * scale)
+  canvas.getContext('2d').drawImage(bitmap, 0, 0, canvas.width, canvas.height)
+  bitmap.close()
+  return new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.85))
+}
+
 const ImageAnalyzer = ({ language }) => {
   const [selectedImage, setSelectedImage] = useState(null)
   const [imagePreview, setImagePreview] = useState(null)
@@ -33,6 +58,7 @@ const ImageAnalyzer = ({ language }) => {
       disclaimerText: 'This analysis is for informational purposes only and does not replace professional medical advice. Please consult with a dermatologist for proper diagnosis and treatment.',
       noImage: 'Please upload an image to analyze.',
       analysisError: 'Failed to analyze image. Please try again.',
+      lowQuality: 'The image quality is too low for analysis. Please take another photo.',
       invalidFile: 'Please upload a valid image file (JPG, PNG, or WebP).',
       removeImage: 'Remove Image',
       quality: 'Quality',
@@ -40,7 +66,7 @@ const ImageAnalyzer = ({ language }) => {
       probability: 'Probability',
       risk: 'Risk Level',
       uploadInstructions: 'Drag and drop an image here, or click to select',
-      supportedFormats: 'Supported formats: JPG, PNG, WebP (max 10MB)'
+      supportedFormats: 'Supported formats: JPG, PNG, WebP (max 20MB)'
     },
     ar: {
       title: 'تحليل الحالات الجلدية',
@@ -59,6 +85,7 @@ const ImageAnalyzer = ({ language }) => {
       disclaimerText: 'هذا التحليل لأغراض إعلامية فقط ولا يحل محل المشورة الطبية المهنية. يرجى استشارة طبيب الأمراض الجلدية للحصول على التشخيص والعلاج المناسب.',
       noImage: 'يرجى رفع صورة للتحليل.',
       analysisError: 'فشل في تحليل الصورة. يرجى المحاولة مرة أخرى.',
+      lowQuality: 'جودة الصورة منخفضة جداً للتحليل. يرجى التقاط صورة أخرى.',
       invalidFile: 'يرجى رفع ملف صورة صالح (JPG, PNG, أو WebP).',
       removeImage: 'إزالة الصورة',
       quality: 'الجودة',
@@ -66,7 +93,7 @@ const ImageAnalyzer = ({ language }) => {
       probability: 'الاحتمالية',
       risk: 'مستوى المخاطر',
       uploadInstructions: 'اسحب وأفلت صورة هنا، أو انقر للاختيار',
-      supportedFormats: 'الصيغ المدعومة: JPG, PNG, WebP (حد أقصى 10 ميجابايت)'
+      supportedFormats: 'الصيغ المدعومة: JPG, PNG, WebP (حد أقصى 20 ميجابايت)'
     }
   }
 
@@ -85,9 +112,9 @@ const ImageAnalyzer = ({ language }) => {
       return
     }
 
-    // Validate file size (10MB max)
-    if (file.size > 10 * 1024 * 1024) {
-      setError('File size must be less than 10MB')
+    // Validate file size (20MB max, the server limit)
+    if (file.size > 20 * 1024 * 1024) {
+      setError('File size must be less than 20MB')
       return
     }
 
@@ -124,6 +151,76 @@ const ImageAnalyzer = ({ language }) => {
     }
   }
 
+  // Resumable upload: the image is sent in chunks, and a chunk that fails (e.g. a
+  // dropped mobile connection) is retried from the offset the server reports
+  const uploadImage = async (file) => {
+    const baseUrl = `${API_URL}/uploads`
+    const headers = authHeaders()
+
+    const created = await fetch(baseUrl, {
+      method: 'POST',
+      headers: { ...headers, 'Content-Type': 'application/json' },
+      body: JSON.stringify({ length: file.size, filename: file.name, metadata: { language } })
+    })
+    if (!created.ok) {
+      throw new Error('Upload failed')
+    }
+    const { uploadId } = (await created.json()).data
+    const uploadUrl = `${baseUrl}/${uploadId}`
+
+    let offset = 0
+    let failures = 0
+    while (offset < file.size) {
+      try {
+        const response = await fetch(uploadUrl, {
+          method: 'PATCH',
+          headers: {
+            ...headers,
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': String(offset)
+          },
+          body: file.slice(offset, offset + UPLOAD_CHUNK_SIZE)
+        })
+        if (!response.ok && response.status !== 409) {
+          throw new Error('Chunk upload failed')
+        }
+        offset = Number(response.headers.get('Upload-Offset'))
+        failures = 0
+      } catch (err) {
+        if (++failures > UPLOAD_RETRIES) {
+          throw err
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * failures))
+        const status = await fetch(uploadUrl, { method: 'HEAD', headers })
+        if (status.ok) {
+          offset = Number(status.headers.get('Upload-Offset'))
+        }
+      }
+    }
+
+    const completed = await fetch(`${uploadUrl}/complete`, { method: 'POST', headers })
+    if (!completed.ok) {
+      throw new Error('Upload failed')
+    }
+    return (await completed.json()).data
+  }
+
+  // Quick server-side check of a preview, so unusable photos are retaken before uploading
+  const checkQuality = async (file) => {
+    const form = new FormData()
+    form.append('image', await makePreview(file), 'preview.jpg')
+    form.append('language', language)
+    const response = await fetch(`${API_URL}/quality-check`, {
+      method: 'POST',
+      headers: authHeaders(),
+      body: form
+    })
+    if (!response.ok) {
+      throw new Error('Quality check failed')
+    }
+    return (await response.json()).data
+  }
+
   const analyzeImage = async () => {
     if (!selectedImage) {
       setError(text[language].noImage)
@@ -135,16 +232,21 @@ const ImageAnalyzer = ({ language }) => {
     setResults(null)
 
     try {
-      // Mock analysis - replace with actual backend call
-      await new Promise(resolve => setTimeout(resolve, 3000))
+      const quality = await checkQuality(selectedImage)
+      if (!quality.minimumQualityMet) {
+        setError([text[language].lowQuality, ...quality.recommendations].join(' '))
+        return
+      }
+      
+      await uploadImage(selectedImage)
       
-      // Mock results
+      // Mock results - replace once the analysis of uploaded images is available
       const mockResults = {
         imageQuality: {
-          overall: 'good',
-          sharpness: 85,
-          lighting: 78,
-          resolution: 92
+          overall: quality.acceptable ? 'good' : 'fair',
+          sharpness: Math.round(quality.qualityFactors.sharpness * 100),
+          lighting: Math.round(quality.qualityFactors.lighting * 100),
+          resolution: Math.round(quality.qualityFactors.resolution * 100)
         },
         skinConditionAnalysis: {
           primaryCondition: 'Acne Vulgaris',
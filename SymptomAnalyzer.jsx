@@ -64,33 +64,68 @@ const SymptomAnalyzer = ({ language }) => {
     setError(null)
     setResults(null)
 
+    const token = localStorage.getItem('accessToken')
     try {
-      // Mock API call - replace with actual backend call
-      const response = await fetch('http://localhost:5000/api/analysis/symptoms', {
+      if (token) {
+        // Signed in: the authenticated endpoint saves the analysis to the user's history
+        const response = await fetch('http://localhost:5000/api/analysis/symptoms', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${token}`
+          },
+          body: JSON.stringify({
+            symptoms: symptoms,
+            language: language,
+            additionalInfo: {}
+          })
+        })
+        const data = await response.json()
+        if (!response.ok || !data.success) {
+          throw new Error(data.error?.message || 'Analysis failed')
+        }
+        setResults(data.data)
+        return
+      }
+
+      // Streamed analysis: each server-sent event adds one part of the results
+      // (symptoms, then red flags, diagnoses and recommendations) as soon as it is ready
+      const response = await fetch('http://localhost:5000/api/analysis/analyze/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          // Add authorization header when implementing auth
+          'Accept': 'text/event-stream'
         },
         body: JSON.stringify({
           symptoms: symptoms,
-          language: language,
-          additionalInfo: {}
+          language: language
         })
       })
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Analysis failed')
       }
 
-      const data = await response.json()
-      
-      if (data.success) {
-        setResults(data.data)
-      } else {
-        throw new Error(data.error?.message || 'Analysis failed')
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+      let buffer = ''
+      for (;;) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += value
+        const events = buffer.split('\n\n')
+        buffer = events.pop()
+        for (const block of events) {
+          const lines = block.split('\n')
+          const event = lines.find((line) => line.startsWith('event: '))?.slice(7)
+          const data = JSON.parse(lines.filter((line) => line.startsWith('data: ')).map((line) => line.slice(6)).join('\n'))
+          if (event === 'error') {
+            throw new Error(data.error?.message || 'Analysis failed')
+          }
+          setResults((previous) => ({ ...previous, ...data }))
+        }
       }
     } catch (err) {
+      setResults(null)
       setError(text[language].analysisError)
       console.error('Analysis error:', err)
     } finally {
@@ -0,0 +1,216 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.services.text_normalizer import normalize_text
+from src.services.response_fragments import FRAGMENT_TYPES
+
+CacheKey = Tuple[str, str, str]
+
+
+class AnalysisCache:
+    """Bounded LRU + TTL cache of symptom analysis results.
+
+    Keys combine the normalized input text, the language and the fingerprint of the
+    knowledge base that produced the result. When a result for a new fingerprint is
+    stored, entries of the previous knowledge base are dropped, so cached analyses
+    never outlive a knowledge base change. The cache is bounded both by entry count
+    and by an estimate of the memory held by the cached payloads.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, Dict[str, Any], int]]' = OrderedDict()
+        self._bytes = 0
+        self._fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> 'AnalysisCache':
+        """Configure from ANALYSIS_CACHE_MAX_ENTRIES / _MAX_BYTES / _TTL"""
+        return cls(
+            max_entries=int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 10000)),
+            max_bytes=int(os.environ.get('ANALYSIS_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+            ttl=float(os.environ.get('ANALYSIS_CACHE_TTL', 300))
+        )
+
+    @staticmethod
+    def make_key(text: str, language: str, fingerprint: str) -> CacheKey:
+        """Cache key for an input: exactly the normalized text the matchers see, so
+        inputs differing only in case, whitespace or Arabic orthographic variants share
+        an entry only because they are analyzed identically"""
+        return normalize_text(text), language, fingerprint
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """Return a cached result with a fresh timestamp, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, result, size = entry
+            if expires_at <= time.monotonic():
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        # Cached payloads are never mutated; the shallow copy only replaces the timestamp
+        return {**result, 'timestamp': datetime.now().isoformat()}
+
+    def put(self, key: CacheKey, result: Dict[str, Any]) -> None:
+        """Store a result, evicting least recently used entries beyond the limits"""
+        size = _estimate_size(key) + _estimate_size(result)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            fingerprint = key[2]
+            if fingerprint != self._fingerprint:
+                # Knowledge base changed: results computed with the old one are stale
+                self.evictions += len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                self._fingerprint = fingerprint
+
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (time.monotonic() + self.ttl, result, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key, (_, _, oldest_size) = next(iter(self._entries.items()))
+                self._remove(oldest_key, oldest_size)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxEntries': self.max_entries,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def _remove(self, key: CacheKey, size: int) -> None:
+        del self._entries[key]
+        self._bytes -= size
+
+
+class _Flight:
+    """One in-flight computation and the outcome its waiters receive"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces concurrent identical computations.
+
+    The first caller for a key (the leader) runs the computation; callers arriving
+    with the same key while it runs wait for it and receive the same result (or
+    exception) instead of computing it again. Nothing is kept once the computation
+    finishes: completed results are the AnalysisCache's job.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Any, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def do(self, key: Any, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (compute() result, whether it was shared from another caller)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = compute()
+        except BaseException as error:
+            flight.error = error
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.leaders + self.coalesced
+            return {
+                'inFlight': len(self._flights),
+                'computed': self.leaders,
+                'coalesced': self.coalesced,
+                'coalescedRate': round(self.coalesced / requests, 4) if requests else 0.0,
+                'failures': self.failures
+            }
+
+
+def _estimate_size(value: Any, seen: Optional[set] = None) -> int:
+    """Approximate memory held by a JSON-like value (containers and their contents)"""
+    if seen is None:
+        seen = set()
+    if id(value) in seen or isinstance(value, FRAGMENT_TYPES):
+        # Prebuilt fragments are shared by every result, not held by the entry
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += _estimate_size(key, seen) + _estimate_size(item, seen)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += _estimate_size(item, seen)
+    return size
+
+
+# Process-wide cache used by the public analysis endpoint
+result_cache = AnalysisCache.from_env()
+
+# Identical analyses in progress on the public analysis endpoint (keyed like the cache)
+inflight_analyses = SingleFlight()
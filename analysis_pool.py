@@ -0,0 +1,185 @@
+"""Optional process-pool backend for symptom analysis.
+
+analyze_symptoms is pure Python: within one threaded worker, concurrent analyses
+take turns on the GIL, so a large knowledge base caps a worker at one core.
+AnalysisPool runs the CPU-heavy part (keyword matching and condition scoring) in
+a pool of processes instead:
+
+- every pool process loads the knowledge base once, when it starts (the pool is
+  warmed up by start(), so the first requests do not pay for it),
+- only compact values cross the process boundary: the input texts on the way
+  in, and per text the matched symptom ids and scored condition ids on the way
+  out (SymptomAnalyzer.analyze_compact_many); the caller's analyzer renders them
+  into the full, localized result,
+- a result produced with another knowledge base (the caller reloaded it), a
+  failed chunk or a broken pool fall back to analyzing in the calling thread; the
+  pool is then restarted so its processes load the current knowledge base.
+
+Processes are started with the 'forkserver' method where available, so they are
+not forked from a multi-threaded server process; the fork server preloads this
+module. As with any spawn/forkserver process, the script that started the server
+is imported again (as __mp_main__) in each pool process; main.py skips its
+start-up tasks there.
+
+Disabled unless ANALYSIS_PROCESSES is set to the number of processes.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from src.services.knowledge_base import load_knowledge_base
+from src.services.symptom_analyzer import CompactAnalysis, SymptomAnalyzer
+
+# Analyzer of the current pool process (set by _initialize_process)
+_process_analyzer: Optional[SymptomAnalyzer] = None
+
+
+def _initialize_process(source_path: Optional[str], artifact_path: Optional[str], scoring_engine: str) -> None:
+    global _process_analyzer
+    _process_analyzer = SymptomAnalyzer(load_knowledge_base(source_path, artifact_path), scoring_engine)
+
+
+def _fingerprint() -> str:
+    """Warm-up task: returns once the process has loaded its knowledge base"""
+    return _process_analyzer.knowledge_base.fingerprint
+
+
+def _analyze_chunk(texts: List[str]) -> List[Optional[CompactAnalysis]]:
+    return _process_analyzer.analyze_compact_many(texts)
+
+
+class AnalysisPool:
+    """Dispatches symptom analyses to a pool of pre-warmed processes"""
+
+    def __init__(self, processes: int = 0, chunk_size: int = 32, start_method: Optional[str] = None,
+                 source_path: Optional[str] = None, artifact_path: Optional[str] = None,
+                 scoring_engine: str = 'index'):
+        self.processes = processes
+        self.chunk_size = chunk_size
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.start_method = start_method
+        self.source_path = source_path
+        self.artifact_path = artifact_path
+        self.scoring_engine = scoring_engine
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # Knowledge base fingerprint the pool was last restarted for
+        self._restarted_for: Optional[str] = None
+        self.fallbacks = 0
+        self.restarts = 0
+
+    @classmethod
+    def from_env(cls) -> 'AnalysisPool':
+        """Configure from ANALYSIS_PROCESSES / ANALYSIS_PROCESS_CHUNK_SIZE / ANALYSIS_PROCESS_START_METHOD"""
+        return cls(
+            processes=int(os.environ.get('ANALYSIS_PROCESSES', 0)),
+            chunk_size=int(os.environ.get('ANALYSIS_PROCESS_CHUNK_SIZE', 32)),
+            start_method=os.environ.get('ANALYSIS_PROCESS_START_METHOD') or None,
+            scoring_engine=os.environ.get('SYMPTOM_SCORING_ENGINE', 'index')
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def start(self) -> None:
+        """Start the processes and wait until each has loaded the knowledge base"""
+        self._get_executor()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        executor = self._executor
+        if executor is not None and self._pid == os.getpid():
+            return executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # A pool inherited through fork belongs to the parent process
+                self._executor = self._create_executor()
+                self._pid = os.getpid()
+            return self._executor
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        context = multiprocessing.get_context(self.start_method)
+        if self.start_method == 'forkserver':
+            context.set_forkserver_preload([__name__])
+        executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=context,
+            initializer=_initialize_process,
+            initargs=(self.source_path, self.artifact_path, self.scoring_engine)
+        )
+        # Processes are started on demand: one warm-up task per process starts them all
+        for future in [executor.submit(_fingerprint) for _ in range(self.processes)]:
+            future.result()
+        return executor
+
+    def restart(self, executor: Optional[ProcessPoolExecutor] = None) -> None:
+        """Replace the pool (e.g. after a knowledge base reload); in-flight tasks finish"""
+        with self._lock:
+            if executor is not None and executor is not self._executor:
+                return  # already replaced by another thread
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self.restarts += 1
+            self._executor = None
+
+    def analyze(self, analyzer: SymptomAnalyzer, symptoms_text: str, language: str = 'en') -> Dict[str, Any]:
+        """analyzer.analyze_symptoms(symptoms_text, language), computed in the pool"""
+        return self.analyze_many(analyzer, [symptoms_text], language)[0]
+
+    def analyze_many(self, analyzer: SymptomAnalyzer, texts: List[str], language: str = 'en') -> List[Dict[str, Any]]:
+        """analyzer.analyze_many(texts, language), computed in chunks spread over the pool"""
+        executor = self._get_executor()
+        chunks = [texts[start:start + self.chunk_size] for start in range(0, len(texts), self.chunk_size)]
+        try:
+            futures = [executor.submit(_analyze_chunk, chunk) for chunk in chunks]
+        except (BrokenProcessPool, RuntimeError):
+            self.restart(executor)
+            self.fallbacks += 1
+            return analyzer.analyze_many(texts, language)
+
+        results: List[Dict[str, Any]] = []
+        broken = stale = False
+        for chunk, future in zip(chunks, futures):
+            try:
+                compacts = future.result()
+            except BrokenProcessPool:
+                broken = True
+                compacts = [None] * len(chunk)
+            except Exception:
+                compacts = [None] * len(chunk)
+
+            for text, compact in zip(chunk, compacts):
+                if compact is not None and compact[0] == analyzer.knowledge_base.fingerprint:
+                    results.append(analyzer.analysis_from_compact(compact, language))
+                    continue
+                stale = stale or compact is not None
+                self.fallbacks += 1
+                results.append(analyzer.analyze_symptoms(text, language))
+
+        fingerprint = analyzer.knowledge_base.fingerprint
+        if broken:
+            self.restart(executor)
+        elif stale and self._restarted_for != fingerprint:
+            # Reload the pool once for this knowledge base; if the pool then loads a
+            # newer one than the caller has, fall back until the caller reloads too
+            self._restarted_for = fingerprint
+            self.restart(executor)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'processes': self.processes,
+            'startMethod': self.start_method,
+            'running': self._executor is not None and self._pid == os.getpid(),
+            'fallbacks': self.fallbacks,
+            'restarts': self.restarts
+        }
+
+
+# Process pool used by the symptoms blueprint (disabled unless ANALYSIS_PROCESSES is set)
+analysis_pool = AnalysisPool.from_env()
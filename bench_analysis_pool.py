@@ -0,0 +1,111 @@
+"""Throughput of symptom analysis in request threads vs. the analysis process pool.
+
+Concurrent client threads (standing in for the request threads of one server
+worker) analyze texts against a large synthetic knowledge base, first in their
+own thread (GIL-bound) and then through AnalysisPool with an increasing number
+of processes. Reports requests/s, the speedup over in-thread analysis and the
+scaling efficiency relative to one process. Results are checked to be identical
+to in-thread analysis first. Scaling is bounded by the cores available (reported).
+
+Usage:
+    python src/bench_analysis_pool.py [--kb-size 10000] [--processes 1 2 4 8]
+                                      [--threads 16] [--length 512] [--duration 3]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import tempfile
+import threading
+import time
+
+from src.bench_knowledge_base import synthetic_source
+from src.bench_suite import generate_corpus
+from src.services.analysis_pool import AnalysisPool
+from src.services.knowledge_base import load_knowledge_base
+from src.services.symptom_analyzer import SymptomAnalyzer
+
+
+def default_process_counts():
+    counts, count = [], 1
+    while count < (os.cpu_count() or 1):
+        counts.append(count)
+        count *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def run_clients(analyze, texts, threads, duration):
+    """Requests per second achieved by `threads` clients calling analyze(text)"""
+    completed = [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        position = index
+        while time.perf_counter() < deadline:
+            analyze(texts[position % len(texts)])
+            position += threads
+            completed[index] += 1
+
+    workers = [threading.Thread(target=client, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(completed) / (time.perf_counter() - started)
+
+
+def comparable(result):
+    return {key: value for key, value in json.loads(json.dumps(result)).items() if key != 'timestamp'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--kb-size', type=int, default=10000, help='number of synthetic conditions')
+    parser.add_argument('--processes', type=int, nargs='+', default=default_process_counts())
+    parser.add_argument('--threads', type=int, default=16, help='concurrent client threads')
+    parser.add_argument('--length', type=int, default=512, help='characters per symptom description')
+    parser.add_argument('--language', default='en', choices=['en', 'ar'])
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds per configuration')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, 'knowledge_base.json')
+        artifact_path = os.path.join(directory, 'knowledge_base.kb')
+        with open(source_path, 'w', encoding='utf-8') as source_file:
+            json.dump(synthetic_source(args.kb_size), source_file)
+
+        analyzer = SymptomAnalyzer(load_knowledge_base(source_path, artifact_path))
+        texts = generate_corpus(analyzer.knowledge_base, args.language, args.length, count=256)
+        print(f'{os.cpu_count()} CPUs, knowledge base of {args.kb_size} conditions, '
+              f'{args.threads} client threads, {args.length}-character texts')
+
+        baseline = run_clients(lambda text: analyzer.analyze_symptoms(text, args.language),
+                               texts, args.threads, args.duration)
+        print(f"{'backend':<14}{'req/s':>10}{'speedup':>10}{'efficiency':>12}")
+        print(f"{'threads':<14}{baseline:>10.0f}{1.0:>9.2f}x{'':>12}")
+
+        single = None
+        for processes in args.processes:
+            pool = AnalysisPool(processes=processes, chunk_size=1,
+                                source_path=source_path, artifact_path=artifact_path)
+            pool.start()
+            try:
+                for text in texts[:32]:
+                    if comparable(pool.analyze(analyzer, text, args.language)) != \
+                            comparable(analyzer.analyze_symptoms(text, args.language)):
+                        raise SystemExit(f'Pool result differs from in-thread analysis for {text!r}')
+                throughput = run_clients(lambda text: pool.analyze(analyzer, text, args.language),
+                                         texts, args.threads, args.duration)
+            finally:
+                pool.restart()
+            single = single or throughput
+            print(f"{f'pool={processes}':<14}{throughput:>10.0f}{throughput / baseline:>9.2f}x"
+                  f"{throughput / (single * processes):>11.0%}")
+
+
+if __name__ == '__main__':
+    main()
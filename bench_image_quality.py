@@ -0,0 +1,125 @@
+"""Latency of the image quality check over a folder of sample images.
+
+For every image (JPEG, PNG, WebP) in the folder, times assess_image_quality on
+the file as it is and on the ~1024-pixel preview the client sends to
+POST /analysis/images/quality-check, and a plain full-resolution decode for
+comparison. Reports per-image milliseconds (mean, p50, p95, max) and the verdict
+for each image. Without a folder, a set of synthetic phone-sized photos (sharp,
+blurred, dark, overexposed) is generated.
+
+Usage:
+    python src/bench_image_quality.py [folder] [--repeat 5] [--preview-size 1024]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import io
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from src.services.image_quality import assess_image_quality
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def write_synthetic_samples(directory, width=4032, height=3024, seed=7):
+    """Phone-sized JPEGs: textured skin-like tones, then blurred, dark and overexposed copies"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = 150 + 35 * np.sin(x / 250) + 25 * np.cos(y / 180)
+    texture = rng.normal(0, 18, (height, width)).astype(np.float32)
+    pixels = np.stack([base + texture + 25, base + texture - 5, base + texture - 25], axis=-1)
+    sharp = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    samples = {
+        'sharp': sharp,
+        'blurred': sharp.filter(ImageFilter.GaussianBlur(10)),
+        'dark': Image.fromarray(np.clip(pixels * 0.15, 0, 255).astype(np.uint8)),
+        'overexposed': Image.fromarray(np.clip(pixels + 140, 0, 255).astype(np.uint8))
+    }
+    for name, image in samples.items():
+        image.save(os.path.join(directory, f'{name}.jpg'), 'JPEG', quality=90)
+
+
+def preview(path, size):
+    """JPEG bytes of the image downscaled to size pixels on its longest side, as the client sends it"""
+    with Image.open(path) as image:
+        image.draft('RGB', (size, size))
+        image = image.convert('RGB')
+        image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def timings(function, repeat):
+    """Milliseconds per call, one sample per call"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def full_decode(path):
+    with Image.open(path) as image:
+        image.convert('L')
+
+
+def summary(label, samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{label:<28}{statistics.mean(ordered):>9.2f}{statistics.median(ordered):>9.2f}"
+          f"{p95:>9.2f}{ordered[-1]:>9.2f}")
+
+
+def run(folder, repeat, preview_size):
+    paths = sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        raise SystemExit(f'No images in {folder}')
+
+    original, previews, decodes = [], [], []
+    print(f"{'image':<24}{'size':>12}{'score':>7}{'ok':>5}  issues")
+    for path in paths:
+        with Image.open(path) as image:
+            width, height = image.size
+        preview_bytes = preview(path, preview_size)
+        result = assess_image_quality(path)
+        print(f"{os.path.basename(path)[:23]:<24}{f'{width}x{height}':>12}{result['qualityScore']:>7.2f}"
+              f"{'yes' if result['acceptable'] else 'no':>5}  {'; '.join(result['recommendations'])}")
+        original += timings(lambda: assess_image_quality(path), repeat)
+        previews += timings(lambda: assess_image_quality(io.BytesIO(preview_bytes)), repeat)
+        decodes += timings(lambda: full_decode(path), repeat)
+
+    print(f"\n{len(paths)} images x {repeat} runs, ms per image")
+    print(f"{'':<28}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}")
+    summary(f'check, {preview_size}px preview', previews)
+    summary('check, original file', original)
+    summary('full decode only (reference)', decodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('folder', nargs='?', help='folder of sample images (default: synthetic samples)')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per image')
+    parser.add_argument('--preview-size', type=int, default=1024, help='longest side of the client preview')
+    args = parser.parse_args()
+
+    if args.folder:
+        run(args.folder, args.repeat, args.preview_size)
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        write_synthetic_samples(directory)
+        run(directory, args.repeat, args.preview_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Throughput and latency of image inference with and without micro-batching.
+
+Submits synthetic model inputs to InferenceScheduler at a fixed arrival rate
+(or all at once with --rate 0) and runs them through the reference skin model,
+once per max batch size (1 means no batching). Reports images per second, the
+mean batch size and the latency from submission to result (p50, p95, max).
+
+Usage:
+    python src/bench_inference_scheduler.py [--images 2000] [--rate 0] [--batch-sizes 1,4,16,32] [--max-wait-ms 20]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import statistics
+import threading
+import time
+
+import numpy as np
+
+from src.services.inference_scheduler import InferenceScheduler
+from src.services.skin_model import ReferenceSkinModel
+
+
+def run(model, inputs, count, rate, max_batch_size, max_wait):
+    """(seconds, latencies in ms, stats) for count images through a fresh scheduler"""
+    done = threading.Event()
+    latencies = []
+
+    def handler(results, _):
+        now = time.perf_counter()
+        latencies.extend((now - result.args[0]) * 1000 for result in results)
+        if len(latencies) >= count:
+            done.set()
+
+    scheduler = InferenceScheduler(max_batch_size=max_batch_size, max_wait=max_wait, max_pending=count,
+                                   model_provider=lambda: model, load_input=inputs.__getitem__)
+    started = time.perf_counter()
+    for index in range(count):
+        if rate:
+            delay = started + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        scheduler.submit(handler, index % len(inputs), time.perf_counter())
+    done.wait()
+    return time.perf_counter() - started, latencies, scheduler.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=2000, help='images per run')
+    parser.add_argument('--rate', type=float, default=0, help='arrivals per second (0: all at once)')
+    parser.add_argument('--batch-sizes', default='1,4,16,32', help='comma-separated max batch sizes')
+    parser.add_argument('--max-wait-ms', type=float, default=20, help='max wait for a batch to fill')
+    args = parser.parse_args()
+
+    model = ReferenceSkinModel()
+    rng = np.random.default_rng(3)
+    inputs = [rng.integers(0, 256, (model.input_size, model.input_size, 3), dtype=np.uint8) for _ in range(64)]
+    model.predict(np.stack(inputs[:4]))
+
+    print(f"{args.images} images, {'burst' if not args.rate else f'{args.rate:g}/s'}, "
+          f"max wait {args.max_wait_ms:g} ms")
+    print(f"{'max batch':>10}{'images/s':>11}{'mean batch':>12}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for max_batch_size in (int(size) for size in args.batch_sizes.split(',')):
+        seconds, latencies, stats = run(model, inputs, args.images, args.rate, max_batch_size,
+                                        args.max_wait_ms / 1000)
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"{max_batch_size:>10}{args.images / seconds:>11.0f}{stats['meanBatchSize']:>12.1f}"
+              f"{statistics.median(ordered):>9.1f}{p95:>9.1f}{ordered[-1]:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark the orjson JSON provider against Flask's default (stdlib) provider.
+
+Encodes real API payloads (analysis results in English and Arabic, the fallback
+response, a 100-item batch, a user profile) with both providers, checks that the
+response bodies are byte-identical (also for edge cases: accented text, emoji,
+datetimes, tiny/huge and non-finite floats) and reports the time per response.
+
+Usage:
+    python src/bench_json_provider.py [--repeat 2000]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from src.json_provider import FastJSONProvider, orjson
+from src.services.symptom_analyzer import SymptomAnalyzer
+
+
+def real_payloads(analyzer):
+    batch_texts = ['I have a headache and fever', 'dry cough and chills', 'hello',
+                   'ألم في الصدر وضيق في التنفس'] * 25
+    return {
+        'analysis en': analyzer.analyze_symptoms('I have a severe headache, fever and chest pain', 'en'),
+        'analysis ar': analyzer.analyze_symptoms('أعاني من صداع وحمى وألم في الصدر', 'ar'),
+        'fallback en': analyzer.analyze_symptoms('hello there', 'en'),
+        'batch x100': {'success': True, 'count': len(batch_texts),
+                       'results': analyzer.analyze_many(batch_texts, 'en')},
+        'profile': {'success': True, 'data': {
+            'id': str(uuid.uuid4()), 'email': 'patient@example.com', 'firstName': 'Sara',
+            'lastName': 'Ali', 'preferredLanguage': 'ar', 'emailVerified': True,
+            'createdAt': datetime(2024, 5, 1, 12, 30).isoformat(), 'lastLogin': None}},
+    }
+
+
+def edge_payloads():
+    return {
+        'latin-1 text': {'name': 'Zoë Müller', 'note': 'café'},
+        'emoji': {'message': 'feeling better 😀'},
+        'control chars': {'text': 'line\nbreak\ttab\x00\x7f'},
+        'datetime': {'at': datetime(2024, 1, 2, 3, 4, 5), 'id': uuid.UUID(int=7), 'dose': Decimal('2.50')},
+        'floats': {'values': [0.57, 1e-05, 0.0001, 1e16, 1.5e300, -0.0, 123456789.125]},
+        'non-finite floats': {'values': [float('nan'), float('inf'), -float('inf')], 'missing': None},
+        'big int': {'value': 2 ** 70},
+        'tuple': {'items': (1, 'two', None, False)},
+    }
+
+
+def time_response(provider, payload, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        provider.response(payload)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    if orjson is None:
+        raise SystemExit('orjson is not installed; the provider falls back to the stdlib encoder')
+
+    app = Flask(__name__)
+    stdlib_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    analyzer = SymptomAnalyzer()
+
+    with app.app_context():
+        for name, payload in {**real_payloads(analyzer), **edge_payloads()}.items():
+            if stdlib_provider.response(payload).get_data() != fast_provider.response(payload).get_data():
+                raise SystemExit(f'Response bodies differ for {name!r}')
+        print('All response bodies identical to the stdlib provider')
+
+        print(f"{'payload':>12} {'bytes':>8} {'stdlib us':>10} {'orjson us':>10} {'speedup':>8}")
+        for name, payload in real_payloads(analyzer).items():
+            size = len(stdlib_provider.response(payload).get_data())
+            repeat = max(1, args.repeat * 1000 // max(size, 1000))
+            stdlib_time = time_response(stdlib_provider, payload, repeat)
+            fast_time = time_response(fast_provider, payload, repeat)
+            print(f'{name:>12} {size:>8} {stdlib_time * 1e6:>10.1f} {fast_time * 1e6:>10.1f} '
+                  f'{stdlib_time / fast_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
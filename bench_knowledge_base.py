@@ -0,0 +1,117 @@
+"""Startup time and memory of the knowledge base: in-code dicts vs. JSON source vs. compiled artifact.
+
+Each mode runs in a fresh interpreter and reports the wall time to a ready
+SymptomAnalyzer and the RSS growth it caused:
+
+- literal:  the knowledge base as a Python dict literal compiled and executed at
+            start-up, then matcher and index built (what the analyzer used to do)
+- source:   parse knowledge_base.json and build matcher and index
+- artifact: mmap + unmarshal the compiled knowledge_base.kb
+
+Usage:
+    python src/bench_knowledge_base.py [--synthetic-conditions N]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import random
+import subprocess
+import tempfile
+import time
+
+MODES = ('literal', 'source', 'artifact')
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def synthetic_source(conditions, seed=3):
+    """A knowledge base shaped like the real one with thousands of keywords"""
+    rng = random.Random(seed)
+    symptom_count = max(50, conditions // 4)
+    symptoms = {
+        f'symptom_{i}': {
+            'en': f'symptom {i}',
+            'ar': f'عرض {i}',
+            'severity': rng.choice(['mild', 'moderate', 'severe']),
+            'category': rng.choice(['general', 'respiratory', 'neurological']),
+            'keywords': [f'kw{i}x{j}' for j in range(4)] + [f'كلمة{i}س{j}' for j in range(3)],
+        }
+        for i in range(symptom_count)
+    }
+    keys = list(symptoms)
+    conditions = {
+        f'condition_{i}': {
+            'en': f'Condition {i}',
+            'ar': f'حالة {i}',
+            'symptoms': rng.sample(keys, rng.randint(3, 8)),
+            'description': {'en': f'Description {i}', 'ar': f'وصف {i}'},
+            'icd10': f'X{i:05d}',
+            'severity': rng.choice(['mild', 'moderate', 'severe']),
+        }
+        for i in range(conditions)
+    }
+    return {'version': 'synthetic', 'symptoms': symptoms, 'conditions': conditions, 'red_flags': {}}
+
+
+def run_mode(mode, source_path, artifact_path):
+    from src.services.knowledge_base import KnowledgeBase
+    from src.services.symptom_analyzer import SymptomAnalyzer
+
+    if mode == 'literal':
+        with open(source_path, encoding='utf-8') as source_file:
+            literal = repr(json.load(source_file))
+
+    baseline = rss_bytes()
+    started = time.perf_counter()
+    if mode == 'literal':
+        source = eval(compile(literal, '<knowledge_base>', 'eval'))
+        knowledge_base = KnowledgeBase.from_source(source)
+    elif mode == 'source':
+        knowledge_base = KnowledgeBase.from_source_file(source_path)
+    else:
+        knowledge_base = KnowledgeBase.load(artifact_path)
+    SymptomAnalyzer(knowledge_base)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({'ms': elapsed * 1e3, 'rss_mb': (rss_bytes() - baseline) / 2 ** 20}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--synthetic-conditions', type=int, default=20000)
+    parser.add_argument('--run', nargs=3, metavar=('MODE', 'SOURCE', 'ARTIFACT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_mode(*args.run)
+        return
+
+    from src.services.knowledge_base import DEFAULT_SOURCE_PATH, compile_knowledge_base
+
+    with tempfile.TemporaryDirectory() as workdir:
+        synthetic_path = os.path.join(workdir, 'synthetic.json')
+        with open(synthetic_path, 'w', encoding='utf-8') as synthetic_file:
+            json.dump(synthetic_source(args.synthetic_conditions), synthetic_file, ensure_ascii=False)
+
+        print(f"{'knowledge base':<22}{'mode':>10}{'startup ms':>12}{'RSS MB':>10}")
+        for label, source_path in (('bundled', DEFAULT_SOURCE_PATH),
+                                   (f'synthetic {args.synthetic_conditions}', synthetic_path)):
+            artifact_path = os.path.join(workdir, os.path.basename(source_path) + '.kb')
+            compile_knowledge_base(source_path, artifact_path)
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--run', mode, source_path, artifact_path],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                stats = json.loads(output)
+                print(f"{label:<22}{mode:>10}{stats['ms']:>12.1f}{stats['rss_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
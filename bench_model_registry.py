@@ -0,0 +1,98 @@
+"""Cold start and memory per worker of skin condition models, memory-mapped or copied.
+
+Publishes a reference model version to a temporary registry, then starts N
+worker processes that each load it, either through the registry (weights
+memory-mapped, shared) or by reading the weight files into private arrays, and
+run it once. Reports per worker the cold start (load, warm-up) and the resident
+memory of the weights: RSS, and PSS, which splits shared pages between the
+processes using them.
+
+Usage:
+    python src/bench_model_registry.py [--workers 4] [--hidden 2048]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import multiprocessing
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from src.services.model_registry import ModelRegistry, process_memory
+from src.services.skin_model import ReferenceSkinModel
+
+VERSION = 'bench-1'
+
+
+def worker(directory, mode, loaded, measure, report):
+    registry = ModelRegistry(directory)
+    started = time.perf_counter()
+    if mode == 'mmap':
+        model = registry.load(VERSION)
+        cold_start = registry.cold_starts[VERSION]
+    else:
+        # Private copy of every weight tensor, as a plain np.load would give
+        weights = {name: np.load(os.path.join(directory, VERSION, f'{name}.npy'))
+                   for name in ('hidden', 'output')}
+        model = ReferenceSkinModel(weights, version=VERSION)
+        load_seconds = time.perf_counter() - started
+        registry._warm_up(model)
+        cold_start = {'loadMs': load_seconds * 1000,
+                      'warmupMs': (time.perf_counter() - started - load_seconds) * 1000}
+    loaded.release()
+    # Measure once every worker holds its model, so shared pages are counted as shared
+    measure.wait()
+    memory = process_memory(directory)
+    if mode == 'copy':
+        # Private arrays are anonymous memory, not mappings of the weight files
+        memory['weightsRssBytes'] = memory['weightsPssBytes'] = sum(
+            array.nbytes for array in model.weights.values())
+    report.put((cold_start, memory))
+
+
+def run(directory, mode, workers):
+    context = multiprocessing.get_context('spawn')
+    loaded, measure, report = context.Semaphore(0), context.Event(), context.Queue()
+    processes = [context.Process(target=worker, args=(directory, mode, loaded, measure, report))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        loaded.acquire()
+    measure.set()
+    results = [report.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='worker processes')
+    parser.add_argument('--hidden', type=int, default=2048, help='hidden units of the published model')
+    args = parser.parse_args()
+
+    if process_memory(tempfile.gettempdir()) is None:
+        raise SystemExit('Memory is read from /proc/self/smaps (Linux only)')
+    with tempfile.TemporaryDirectory() as directory:
+        registry = ModelRegistry(directory)
+        registry.publish_reference(VERSION, hidden=args.hidden)
+        size = os.path.getsize(os.path.join(directory, VERSION, 'hidden.npy'))
+        print(f'{args.workers} workers, weights {size / 2**20:.1f} MiB')
+        print(f"{'weights':<10}{'load ms':>9}{'warm-up ms':>12}{'RSS MiB':>10}{'PSS MiB':>10}{'total PSS MiB':>15}")
+        for mode in ('mmap', 'copy'):
+            results = run(directory, mode, args.workers)
+            rss = [memory['weightsRssBytes'] / 2**20 for _, memory in results]
+            pss = [memory['weightsPssBytes'] / 2**20 for _, memory in results]
+            print(f"{mode:<10}{statistics.mean(cold['loadMs'] for cold, _ in results):>9.1f}"
+                  f"{statistics.mean(cold['warmupMs'] for cold, _ in results):>12.1f}"
+                  f"{statistics.mean(rss):>10.1f}{statistics.mean(pss):>10.1f}{sum(pss):>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
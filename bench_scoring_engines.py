@@ -0,0 +1,84 @@
+"""Scaling benchmark for the condition scoring engines ('index' vs 'matrix').
+
+Builds synthetic disease databases of 10, 10k and 100k conditions, checks that both
+engines rank identically, then reports build time, single-query latency and batch
+throughput.
+
+Usage:
+    python src/bench_scoring_engines.py [--sizes 10 10000 100000] [--batch 256]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import time
+
+from src.services.condition_scoring import create_scorer
+from src.services.symptom_analyzer import MAX_POTENTIAL_CONDITIONS
+
+
+def synthetic_disease_database(conditions, symptoms=None, seed=7):
+    """Generate a disease database shaped like the real one (3-8 symptoms per condition)"""
+    rng = random.Random(seed)
+    symptoms = symptoms or max(50, conditions // 20)
+    symptom_keys = [f'symptom_{i}' for i in range(symptoms)]
+    return {
+        f'condition_{i}': {
+            'en': f'Condition {i}',
+            'ar': f'حالة {i}',
+            'symptoms': rng.sample(symptom_keys, rng.randint(3, min(8, symptoms))),
+            'description': {'en': '', 'ar': ''},
+            'icd10': f'X{i:05d}',
+            'severity': rng.choice(['mild', 'moderate', 'severe']),
+        }
+        for i in range(conditions)
+    }, symptom_keys
+
+
+def synthetic_queries(symptom_keys, count, seed=11):
+    rng = random.Random(seed)
+    return [rng.sample(symptom_keys, rng.randint(1, 5)) for _ in range(count)]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 10_000, 100_000])
+    parser.add_argument('--batch', type=int, default=256)
+    args = parser.parse_args()
+
+    print(f"{'conditions':>10} {'engine':>7} {'build ms':>10} {'single us':>11} "
+          f"{'batch ms':>10} {'queries/s':>11}")
+    for size in args.sizes:
+        database, symptom_keys = synthetic_disease_database(size)
+        queries = synthetic_queries(symptom_keys, args.batch)
+        expected = None
+        for engine in ('index', 'matrix'):
+            scorer, build_time = timed(create_scorer, engine, database)
+
+            single_runs = min(200, len(queries))
+            started = time.perf_counter()
+            for query in queries[:single_runs]:
+                scorer.score(query, MAX_POTENTIAL_CONDITIONS)
+            single_time = (time.perf_counter() - started) / single_runs
+
+            ranked, batch_time = timed(scorer.score_many, queries, MAX_POTENTIAL_CONDITIONS)
+            if expected is None:
+                expected = ranked
+            elif ranked != expected:
+                raise SystemExit(f'{engine} ranking differs from index engine at {size} conditions')
+
+            print(f"{size:>10} {engine:>7} {build_time * 1e3:>10.1f} {single_time * 1e6:>11.1f} "
+                  f"{batch_time * 1e3:>10.1f} {len(queries) / batch_time:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Per-request allocation benchmark: analyzer built per request vs. shared analyzer.
+
+Usage:
+    python src/bench_shared_analyzer.py [--requests N]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from src.services.symptom_analyzer import SymptomAnalyzer, get_shared_analyzer
+
+SAMPLE_INPUTS = [
+    ('I have a headache and fever', 'en'),
+    ('chest pain and shortness of breath', 'en'),
+    ('I feel tired, dizzy and I keep coughing', 'en'),
+    ('أعاني من صداع وحمى', 'ar'),
+    ('ألم في البطن واستفراغ', 'ar'),
+]
+
+
+def per_request_analyzer(text, language):
+    return SymptomAnalyzer().analyze_symptoms(text, language)
+
+
+def shared_analyzer(text, language):
+    return get_shared_analyzer().analyze_symptoms(text, language)
+
+
+def measure(handler, requests):
+    """Return allocation and timing figures for `requests` calls of handler"""
+    handler(*SAMPLE_INPUTS[0])  # warm-up (builds the shared analyzer once)
+    gc.collect()
+    gc_before = sum(stat['collections'] for stat in gc.get_stats())
+
+    tracemalloc.start()
+    allocated = 0
+    started = time.perf_counter()
+    for i in range(requests):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        handler(*SAMPLE_INPUTS[i % len(SAMPLE_INPUTS)])
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+
+    gc_after = sum(stat['collections'] for stat in gc.get_stats())
+    return {
+        'peak_bytes_per_request': allocated / requests,
+        'us_per_request': elapsed / requests * 1e6,
+        'gc_collections': gc_after - gc_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'mode':<22}{'peak B/request':>16}{'us/request':>14}{'gc runs':>10}")
+    for name, handler in (('per-request analyzer', per_request_analyzer),
+                          ('shared analyzer', shared_analyzer)):
+        stats = measure(handler, args.requests)
+        print(f"{name:<22}{stats['peak_bytes_per_request']:>16.0f}"
+              f"{stats['us_per_request']:>14.1f}{stats['gc_collections']:>10}")
+
+
+if __name__ == '__main__':
+    main()
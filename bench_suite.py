@@ -0,0 +1,220 @@
+"""Benchmark suite for the symptom analysis engine, with JSON baselines.
+
+Runs every SymptomAnalyzer stage (extract_symptoms, analyze_potential_conditions,
+generate_recommendations) and the end-to-end analyze_symptoms against generated
+English and Arabic corpora of several text lengths, for the shipped knowledge base
+and synthetic ones of increasing size. Corpora and knowledge bases are seeded, so
+runs are reproducible.
+
+Each case reports throughput (ops/s), p50/p99 latency and the peak memory
+allocated by a single call (tracemalloc, measured in a separate pass so it does
+not distort the timings). Results can be stored as a JSON baseline and later runs
+compared with it; cases slower than the threshold (and by more than a microsecond
+of timer noise) are flagged and make the script exit with status 1.
+
+Usage:
+    python src/bench_suite.py [--kb-sizes real 1000 10000] [--lengths 64 512 4096]
+                              [--min-time 0.3] [--filter extract]
+                              [--save baseline.json] [--compare baseline.json --threshold 0.1]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+from src.bench_knowledge_base import synthetic_source
+from src.services.knowledge_base import KnowledgeBase, load_knowledge_base
+from src.services.symptom_analyzer import SymptomAnalyzer
+
+BASELINE_FORMAT = 1
+# Latency differences below this are timer noise, never reported as regressions
+NOISE_FLOOR_US = 1.0
+
+FILLER_WORDS = {
+    'en': ['I', 'have', 'been', 'feeling', 'a', 'bit', 'since', 'yesterday', 'and', 'my',
+           'the', 'it', 'gets', 'worse', 'at', 'night', 'also', 'some', 'with', 'very'],
+    'ar': ['أنا', 'أشعر', 'منذ', 'يومين', 'مع', 'في', 'قليلا', 'جدا', 'وأيضا', 'عندي',
+           'الليل', 'يزداد', 'بعد', 'الأكل', 'لدي', 'كثيرا', 'اليوم', 'هذا', 'من', 'على'],
+}
+# One word in KEYWORD_EVERY is a knowledge base keyword
+KEYWORD_EVERY = 6
+
+STAGES = ('extract_symptoms', 'analyze_potential_conditions', 'generate_recommendations', 'analyze_symptoms')
+
+
+def build_knowledge_base(size):
+    """The shipped knowledge base ('real') or a synthetic one with `size` conditions"""
+    if size == 'real':
+        return load_knowledge_base()
+    return KnowledgeBase.from_source(synthetic_source(int(size)))
+
+
+def language_keywords(knowledge_base, language):
+    """Keywords of the knowledge base written in the given language"""
+    keywords = [keyword for symptom in knowledge_base.symptom_database.values() for keyword in symptom['keywords']]
+    return [keyword for keyword in keywords if keyword.isascii() == (language == 'en')]
+
+
+def generate_corpus(knowledge_base, language, length, count=32, seed=13):
+    """`count` texts of about `length` characters mixing filler words and keywords"""
+    rng = random.Random(f'{seed}-{language}-{length}')
+    keywords = language_keywords(knowledge_base, language)
+    texts = []
+    for _ in range(count):
+        words, size = [], 0
+        while size < length:
+            word = rng.choice(keywords) if rng.randrange(KEYWORD_EVERY) == 0 else rng.choice(FILLER_WORDS[language])
+            words.append(word)
+            size += len(word) + 1
+        texts.append(' '.join(words))
+    return texts
+
+
+def stage_calls(analyzer, stage, texts, language):
+    """Zero-argument callables running `stage` on each text (inputs prepared up front)"""
+    if stage == 'extract_symptoms':
+        return [lambda text=text: analyzer.extract_symptoms(text, language) for text in texts]
+    if stage == 'analyze_symptoms':
+        return [lambda text=text: analyzer.analyze_symptoms(text, language) for text in texts]
+
+    calls = []
+    for text in texts:
+        keys = [symptom['key'] for symptom in analyzer.extract_symptoms(text, language)]
+        if stage == 'analyze_potential_conditions':
+            calls.append(lambda keys=keys: analyzer.analyze_potential_conditions(keys, language))
+        else:
+            conditions = analyzer.analyze_potential_conditions(keys, language)
+            calls.append(lambda keys=keys, conditions=conditions:
+                         analyzer.generate_recommendations(keys, conditions, language))
+    return calls
+
+
+def run_case(calls, min_time, max_ops):
+    """Time calls round-robin for at least min_time seconds; return the case figures"""
+    for call in calls:
+        call()  # warm-up
+
+    latencies = []
+    clock = time.perf_counter_ns
+    deadline = clock() + int(min_time * 1e9)
+    while len(latencies) < max_ops and (clock() < deadline or len(latencies) < len(calls)):
+        for call in calls:
+            started = clock()
+            call()
+            latencies.append(clock() - started)
+
+    latencies.sort()
+    total = sum(latencies)
+
+    tracemalloc.start()
+    peak = 0
+    for call in calls:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        call()
+        _, call_peak = tracemalloc.get_traced_memory()
+        peak = max(peak, call_peak - before)
+    tracemalloc.stop()
+
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': round(len(latencies) / (total / 1e9), 1),
+        'p50_us': round(latencies[len(latencies) // 2] / 1e3, 2),
+        'p99_us': round(latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] / 1e3, 2),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return (case, metric, baseline, current, change) for cases slower than threshold"""
+    regressions = []
+    for case, current in results.items():
+        previous = baseline['results'].get(case)
+        if previous is None:
+            continue
+        for metric in ('p50_us', 'p99_us'):
+            if current[metric] - previous[metric] > max(previous[metric] * threshold, NOISE_FLOOR_US):
+                regressions.append((case, metric, previous[metric], current[metric],
+                                    current[metric] / previous[metric] - 1))
+        # Throughput compared through the mean latency it implies
+        previous_mean_us = 1e6 / previous['ops_per_sec']
+        current_mean_us = 1e6 / current['ops_per_sec']
+        if current_mean_us - previous_mean_us > max(previous_mean_us * threshold, NOISE_FLOOR_US):
+            regressions.append((case, 'ops_per_sec', previous['ops_per_sec'], current['ops_per_sec'],
+                                current['ops_per_sec'] / previous['ops_per_sec'] - 1))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--kb-sizes', nargs='+', default=['real', '1000', '10000'],
+                        help="'real' for the shipped knowledge base, or a number of synthetic conditions")
+    parser.add_argument('--languages', nargs='+', default=['en', 'ar'])
+    parser.add_argument('--lengths', type=int, nargs='+', default=[64, 512, 4096])
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=STAGES)
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this text')
+    parser.add_argument('--min-time', type=float, default=0.3, help='seconds spent timing each case')
+    parser.add_argument('--max-ops', type=int, default=100_000)
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown flagged as a regression (default 0.10 = 10%%)')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('format') != BASELINE_FORMAT:
+            raise SystemExit(f'{args.compare} is not a baseline of format {BASELINE_FORMAT}')
+
+    results = {}
+    print(f"{'case':<58}{'ops/s':>11}{'p50 us':>10}{'p99 us':>10}{'peak KiB':>10}")
+    for kb_size in args.kb_sizes:
+        analyzer = SymptomAnalyzer(build_knowledge_base(kb_size))
+        for language in args.languages:
+            for length in args.lengths:
+                texts = generate_corpus(analyzer.knowledge_base, language, length)
+                for stage in args.stages:
+                    case = f'{stage}/kb={kb_size}/{language}/len={length}'
+                    if args.filter not in case:
+                        continue
+                    figures = run_case(stage_calls(analyzer, stage, texts, language), args.min_time, args.max_ops)
+                    results[case] = figures
+                    print(f"{case:<58}{figures['ops_per_sec']:>11.0f}{figures['p50_us']:>10.1f}"
+                          f"{figures['p99_us']:>10.1f}{figures['peak_kib']:>10.1f}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as baseline_file:
+            json.dump({
+                'format': BASELINE_FORMAT,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'settings': {'min_time': args.min_time, 'max_ops': args.max_ops},
+                'results': results,
+            }, baseline_file, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.save}')
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        compared = len(set(results) & set(baseline['results']))
+        if not regressions:
+            print(f'No regressions over {args.threshold:.0%} in {compared} cases compared with {args.compare}')
+            return
+        print(f'{len(regressions)} regressions over {args.threshold:.0%} compared with {args.compare}:')
+        for case, metric, previous, current, change in regressions:
+            print(f'  {case} {metric}: {previous} -> {current} ({change:+.0%})')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark of the text normalization stage on long Arabic (and English) inputs.
+
+Compares normalize_text with a single dict-based str.translate table doing the
+same mapping, and reports the cost of extract_symptoms (normalization + single matcher pass) as
+the input grows. Also prints how much normalization shrinks the keyword
+vocabulary.
+
+Usage:
+    python src/bench_text_normalization.py [--lengths 1000 10000 100000]
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import time
+
+from src.services.symptom_analyzer import SymptomAnalyzer
+from src.services.text_normalizer import normalize_keyword, normalize_text
+
+ARABIC_WORDS = ['أُعاني', 'مِن', 'صُداعٍ', 'شديدٍ', 'وحُمّى', 'منذُ', 'يومين', 'وأشعرُ', 'بالغثيانِ',
+                'والتعـــب', 'وألمٍ', 'في', 'الصدرِ', 'إرهاق', 'مستمر', 'آلام', 'المعدة']
+ENGLISH_WORDS = ['I', 'have', 'a', 'terrible', 'headache', 'and', 'feel', 'nauseous', 'with',
+                 'chills', 'coughing', 'since', 'yesterday', 'fatigued', 'dizzy']
+
+
+_TRANSLATE_TABLE = str.maketrans({
+    **{c: None for c in range(0x064B, 0x0653)}, 0x0670: None, 0x0640: None,
+    **{ord(ch): 'ا' for ch in 'أإآٱ'}, ord('ة'): 'ه', ord('ى'): 'ي',
+    **{ord(d): str(i) for i, d in enumerate('٠١٢٣٤٥٦٧٨٩')},
+    **{ord(d): str(i) for i, d in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+})
+
+
+def translate_normalize(text):
+    """Single str.translate table equivalent to normalize_text (reference only)"""
+    return text.lower().translate(_TRANSLATE_TABLE)
+
+
+def generate(words, length, seed=5):
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < length:
+        word = rng.choice(words)
+        parts.append(word)
+        size += len(word) + 1
+    return ' '.join(parts)[:length]
+
+
+def per_call(fn, text, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lengths', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    analyzer = SymptomAnalyzer()
+    keywords = [k for symptom in analyzer.symptom_database.values() for k in symptom['keywords']]
+    print(f'keyword vocabulary: {len(set(k.lower() for k in keywords))} raw -> '
+          f'{len(set(normalize_keyword(k) for k in keywords))} normalized\n')
+
+    print(f"{'input':<8}{'chars':>9}{'normalize us':>14}{'table us':>11}{'MB/s':>8}{'extract us':>12}")
+    for label, words in (('arabic', ARABIC_WORDS), ('english', ENGLISH_WORDS)):
+        for length in args.lengths:
+            text = generate(words, length)
+            assert normalize_text(text) == translate_normalize(text)
+            repeat = max(3, 200_000 // length)
+            normalize_time = per_call(normalize_text, text, repeat)
+            table_time = per_call(translate_normalize, text, repeat)
+            extract_time = per_call(analyzer.extract_symptoms, text, max(1, repeat // 10))
+            throughput = len(text.encode('utf-8')) / normalize_time / 2 ** 20
+            print(f"{label:<8}{length:>9}{normalize_time * 1e6:>14.1f}{table_time * 1e6:>11.1f}"
+                  f"{throughput:>8.0f}{extract_time * 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
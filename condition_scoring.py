@@ -0,0 +1,163 @@
+import heapq
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed by the matrix engine
+    np = None
+
+# (condition id, number of matching symptoms)
+ScoredCondition = Tuple[int, int]
+
+
+class InvertedIndexScorer:
+    """Scores conditions through a symptom -> condition-id inverted index.
+
+    Conditions get integer ids in knowledge base order. Scoring a symptom set only
+    touches conditions sharing at least one symptom with it; the top-k comes from a
+    bounded heap. Best suited to interactive, one-request-at-a-time scoring.
+    """
+
+    name = 'index'
+
+    def __init__(self, disease_database: Mapping[str, Mapping[str, Any]]):
+        self.condition_keys = tuple(disease_database)
+        self.condition_sizes = tuple(
+            len(disease_database[key]['symptoms']) for key in self.condition_keys
+        )
+        symptom_conditions: Dict[str, List[int]] = {}
+        for condition_id, condition_key in enumerate(self.condition_keys):
+            for symptom_key in set(disease_database[condition_key]['symptoms']):
+                symptom_conditions.setdefault(symptom_key, []).append(condition_id)
+        self._symptom_conditions = {key: tuple(ids) for key, ids in symptom_conditions.items()}
+
+    @classmethod
+    def from_state(cls, state: Tuple[Any, Any, Any]) -> 'InvertedIndexScorer':
+        """Restore a scorer from state(), skipping index construction"""
+        scorer = cls.__new__(cls)
+        scorer.condition_keys, scorer.condition_sizes, scorer._symptom_conditions = state
+        return scorer
+
+    def state(self) -> Tuple[Any, Any, Any]:
+        """Plain (marshal-serializable) index tables"""
+        return self.condition_keys, self.condition_sizes, self._symptom_conditions
+
+    def score(self, symptoms: Iterable[str], top_k: int) -> List[ScoredCondition]:
+        """Return the top_k (condition id, matching count) pairs, best first"""
+        match_counts: Dict[int, int] = {}
+        for symptom_key in set(symptoms):
+            for condition_id in self._symptom_conditions.get(symptom_key, ()):
+                match_counts[condition_id] = match_counts.get(condition_id, 0) + 1
+
+        # Highest probability first; ties keep knowledge base order
+        sizes = self.condition_sizes
+        return heapq.nlargest(
+            top_k,
+            match_counts.items(),
+            key=lambda item: (item[1] / sizes[item[0]], -item[0])
+        )
+
+    def score_many(self, symptom_sets: Sequence[Iterable[str]], top_k: int) -> List[List[ScoredCondition]]:
+        """Score several symptom sets; results are in input order"""
+        return [self.score(symptoms, top_k) for symptoms in symptom_sets]
+
+
+class SparseMatrixScorer:
+    """Scores conditions with a sparse condition x symptom incidence matrix (NumPy CSR).
+
+    The relation is stored transposed, symptom -> condition ids, in CSR arrays. A batch
+    of symptom sets is scored in one sparse matrix product: the condition ids of every
+    (query, symptom) pair are gathered, and identical (query, condition) entries are
+    counted together, so the work grows with the touched entries rather than with the
+    catalog. Ranking for the whole batch is a single lexsort. Produces the same
+    matches, probabilities and tie order as InvertedIndexScorer.
+    """
+
+    name = 'matrix'
+
+    def __init__(self, disease_database: Mapping[str, Mapping[str, Any]]):
+        if np is None:
+            raise ImportError("The 'matrix' scoring engine requires NumPy")
+
+        self.condition_keys = tuple(disease_database)
+        self.condition_sizes = tuple(
+            len(disease_database[key]['symptoms']) for key in self.condition_keys
+        )
+
+        self._symptom_columns: Dict[str, int] = {}
+        columns: List[int] = []
+        rows: List[int] = []
+        for condition_id, condition_key in enumerate(self.condition_keys):
+            for symptom_key in set(disease_database[condition_key]['symptoms']):
+                columns.append(self._symptom_columns.setdefault(symptom_key, len(self._symptom_columns)))
+                rows.append(condition_id)
+
+        columns_array = np.asarray(columns, dtype=np.int64)
+        order = np.argsort(columns_array, kind='stable')
+        self._indices = np.asarray(rows, dtype=np.int64)[order]
+        self._indptr = np.zeros(len(self._symptom_columns) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns_array, minlength=len(self._symptom_columns)), out=self._indptr[1:])
+        self._sizes = np.asarray(self.condition_sizes, dtype=np.float64)
+
+    def score(self, symptoms: Iterable[str], top_k: int) -> List[ScoredCondition]:
+        """Return the top_k (condition id, matching count) pairs, best first"""
+        return self.score_many([symptoms], top_k)[0]
+
+    def score_many(self, symptom_sets: Sequence[Iterable[str]], top_k: int) -> List[List[ScoredCondition]]:
+        """Score several symptom sets in one sparse matrix product; results are in input order"""
+        query_rows: List[int] = []
+        query_columns: List[int] = []
+        for row, symptoms in enumerate(symptom_sets):
+            for symptom_key in set(symptoms):
+                column = self._symptom_columns.get(symptom_key)
+                if column is not None:
+                    query_rows.append(row)
+                    query_columns.append(column)
+
+        results: List[List[ScoredCondition]] = [[] for _ in symptom_sets]
+        if not query_rows:
+            return results
+
+        # Expand every (query, symptom) pair into the (query, condition) pairs of its column
+        columns = np.asarray(query_columns, dtype=np.int64)
+        starts = self._indptr[columns]
+        lengths = self._indptr[columns + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return results
+        pair_rows = np.repeat(np.asarray(query_rows, dtype=np.int64), lengths)
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+        conditions = self._indices[offsets]
+
+        # Matching counts per (query, condition), then rank each query's candidates by
+        # probability (descending) and condition id (ascending)
+        entries, counts = np.unique(pair_rows * len(self.condition_keys) + conditions, return_counts=True)
+        entry_rows, entry_conditions = np.divmod(entries, len(self.condition_keys))
+        probabilities = counts / self._sizes[entry_conditions]
+        order = np.lexsort((entry_conditions, -probabilities, entry_rows))
+        ranked_rows = entry_rows[order]
+        row_starts = np.searchsorted(ranked_rows, ranked_rows, side='left')
+        keep = order[np.arange(len(order)) - row_starts < top_k]
+
+        for row, condition_id, matching in zip(entry_rows[keep].tolist(),
+                                               entry_conditions[keep].tolist(),
+                                               counts[keep].tolist()):
+            results[row].append((condition_id, matching))
+        return results
+
+
+SCORING_ENGINES = {
+    InvertedIndexScorer.name: InvertedIndexScorer,
+    SparseMatrixScorer.name: SparseMatrixScorer,
+}
+
+
+def create_scorer(engine: str, disease_database: Mapping[str, Mapping[str, Any]]):
+    """Build the named scoring engine for a disease database"""
+    try:
+        scorer_class = SCORING_ENGINES[engine]
+    except KeyError:
+        raise ValueError(
+            f"Unknown scoring engine '{engine}', expected one of: {', '.join(SCORING_ENGINES)}"
+        )
+    return scorer_class(disease_database)
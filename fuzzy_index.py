@@ -0,0 +1,122 @@
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Set, Tuple
+
+from src.services.text_normalizer import normalize_text
+
+# Words shorter than this are never corrected: too many ordinary words sit within
+# one edit of a short keyword ("could" / "cold")
+MIN_TERM_LENGTH = 5
+# Terms of this length or more tolerate two edits, shorter ones a single edit
+TWO_EDIT_LENGTH = 8
+# Longer tokens are not looked up; keeps the number of generated deletes bounded
+MAX_TOKEN_LENGTH = 24
+
+# Frequent English words within one edit of a vocabulary term
+COMMON_WORDS = frozenset(['tried', 'could', 'would', 'should', 'chess', 'heard', 'hears', 'fewer', 'never'])
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def _max_edits(length: int) -> int:
+    return 2 if length >= TWO_EDIT_LENGTH else 1
+
+
+def _deletes(word: str, edits: int) -> Set[str]:
+    """All strings obtained by deleting up to `edits` characters from word (word included)"""
+    results = {word}
+    frontier = {word}
+    for _ in range(edits):
+        frontier = {candidate[:i] + candidate[i + 1:] for candidate in frontier for i in range(len(candidate))}
+        results |= frontier
+    return results
+
+
+def _edit_distance(source: str, target: str, limit: int) -> int:
+    """Optimal string alignment distance (transpositions count as one edit), or limit + 1"""
+    if abs(len(source) - len(target)) > limit:
+        return limit + 1
+    previous_previous: List[int] = []
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = source[i - 1] != target[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and source[i - 1] == target[j - 2]
+                    and source[i - 2] == target[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class FuzzyIndex:
+    """Typo-tolerant term lookup using a precomputed deletion index (SymSpell).
+
+    Every vocabulary term (single-word keywords and symptom names) is stored under
+    all of its variants with up to one or two characters deleted. A query token is
+    looked up the same way, so finding candidates costs a bounded number of dict
+    lookups per token regardless of vocabulary size; candidates are then confirmed
+    with an edit distance check.
+    """
+
+    def __init__(self, terms: Mapping[str, Iterable[Any]]):
+        self._terms: Dict[str, Tuple[Any, ...]] = {}
+        self._deletes: Dict[str, Tuple[str, ...]] = {}
+        deletes: Dict[str, List[str]] = {}
+        for term, payloads in terms.items():
+            if len(term) < MIN_TERM_LENGTH or len(term) > MAX_TOKEN_LENGTH:
+                continue
+            self._terms[term] = tuple(payloads)
+            for variant in _deletes(term, _max_edits(len(term))):
+                deletes.setdefault(variant, []).append(term)
+        self._deletes = {variant: tuple(found) for variant, found in deletes.items()}
+
+    @classmethod
+    def from_symptom_database(cls, symptom_database: Mapping[str, Mapping[str, Any]]) -> 'FuzzyIndex':
+        """Index the words of every keyword and symptom name, mapped to symptom ids"""
+        terms: Dict[str, List[int]] = {}
+        for symptom_id, symptom_data in enumerate(symptom_database.values()):
+            phrases = list(symptom_data['keywords']) + [symptom_data['en'], symptom_data['ar']]
+            for phrase in phrases:
+                for word in _TOKEN_PATTERN.findall(normalize_text(phrase)):
+                    ids = terms.setdefault(word, [])
+                    if symptom_id not in ids:
+                        ids.append(symptom_id)
+        return cls(terms)
+
+    @classmethod
+    def from_state(cls, state: Tuple[Any, Any]) -> 'FuzzyIndex':
+        """Restore an index from state(), skipping delete generation"""
+        index = cls.__new__(cls)
+        index._terms, index._deletes = state
+        return index
+
+    def state(self) -> Tuple[Any, Any]:
+        """Plain (marshal-serializable) index tables"""
+        return self._terms, self._deletes
+
+    def lookup(self, normalized_text: str) -> Set[Any]:
+        """Return the payloads of vocabulary terms within edit distance of the text's words.
+
+        The text must already be normalized (text_normalizer.normalize_text).
+        """
+        found: Set[Any] = set()
+        for token in set(_TOKEN_PATTERN.findall(normalized_text)):
+            if len(token) < MIN_TERM_LENGTH or len(token) > MAX_TOKEN_LENGTH or token in COMMON_WORDS:
+                continue
+            if token in self._terms:
+                found.update(self._terms[token])
+                continue
+            for term in self._candidates(token):
+                limit = _max_edits(len(term))
+                if _edit_distance(token, term, limit) <= limit:
+                    found.update(self._terms[term])
+        return found
+
+    def _candidates(self, token: str) -> Set[str]:
+        candidates: Set[str] = set()
+        for variant in _deletes(token, _max_edits(len(token) + 1)):
+            candidates.update(self._deletes.get(variant, ()))
+        return candidates
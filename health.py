@@ -1,6 +1,14 @@
 from flask import Blueprint, jsonify
 from datetime import datetime
 from src.models.medical_user import db
+from src.services.analysis_cache import result_cache, inflight_analyses
+from src.services.stage_timing import stage_timings
+from src.services.job_queue import analysis_jobs
+from src.services.analysis_pool import analysis_pool
+from src.services.upload_store import upload_store
+from src.services.image_store import image_store
+from src.services.inference_scheduler import inference_scheduler
+from src.services.model_registry import model_registry
 
 health_bp = Blueprint('health', __name__)
 
@@ -64,6 +72,15 @@ def system_status():
                     'totalImageAnalyses': total_image_analyses,
                     'recentAnalyses24h': recent_analyses
                 },
+                'analysisCache': result_cache.stats(),
+                'analysisCoalescing': inflight_analyses.stats(),
+                'analysisJobs': analysis_jobs.stats(),
+                'analysisPool': analysis_pool.stats() if analysis_pool.enabled else None,
+                'imageUploads': upload_store.stats(),
+                'imageStore': image_store.stats(),
+                'imageInference': inference_scheduler.stats(),
+                'imageModels': model_registry.stats(),
+                'stageTimings': stage_timings.snapshot() if stage_timings.enabled else None,
                 'systemInfo': {
                     'version': '1.0.0',
                     'environment': 'development',
@@ -0,0 +1,146 @@
+"""Fast image quality pre-check for skin photos.
+
+Rejects unusable photos before any expensive analysis. The image is decoded at
+reduced resolution (JPEG DCT scaling through Image.draft, then an integer box
+reduction) to at most ANALYSIS_SIZE pixels on its longest side, and every metric
+is computed with NumPy over that grayscale array:
+
+- sharpness: variance of the 4-neighbour Laplacian (low for blurred images),
+- lighting: mean brightness and the share of clipped shadows / highlights,
+- contrast: standard deviation of the brightness,
+- resolution: shortest side of the original image (read from its header).
+
+Brightness statistics come from one 256-bin histogram. Thresholds are fixed at
+the analysis size, so they do not depend on the camera resolution.
+"""
+from typing import Any, BinaryIO, Dict, List, Union
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # NumPy and Pillow are only needed by the quality check
+    np = None
+    Image = None
+
+# Longest side, in pixels, of the decoded image the metrics are computed on
+ANALYSIS_SIZE = 512
+
+# Laplacian variance below which an image is too blurred to analyze
+MIN_LAPLACIAN_VARIANCE = 60.0
+# Shortest side, in pixels, of a usable original image
+MIN_RESOLUTION = 480
+# Lighting score below which the exposure is unusable
+MIN_LIGHTING = 0.3
+# Overall score of an acceptable image
+MIN_QUALITY_SCORE = 0.5
+
+# Brightness levels (0-255) counted as clipped
+SHADOW_LEVEL = 8
+HIGHLIGHT_LEVEL = 247
+
+# Weights of the factors in the overall score
+FACTOR_WEIGHTS = {'sharpness': 0.4, 'lighting': 0.3, 'contrast': 0.15, 'resolution': 0.15}
+
+QUALITY_RECOMMENDATIONS = {
+    'en': {
+        'blurred': 'Hold the camera steady and tap the skin area to focus',
+        'dark': 'Improve lighting - use daylight or a well-lit room',
+        'overexposed': 'Avoid direct flash or strong light that washes out the skin',
+        'low_contrast': 'Use even lighting and avoid shadows on the skin area',
+        'low_resolution': 'Move closer to the skin area or use a higher camera resolution'
+    },
+    'ar': {
+        'blurred': 'ثبّت الكاميرا وانقر على منطقة الجلد لضبط التركيز',
+        'dark': 'حسّن الإضاءة - استخدم ضوء النهار أو غرفة جيدة الإضاءة',
+        'overexposed': 'تجنب الفلاش المباشر أو الضوء القوي الذي يُبهت لون الجلد',
+        'low_contrast': 'استخدم إضاءة متساوية وتجنب الظلال على منطقة الجلد',
+        'low_resolution': 'اقترب من منطقة الجلد أو استخدم دقة أعلى للكاميرا'
+    }
+}
+
+
+def _clip(value: float) -> float:
+    return round(min(1.0, max(0.0, value)), 2)
+
+
+def _decode_reduced(image: 'Image.Image') -> 'np.ndarray':
+    """Grayscale pixels of image, at most ANALYSIS_SIZE pixels on the longest side"""
+    # JPEG: decode directly at the smallest 1/2, 1/4 or 1/8 scale keeping both sides
+    # at least ANALYSIS_SIZE / 2 (no effect on other formats)
+    image.draft('L', (ANALYSIS_SIZE // 2, ANALYSIS_SIZE // 2))
+    image = image.convert('L')
+    # Ceiling division: the longest side ends up at most ANALYSIS_SIZE, not below 2x
+    factor = -(-max(image.size) // ANALYSIS_SIZE)
+    if factor > 1:
+        image = image.reduce(factor)
+    return np.asarray(image)
+
+
+def assess_image_quality(source: Union[str, BinaryIO], language: str = 'en') -> Dict[str, Any]:
+    """Quality scores (0-1), raw metrics and recommendations for an image file.
+
+    Raises ImportError without NumPy/Pillow and ValueError for unreadable images.
+    """
+    if np is None:
+        raise ImportError('The image quality check requires NumPy and Pillow')
+
+    try:
+        with Image.open(source) as image:
+            width, height = image.size
+            pixels = _decode_reduced(image)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f'Unreadable image: {e}') from e
+
+    # Brightness statistics from one histogram pass
+    histogram = np.bincount(pixels.ravel(), minlength=256)
+    count = pixels.size
+    levels = np.arange(256)
+    mean = float(histogram @ levels) / count
+    std = (float(histogram @ (levels * levels)) / count - mean * mean) ** 0.5
+    shadows = float(histogram[:SHADOW_LEVEL + 1].sum()) / count
+    highlights = float(histogram[HIGHLIGHT_LEVEL:].sum()) / count
+
+    # Sharpness: variance of the Laplacian (slices, no convolution copy per kernel tap)
+    values = pixels.astype(np.float32)
+    laplacian = (values[1:-1, :-2] + values[1:-1, 2:] + values[:-2, 1:-1] + values[2:, 1:-1]
+                 - 4 * values[1:-1, 1:-1])
+    laplacian_variance = float(laplacian.var()) if laplacian.size else 0.0
+
+    factors = {
+        'sharpness': _clip(laplacian_variance / (4 * MIN_LAPLACIAN_VARIANCE)),
+        'lighting': _clip((1 - abs(mean / 255 - 0.5) * 2) * (1 - 2 * (shadows + highlights))),
+        'contrast': _clip(std / 64),
+        'resolution': _clip(min(width, height) / (2 * MIN_RESOLUTION))
+    }
+    score = round(sum(factors[name] * weight for name, weight in FACTOR_WEIGHTS.items()), 2)
+
+    issues: List[str] = []
+    if laplacian_variance < MIN_LAPLACIAN_VARIANCE:
+        issues.append('blurred')
+    if factors['lighting'] < 0.5:
+        issues.append('dark' if mean < 128 else 'overexposed')
+    if factors['contrast'] < 0.3:
+        issues.append('low_contrast')
+    if min(width, height) < MIN_RESOLUTION:
+        issues.append('low_resolution')
+
+    minimum_quality_met = (laplacian_variance >= MIN_LAPLACIAN_VARIANCE
+                           and min(width, height) >= MIN_RESOLUTION
+                           and factors['lighting'] >= MIN_LIGHTING)
+    recommendations = QUALITY_RECOMMENDATIONS.get(language, QUALITY_RECOMMENDATIONS['en'])
+    return {
+        'qualityScore': score,
+        'qualityFactors': factors,
+        'recommendations': [recommendations[issue] for issue in issues],
+        'acceptable': minimum_quality_met and score >= MIN_QUALITY_SCORE,
+        'minimumQualityMet': minimum_quality_met,
+        'metrics': {
+            'width': width,
+            'height': height,
+            'laplacianVariance': round(laplacian_variance, 1),
+            'meanBrightness': round(mean, 1),
+            'brightnessStdDev': round(std, 1),
+            'clippedShadows': round(shadows, 4),
+            'clippedHighlights': round(highlights, 4)
+        }
+    }
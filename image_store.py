@@ -0,0 +1,214 @@
+"""Content-addressed storage of uploaded images, with derived renditions.
+
+An image is stored once per content, at objects/<aa>/<sha256><ext> (aa: the first
+two hex digits) under IMAGE_UPLOAD_DIR; that relative path is its key, kept in
+ImageAnalysis.image_path. Uploading the same bytes again keeps the existing blob
+(exact-duplicate elimination), so any number of analyses may share one key.
+
+Renditions are derived once, when a blob is first stored, from a single
+reduced-resolution decode (see image_quality for the JPEG draft decode):
+
+- thumbnail: JPEG of at most IMAGE_THUMBNAIL_SIZE pixels, for the UI,
+- model: the IMAGE_MODEL_INPUT_SIZE square model input (centre crop, RGB) as an
+  uncompressed .npy array, which consumers memory-map instead of decoding.
+
+Blobs are removed by release() once no analysis references them (see the
+session hooks in routes/images.py) and by collect_garbage() sweeps. A blob stored
+or deduplicated within the last IMAGE_GC_GRACE_SECONDS is always kept: an upload
+may have stored it while its analysis row is not committed yet.
+"""
+import os
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+try:
+    import numpy as np
+    from PIL import Image, ImageOps
+except ImportError:  # NumPy and Pillow are only needed for renditions
+    np = None
+    Image = None
+
+from src.services.upload_store import DEFAULT_UPLOAD_DIR
+
+# Rendition name -> file suffix
+RENDITIONS = {'thumbnail': '.thumbnail.jpg', 'model': '.model.npy'}
+
+
+def _write_atomically(path: str, write) -> None:
+    """Create path through a temporary file, so readers never see a partial file"""
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp.', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            write(temp_file)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class ImageStore:
+    """Content-addressed blobs under directory/objects, renditions under directory/renditions"""
+
+    def __init__(self, directory: str = DEFAULT_UPLOAD_DIR, thumbnail_size: int = 256,
+                 model_input_size: int = 224, grace_period: float = 300):
+        self.directory = directory
+        self.thumbnail_size = thumbnail_size
+        self.model_input_size = model_input_size
+        self.grace_period = grace_period
+        self.objects_directory = os.path.join(directory, 'objects')
+        self.renditions_directory = os.path.join(directory, 'renditions')
+        self.stored = 0
+        self.duplicates = 0
+        self.removed = 0
+
+    @classmethod
+    def from_env(cls) -> 'ImageStore':
+        """Configure from IMAGE_UPLOAD_DIR / IMAGE_THUMBNAIL_SIZE / IMAGE_MODEL_INPUT_SIZE /
+        IMAGE_GC_GRACE_SECONDS"""
+        return cls(
+            directory=os.environ.get('IMAGE_UPLOAD_DIR', DEFAULT_UPLOAD_DIR),
+            thumbnail_size=int(os.environ.get('IMAGE_THUMBNAIL_SIZE', 256)),
+            model_input_size=int(os.environ.get('IMAGE_MODEL_INPUT_SIZE', 224)),
+            grace_period=float(os.environ.get('IMAGE_GC_GRACE_SECONDS', 300))
+        )
+
+    @staticmethod
+    def is_key(key: str) -> bool:
+        """Whether key names a content-addressed blob (older uploads used other paths)"""
+        return key.startswith('objects/')
+
+    def path(self, key: str) -> str:
+        """Absolute path of the blob (or older upload) at key"""
+        path = os.path.normpath(os.path.join(self.directory, key))
+        if not path.startswith(os.path.normpath(self.directory) + os.sep):
+            raise ValueError(f'Invalid image key: {key!r}')
+        return path
+
+    def rendition_path(self, key: str, rendition: str) -> str:
+        digest = os.path.splitext(os.path.basename(key))[0]
+        return os.path.join(self.renditions_directory, digest[:2], digest + RENDITIONS[rendition])
+
+    def put(self, path: str, sha256: str, extension: str) -> Tuple[str, bool]:
+        """Move the file at path (with the given SHA-256) into the store: (key, newly stored).
+
+        When the content is already stored, the file is removed instead and the
+        existing blob is touched, which protects it from garbage collection until
+        the caller has committed its reference.
+        """
+        key = f'objects/{sha256[:2]}/{sha256}{extension}'
+        destination = self.path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.exists(destination):
+            os.utime(destination)
+            _remove(path)
+            self.duplicates += 1
+            created = False
+        else:
+            os.replace(path, destination)
+            self.stored += 1
+            created = True
+        if not all(os.path.exists(self.rendition_path(key, name)) for name in RENDITIONS):
+            self.make_renditions(key)
+        return key, created
+
+    def make_renditions(self, key: str) -> bool:
+        """Derive the renditions of a blob from one reduced decode; False without Pillow"""
+        if Image is None:
+            return False
+        size = max(self.thumbnail_size, self.model_input_size)
+        with Image.open(self.path(key)) as image:
+            # JPEG: decode at the smallest DCT scale keeping both sides >= size
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+
+        thumbnail = image.copy()
+        thumbnail.thumbnail((self.thumbnail_size, self.thumbnail_size), Image.Resampling.BILINEAR)
+        model_input = ImageOps.fit(image, (self.model_input_size, self.model_input_size),
+                                   Image.Resampling.BILINEAR)
+
+        os.makedirs(os.path.dirname(self.rendition_path(key, 'thumbnail')), exist_ok=True)
+        _write_atomically(self.rendition_path(key, 'thumbnail'),
+                          lambda target: thumbnail.save(target, 'JPEG', quality=85))
+        _write_atomically(self.rendition_path(key, 'model'),
+                          lambda target: np.save(target, np.asarray(model_input, dtype=np.uint8)))
+        return True
+
+    def load_model_input(self, key: str) -> 'np.ndarray':
+        """Model input (height x width x 3 uint8) of a blob, memory-mapped read-only.
+
+        The pages come from the page cache and are shared by every process reading
+        the same image; nothing is decoded or copied.
+        """
+        path = self.rendition_path(key, 'model')
+        if not os.path.exists(path):
+            self.make_renditions(key)
+        return np.load(path, mmap_mode='r')
+
+    def release(self, keys: Iterable[str]) -> int:
+        """Remove blobs no longer referenced (the caller checked); returns how many were removed"""
+        removed = 0
+        cutoff = time.time() - self.grace_period
+        for key in keys:
+            if self.is_key(key) and self._remove_blob(key, cutoff):
+                removed += 1
+        return removed
+
+    def collect_garbage(self, referenced: Set[str]) -> int:
+        """Remove every blob not in referenced (and renditions without a blob)"""
+        cutoff = time.time() - self.grace_period
+        removed = 0
+        for directory, _, names in os.walk(self.objects_directory):
+            for name in names:
+                if name.startswith('.'):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name), self.directory).replace(os.sep, '/')
+                if key not in referenced and self._remove_blob(key, cutoff):
+                    removed += 1
+
+        digests = {os.path.splitext(os.path.basename(key))[0] for key in referenced if self.is_key(key)}
+        for directory, _, names in os.walk(self.renditions_directory):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.split('.')[0] not in digests and _older_than(path, cutoff):
+                    _remove(path)
+        return removed
+
+    def _remove_blob(self, key: str, cutoff: float) -> bool:
+        path = self.path(key)
+        if not _older_than(path, cutoff):
+            return False
+        for name in RENDITIONS:
+            _remove(self.rendition_path(key, name))
+        if _remove(path):
+            self.removed += 1
+            return True
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'stored': self.stored,
+            'duplicates': self.duplicates,
+            'removed': self.removed,
+            'renditions': Image is not None
+        }
+
+
+def _older_than(path: str, cutoff: float) -> bool:
+    try:
+        return os.stat(path).st_mtime < cutoff
+    except FileNotFoundError:
+        return False
+
+
+# Image blobs shared by the workers (routes/images.py)
+image_store = ImageStore.from_env()
@@ -0,0 +1,549 @@
+from flask import Blueprint, current_app, request, jsonify, send_file, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime, timedelta
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+from src.models.medical_user import MedicalUser, ImageAnalysis, db
+from src.services.upload_store import upload_store, UploadError
+from src.services.image_quality import assess_image_quality
+from src.services.image_store import image_store
+from src.services.inference_scheduler import inference_scheduler
+from src.services.skin_model import interpret_prediction
+import json
+import os
+
+images_bp = Blueprint('images', __name__)
+
+# Largest accepted form fields besides the image (the metadata JSON); also bounds
+# the multipart parser's buffer, so it must leave room for a few read buffers
+MAX_METADATA_SIZE = 512 * 1024
+
+# Reported to clients as the expected time from upload to analysis result
+ESTIMATED_ANALYSIS_TIME = timedelta(seconds=int(os.environ.get('IMAGE_ANALYSIS_ESTIMATE_SECONDS', 30)))
+
+# Image analyses still 'processing' after this long were lost (worker crash or
+# restart) and are queued again
+STALE_ANALYSIS_AGE = timedelta(seconds=float(os.environ.get('IMAGE_ANALYSIS_STALE_SECONDS', 300)))
+
+def _error(code, message, status, headers=None, details=None):
+    error = {
+        'code': code,
+        'message': message,
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    if details is not None:
+        error['details'] = details
+    return jsonify({
+        'success': False,
+        'error': error
+    }), status, headers or {}
+
+def _consenting_user():
+    """(user id, None) for the current user if they may upload images, else (None, error response)"""
+    current_user_id = get_jwt_identity()
+    user = MedicalUser.query.get(current_user_id)
+    if not user:
+        return None, _error('USER_NOT_FOUND', 'User not found', 404)
+    if not user.consent_to_medical_analysis:
+        return None, _error('CONSENT_REQUIRED', 'Medical analysis consent is required', 403)
+    return current_user_id, None
+
+def _parse_metadata(metadata):
+    """Validated image metadata (a dict, or a JSON object string)"""
+    if metadata is None or metadata == '':
+        metadata = {}
+    elif isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except ValueError:
+            raise UploadError('VALIDATION_ERROR', 'Metadata must be a JSON object')
+    if not isinstance(metadata, dict):
+        raise UploadError('VALIDATION_ERROR', 'Metadata must be a JSON object')
+    if metadata.get('language', 'en') not in ['en', 'ar']:
+        raise UploadError('VALIDATION_ERROR', 'Language must be "en" or "ar"')
+    return metadata
+
+def _parse_image_form(writers):
+    """Parse the multipart form of the request: (form fields, ImageWriter of the 'image' part).
+
+    Every file part is streamed to disk and hashed as it is parsed, one buffer at a
+    time; its writer is added to writers, for the caller to store or discard.
+    """
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        writer = upload_store.open_writer()
+        writers.append(writer)
+        return writer
+
+    if request.content_length is not None and request.content_length > upload_store.max_size + MAX_METADATA_SIZE:
+        raise UploadError('FILE_TOO_LARGE', f'Images are limited to {upload_store.max_size} bytes', 413)
+    try:
+        _, form, files = parse_form_data(
+            request.environ,
+            stream_factory=stream_factory,
+            max_form_memory_size=MAX_METADATA_SIZE,
+            max_content_length=upload_store.max_size + MAX_METADATA_SIZE,
+            silent=False
+        )
+    except RequestEntityTooLarge:
+        raise UploadError('FILE_TOO_LARGE', f'Images are limited to {upload_store.max_size} bytes', 413)
+    except (BadRequest, ValueError):
+        raise UploadError('VALIDATION_ERROR', 'Malformed multipart upload')
+
+    image = files.get('image')
+    if image is None:
+        raise UploadError('VALIDATION_ERROR', 'An image file is required')
+    return form, image.stream
+
+def _assess_quality(path, language):
+    """Quality of an image file (None without NumPy/Pillow); unusable images raise UploadError"""
+    try:
+        quality = assess_image_quality(path, language)
+    except ImportError:
+        return None
+    except ValueError:
+        raise UploadError('INVALID_IMAGE', 'The image could not be decoded', 422)
+    if not quality['minimumQualityMet']:
+        raise UploadError('IMAGE_QUALITY_TOO_LOW', 'The image is not usable for analysis', 422, details=quality)
+    return quality
+
+def _start_analysis(user_id, stored, metadata):
+    """Record an uploaded image for analysis; returns the 202 response.
+
+    Images failing the quality check are rejected here, before any analysis. The
+    image then moves to the content-addressed store (a duplicate is not kept twice).
+    """
+    quality = _assess_quality(stored.path, metadata.get('language', 'en'))
+    key, created = image_store.put(stored.path, stored.sha256, stored.extension)
+    analysis = ImageAnalysis(
+        user_id=user_id,
+        image_path=key,
+        image_metadata={**metadata, 'upload': {**stored.to_dict(), 'duplicate': not created}},
+        image_quality=quality,
+        status='processing'
+    )
+    db.session.add(analysis)
+    db.session.commit()
+
+    if not _queue_analysis(current_app._get_current_object(), analysis.id, key, metadata):
+        db.session.delete(analysis)
+        db.session.commit()
+        return _error('SERVICE_BUSY', 'Too many image analyses are in progress. Please try again shortly.', 503,
+                      headers={'Retry-After': '5'})
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'analysisId': analysis.id,
+            'uploadId': stored.upload_id,
+            'status': analysis.status,
+            'estimatedCompletionTime': (analysis.created_at + ESTIMATED_ANALYSIS_TIME).isoformat() + 'Z'
+        },
+        'message': 'Image uploaded successfully, analysis in progress'
+    }), 202, {'Location': url_for('images.get_image_analysis', analysis_id=analysis.id)}
+
+def _record_inference_results(results, model):
+    """Record a batch of model results in one commit (runs on the inference batcher thread).
+
+    Every result's args are (app, analysis id, language), as queued by _queue_analysis.
+    Without a model, or with a stand-in that is not diagnostic (see
+    SkinConditionModel.diagnostic), the analyses fail: no prediction of theirs is
+    shown to users as a diagnosis.
+    """
+    app = results[0].args[0]
+    with app.app_context():
+        for result in results:
+            _, analysis_id, language = result.args
+            if model is None or result.error is not None or not model.diagnostic:
+                columns = {'status': 'failed', 'model_version': None if model is None else model.version}
+            else:
+                interpreted = interpret_prediction(result.probabilities, model.labels, language)
+                columns = {
+                    'skin_condition_analysis': interpreted['skinConditionAnalysis'],
+                    'risk_assessment': interpreted['riskAssessment'],
+                    'model_version': model.version,
+                    'confidence_calibration': model.calibration,
+                    'status': 'completed',
+                    'completed_at': datetime.utcnow()
+                }
+            # Only a row still processing is updated: a recovered analysis may run twice
+            ImageAnalysis.query.filter_by(id=analysis_id, status='processing').update(
+                columns, synchronize_session=False
+            )
+        db.session.commit()
+
+def _queue_analysis(app, analysis_id, key, metadata):
+    return inference_scheduler.submit(_record_inference_results, key, app, analysis_id,
+                                      (metadata or {}).get('language', 'en'))
+
+def _claim_stale(analysis_id):
+    """Mark a stale image analysis as requeued now; False if it is not stale or was
+    already claimed within STALE_ANALYSIS_AGE (one conditional UPDATE, so each
+    worker recovering at start-up or request polling it cannot queue it again)"""
+    now = datetime.utcnow()
+    cutoff = now - STALE_ANALYSIS_AGE
+    claimed = ImageAnalysis.query.filter(
+        ImageAnalysis.id == analysis_id,
+        ImageAnalysis.status == 'processing',
+        ImageAnalysis.created_at < cutoff,
+        or_(ImageAnalysis.requeued_at.is_(None), ImageAnalysis.requeued_at < cutoff)
+    ).update({'requeued_at': now}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def _requeue(app, analyses):
+    """Claim and queue (analysis id, image key, metadata) rows again; returns how many were queued"""
+    queued = 0
+    with app.app_context():
+        for analysis_id, key, metadata in analyses:
+            if not _claim_stale(analysis_id):
+                continue
+            if _queue_analysis(app, analysis_id, key, metadata):
+                queued += 1
+            else:
+                # Release the claim so the next fetch can try again
+                ImageAnalysis.query.filter_by(id=analysis_id).update(
+                    {'requeued_at': None}, synchronize_session=False
+                )
+                db.session.commit()
+    return queued
+
+def recover_stale_image_analyses(app):
+    """Queue again image analyses left 'processing' by a crashed or restarted worker.
+
+    Called at start-up by every worker; each row is claimed before it is queued,
+    so only one of them queues it. Rows the scheduler cannot take now are retried
+    when they are next fetched (see get_image_analysis).
+    """
+    with app.app_context():
+        stale = db.session.query(ImageAnalysis.id, ImageAnalysis.image_path, ImageAnalysis.image_metadata).filter(
+            ImageAnalysis.status == 'processing',
+            ImageAnalysis.created_at < datetime.utcnow() - STALE_ANALYSIS_AGE
+        ).all()
+    return _requeue(app, stale)
+
+def _remove_stored(stored):
+    """Remove an upload that did not reach the image store"""
+    if stored is not None and os.path.exists(stored.path):
+        os.unlink(stored.path)
+
+@images_bp.route('/images/upload', methods=['POST'])
+@jwt_required()
+def upload_image():
+    """Upload a skin image in one multipart request (fields: image, metadata)"""
+    current_user_id, error_response = _consenting_user()
+    if error_response:
+        return error_response
+
+    writers = []
+    stored = None
+    try:
+        form, writer = _parse_image_form(writers)
+        metadata = _parse_metadata(form.get('metadata'))
+        stored = upload_store.store(writer)
+        writers.remove(writer)
+        return _start_analysis(current_user_id, stored, metadata)
+    except UploadError as e:
+        _remove_stored(stored)
+        return _error(e.code, e.message, e.status, details=e.details)
+    except Exception as e:
+        db.session.rollback()
+        _remove_stored(stored)
+        return _error('INTERNAL_SERVER_ERROR', 'An unexpected error occurred', 500)
+    finally:
+        for writer in writers:
+            writer.discard()
+
+@images_bp.route('/images/quality-check', methods=['POST'])
+@jwt_required()
+def check_image_quality():
+    """Pre-upload quality check of an image (fields: image, language).
+
+    Clients should send a preview downscaled to about 1024 pixels: decoding a full
+    camera image costs more than the check itself.
+    """
+    writers = []
+    try:
+        form, writer = _parse_image_form(writers)
+        language = form.get('language', 'en')
+        if language not in ['en', 'ar']:
+            raise UploadError('VALIDATION_ERROR', 'Language must be "en" or "ar"')
+        writer.close()
+        quality = assess_image_quality(writer.path, language)
+    except UploadError as e:
+        return _error(e.code, e.message, e.status)
+    except ImportError:
+        return _error('SERVICE_UNAVAILABLE', 'Image quality checks are not available', 503)
+    except ValueError:
+        return _error('INVALID_IMAGE', 'The image could not be decoded', 422)
+    finally:
+        for writer in writers:
+            writer.discard()
+
+    return jsonify({
+        'success': True,
+        'data': quality
+    }), 200
+
+def _session_headers(session):
+    return {
+        'Upload-Offset': str(session.offset),
+        'Upload-Length': str(session.length),
+        'Cache-Control': 'no-store'
+    }
+
+def _own_session(upload_id, user_id):
+    session = upload_store.get_session(upload_id)
+    if session is None or session.user_id != user_id:
+        raise UploadError('UPLOAD_NOT_FOUND', 'Upload not found or expired', 404)
+    return session
+
+@images_bp.route('/images/uploads', methods=['POST'])
+@jwt_required()
+def create_upload():
+    """Start a resumable upload: {length, filename?, metadata?}"""
+    current_user_id, error_response = _consenting_user()
+    if error_response:
+        return error_response
+
+    try:
+        data = request.get_json(silent=True) or {}
+        length = data.get('length')
+        if not isinstance(length, int) or isinstance(length, bool):
+            raise UploadError('VALIDATION_ERROR', 'Upload length (bytes) is required')
+        filename = data.get('filename')
+        session = upload_store.new_session(
+            current_user_id,
+            length,
+            filename=str(filename)[:255] if filename else None,
+            metadata=_parse_metadata(data.get('metadata'))
+        )
+    except UploadError as e:
+        return _error(e.code, e.message, e.status)
+
+    headers = _session_headers(session)
+    headers['Location'] = url_for('images.upload_status', upload_id=session.upload_id)
+    return jsonify({
+        'success': True,
+        'data': {**session.to_dict(), 'chunkSize': upload_store.chunk_size}
+    }), 201, headers
+
+@images_bp.route('/images/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def upload_status(upload_id):
+    """Offset to resume from (also as HEAD, in the Upload-Offset header)"""
+    try:
+        session = _own_session(upload_id, get_jwt_identity())
+    except UploadError as e:
+        return _error(e.code, e.message, e.status)
+
+    return jsonify({
+        'success': True,
+        'data': session.to_dict()
+    }), 200, _session_headers(session)
+
+@images_bp.route('/images/uploads/<upload_id>', methods=['PATCH'])
+@jwt_required()
+def append_upload(upload_id):
+    """Append the request body at the offset given in the Upload-Offset header"""
+    try:
+        session = _own_session(upload_id, get_jwt_identity())
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            raise UploadError('VALIDATION_ERROR', 'Upload-Offset header is required')
+        if request.content_length is not None and offset + request.content_length > session.length:
+            raise UploadError('FILE_TOO_LARGE', 'The chunk goes past the upload length', 413)
+        upload_store.append(session, offset, request.stream.read)
+    except UploadError as e:
+        headers = {}
+        if e.code == 'OFFSET_MISMATCH':
+            headers = _session_headers(upload_store.get_session(upload_id) or session)
+        return _error(e.code, e.message, e.status, headers)
+    except BadRequest:
+        # The client went away mid-chunk: what arrived is kept, the next request resumes
+        return _error('UPLOAD_INTERRUPTED', 'The chunk was not received completely', 400)
+
+    return '', 204, _session_headers(session)
+
+@images_bp.route('/images/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_upload(upload_id):
+    """Abandon a resumable upload"""
+    try:
+        upload_store.discard(_own_session(upload_id, get_jwt_identity()).upload_id)
+    except UploadError as e:
+        return _error(e.code, e.message, e.status)
+    return '', 204
+
+@images_bp.route('/images/uploads/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload(upload_id):
+    """Finish a resumable upload and start the analysis of the image"""
+    current_user_id, error_response = _consenting_user()
+    if error_response:
+        return error_response
+
+    stored = None
+    try:
+        session = _own_session(upload_id, current_user_id)
+        data = request.get_json(silent=True) or {}
+        metadata = _parse_metadata(data['metadata']) if 'metadata' in data else session.metadata or {}
+        stored = upload_store.complete(session)
+        return _start_analysis(current_user_id, stored, metadata)
+    except UploadError as e:
+        _remove_stored(stored)
+        return _error(e.code, e.message, e.status, details=e.details)
+    except Exception as e:
+        db.session.rollback()
+        _remove_stored(stored)
+        return _error('INTERNAL_SERVER_ERROR', 'An unexpected error occurred', 500)
+
+def _own_analysis(analysis_id):
+    return ImageAnalysis.query.filter_by(id=analysis_id, user_id=get_jwt_identity()).first()
+
+@images_bp.route('/images/<analysis_id>/status', methods=['GET'])
+@jwt_required()
+def get_image_analysis_status(analysis_id):
+    """Progress of an image analysis"""
+    analysis = _own_analysis(analysis_id)
+    if not analysis:
+        return _error('ANALYSIS_NOT_FOUND', 'Analysis not found', 404)
+
+    headers = {}
+    remaining = 0
+    if analysis.status == 'processing':
+        expected = analysis.created_at + ESTIMATED_ANALYSIS_TIME
+        remaining = max(0, int((expected - datetime.utcnow()).total_seconds()))
+        headers['Retry-After'] = '1'
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'analysisId': analysis.id,
+            'status': analysis.status,
+            'progress': 0 if analysis.status == 'processing' else 100,
+            'currentStage': {'processing': 'queued', 'completed': 'analysis_complete'}.get(analysis.status,
+                                                                                         'analysis_failed'),
+            'estimatedTimeRemaining': remaining
+        }
+    }), 200, headers
+
+@images_bp.route('/images/<analysis_id>', methods=['GET'])
+@jwt_required()
+def get_image_analysis(analysis_id):
+    """Get specific image analysis results"""
+    analysis = _own_analysis(analysis_id)
+    if not analysis:
+        return _error('ANALYSIS_NOT_FOUND', 'Analysis not found', 404)
+
+    headers = {}
+    if analysis.status == 'processing':
+        if datetime.utcnow() - analysis.created_at > STALE_ANALYSIS_AGE:
+            _requeue(current_app._get_current_object(),
+                     [(analysis.id, analysis.image_path, analysis.image_metadata)])
+        # Still running: tell the client when to poll again
+        headers['Retry-After'] = '1'
+
+    return jsonify({
+        'success': True,
+        'data': analysis.to_dict()
+    }), 200, headers
+
+@images_bp.route('/images/<analysis_id>/file', methods=['GET'])
+@jwt_required()
+def get_image_file(analysis_id):
+    """The uploaded image, or its thumbnail with ?rendition=thumbnail.
+
+    The file is sent by the WSGI server's file wrapper (sendfile) or, when
+    IMAGE_ACCEL_REDIRECT_PREFIX is set, by the front proxy (X-Accel-Redirect); the
+    bytes never pass through Python.
+    """
+    analysis = _own_analysis(analysis_id)
+    if not analysis:
+        return _error('ANALYSIS_NOT_FOUND', 'Analysis not found', 404)
+
+    rendition = request.args.get('rendition', 'original')
+    if rendition not in ('original', 'thumbnail'):
+        return _error('VALIDATION_ERROR', 'Rendition must be "original" or "thumbnail"', 400)
+
+    key = analysis.image_path
+    path = image_store.path(key)
+    mimetype = ((analysis.image_metadata or {}).get('upload') or {}).get('contentType')
+    if rendition == 'thumbnail' and image_store.is_key(key):
+        thumbnail_path = image_store.rendition_path(key, 'thumbnail')
+        if os.path.exists(thumbnail_path) or (os.path.exists(path) and image_store.make_renditions(key)):
+            path, mimetype = thumbnail_path, 'image/jpeg'
+    if not os.path.exists(path):
+        return _error('IMAGE_NOT_FOUND', 'Image file not found', 404)
+
+    accel_prefix = os.environ.get('IMAGE_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        response = current_app.response_class(mimetype=mimetype)
+        relative_path = os.path.relpath(path, image_store.directory).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{relative_path}"
+    else:
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=os.path.basename(path))
+
+    # Content-addressed files never change; other users must not get them from shared caches
+    if image_store.is_key(key):
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@images_bp.route('/images/<analysis_id>', methods=['DELETE'])
+@jwt_required()
+def delete_image_analysis(analysis_id):
+    """Delete an image analysis (its image goes once no other analysis uses it)"""
+    try:
+        analysis = _own_analysis(analysis_id)
+        if not analysis:
+            return _error('ANALYSIS_NOT_FOUND', 'Analysis not found', 404)
+
+        db.session.delete(analysis)
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': 'Analysis deleted successfully'
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return _error('INTERNAL_SERVER_ERROR', 'An unexpected error occurred', 500)
+
+# Stored images are reference-counted by the image analyses using them: deleting
+# an analysis (or a user, through the cascade) releases its image once the
+# deletion is committed and no other analysis references the same content.
+
+@event.listens_for(Session, 'after_flush')
+def find_released_images(session, flush_context):
+    keys = {obj.image_path for obj in session.deleted if isinstance(obj, ImageAnalysis)}
+    if not keys:
+        return
+    still_referenced = set(session.connection().execute(
+        select(ImageAnalysis.image_path).where(ImageAnalysis.image_path.in_(keys))
+    ).scalars())
+    session.info.setdefault('released_images', set()).update(keys - still_referenced)
+
+@event.listens_for(Session, 'after_commit')
+def remove_released_images(session):
+    released = session.info.pop('released_images', None)
+    if released:
+        image_store.release(released)
+
+@event.listens_for(Session, 'after_rollback')
+def keep_released_images(session):
+    session.info.pop('released_images', None)
+
+def collect_image_garbage(app):
+    """Remove stored images no analysis references (e.g. rows deleted in bulk, or
+    uploads interrupted between storing the image and committing the analysis).
+
+    Called at start-up; images stored within the grace period are kept.
+    """
+    with app.app_context():
+        referenced = set(db.session.execute(select(ImageAnalysis.image_path).distinct()).scalars())
+    return image_store.collect_garbage(referenced)
@@ -0,0 +1,221 @@
+"""Micro-batching scheduler for skin image inference.
+
+Image analyses are queued here instead of running one by one: a single batcher
+thread per process takes the oldest queued image, then keeps collecting until the
+batch holds max_batch_size images or max_wait has passed since that oldest image
+was queued, and runs the whole batch through the model in one predict() call.
+Under load batches fill up at once and the per-call cost of the model (weight
+traffic, interpreter overhead) is shared by the batch; when idle, an image waits
+at most max_wait before it runs alone.
+
+Results are handed back per batch, so the caller can record all of them in one
+database commit. The model is fetched from model_provider (by default the
+model registry) once per batch: a batch runs entirely on one model version, and
+a newly activated version takes over from the next batch. When no model can be
+fetched (none active, or NumPy missing), every image of the batch gets that
+error and the handler gets no model.
+
+Exported by GET /api/metrics: image_inference_queue_depth,
+image_inference_batch_size, image_inference_batch_duration_seconds and
+image_inference_latency_seconds (from queueing to results handed back).
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed to run batches
+    np = None
+
+from src.services.image_store import image_store
+from src.services.metrics_registry import metrics
+from src.services.model_registry import model_registry
+from src.services.skin_model import SkinConditionModel
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+queue_depth = metrics.gauge(
+    'image_inference_queue_depth', 'Images queued for inference, not yet in a batch'
+)
+batch_size = metrics.histogram(
+    'image_inference_batch_size', 'Images per inference batch', buckets=BATCH_SIZE_BUCKETS
+)
+batch_duration = metrics.histogram(
+    'image_inference_batch_duration_seconds', 'Time to load the inputs of a batch and run the model'
+)
+inference_latency = metrics.histogram(
+    'image_inference_latency_seconds', 'Time from queueing an image to handing back its result'
+)
+
+
+class InferenceResult(NamedTuple):
+    """Outcome for one queued image: the submit() arguments, then probabilities or the error"""
+    args: Tuple[Any, ...]
+    probabilities: Optional['np.ndarray']
+    error: Optional[Exception]
+
+
+# handler(results, model), called once per batch with the results of its images;
+# model is None when none could be fetched (every result then carries the error)
+ResultHandler = Callable[[List[InferenceResult], Optional[SkinConditionModel]], None]
+
+
+class InferenceScheduler:
+    """Bounded queue of images, run through the model in micro-batches.
+
+    At most max_pending images wait at a time; submit() returns False beyond that.
+    Like JobQueue, the batcher thread starts on first use and again in a forked
+    child.
+    """
+
+    def __init__(self, max_batch_size: int = 16, max_wait: float = 0.02, max_pending: int = 1000,
+                 model_provider: Optional[Callable[[], SkinConditionModel]] = None,
+                 load_input: Optional[Callable[[str], Any]] = None, name: str = 'image-inference'):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.model_provider = model_provider or model_registry.current
+        self.load_input = load_input or image_store.load_model_input
+        self.name = name
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.batches = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> 'InferenceScheduler':
+        """Configure from IMAGE_INFERENCE_MAX_BATCH / IMAGE_INFERENCE_MAX_WAIT_MS /
+        IMAGE_INFERENCE_QUEUE_SIZE"""
+        return cls(
+            max_batch_size=int(os.environ.get('IMAGE_INFERENCE_MAX_BATCH', 16)),
+            max_wait=float(os.environ.get('IMAGE_INFERENCE_MAX_WAIT_MS', 20)) / 1000,
+            max_pending=int(os.environ.get('IMAGE_INFERENCE_QUEUE_SIZE', 1000))
+        )
+
+    def _get_queue(self) -> queue.Queue:
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                # Threads do not survive fork: start over with a new batcher
+                self._queue = queue.Queue()
+                self._pending = 0
+                threading.Thread(target=self._run, args=(self._queue,), name=self.name, daemon=True).start()
+                self._pid = os.getpid()
+            return self._queue
+
+    def submit(self, handler: ResultHandler, key: str, *args: Any) -> bool:
+        """Queue the image stored at key; handler later gets InferenceResult(args, ...).
+        False if the queue is full."""
+        jobs = self._get_queue()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._pending += 1
+        queue_depth.inc()
+        jobs.put((time.monotonic(), handler, key, args))
+        return True
+
+    def _run(self, jobs: queue.Queue) -> None:
+        while True:
+            batch = [jobs.get()]
+            # The wait is counted from when the oldest image was queued, so an image
+            # that already waited behind a running batch is not held back further
+            deadline = batch[0][0] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(jobs.get(timeout=remaining) if remaining > 0 else jobs.get_nowait())
+                except queue.Empty:
+                    break
+            with self._lock:
+                if jobs is self._queue:
+                    self._pending -= len(batch)
+            queue_depth.dec(amount=len(batch))
+            try:
+                self._run_batch(batch)
+            except Exception:
+                # Unexpected failure: the analyses stay 'processing' and are queued
+                # again once stale
+                logger.exception('Inference batch of %d images failed', len(batch))
+                with self._lock:
+                    self.failed += len(batch)
+
+    def _run_batch(self, batch: List[Tuple[float, ResultHandler, str, Tuple[Any, ...]]]) -> None:
+        started = time.monotonic()
+        try:
+            model = self.model_provider()
+        except Exception as e:
+            logger.warning('No model to run an inference batch of %d images: %s', len(batch), e)
+            model = None
+            results = [InferenceResult(args, None, e) for _, _, _, args in batch]
+        else:
+            results = self._predict(model, batch)
+        batch_size.observe(len(batch))
+        batch_duration.observe(time.monotonic() - started)
+
+        # One handler call per handler in the batch (normally a single one)
+        by_handler: Dict[ResultHandler, List[int]] = {}
+        for position, (_, handler, _, _) in enumerate(batch):
+            by_handler.setdefault(handler, []).append(position)
+        failed = sum(result.error is not None for result in results)
+        for handler, handler_positions in by_handler.items():
+            try:
+                handler([results[position] for position in handler_positions], model)
+            except Exception:
+                logger.exception('Result handler failed for %d images', len(handler_positions))
+                failed += sum(results[position].error is None for position in handler_positions)
+        finished = time.monotonic()
+        for enqueued, _, _, _ in batch:
+            inference_latency.observe(finished - enqueued)
+        with self._lock:
+            self.batches += 1
+            self.completed += len(batch) - failed
+            self.failed += failed
+
+    def _predict(self, model: SkinConditionModel,
+                 batch: List[Tuple[float, ResultHandler, str, Tuple[Any, ...]]]) -> List[InferenceResult]:
+        results: List[Optional[InferenceResult]] = [None] * len(batch)
+        inputs, positions = [], []
+        for position, (_, _, key, args) in enumerate(batch):
+            try:
+                inputs.append(self.load_input(key))
+                positions.append(position)
+            except Exception as e:
+                results[position] = InferenceResult(args, None, e)
+        if inputs:
+            try:
+                probabilities = model.predict(np.stack(inputs))
+                for position, row in zip(positions, probabilities):
+                    results[position] = InferenceResult(batch[position][3], row, None)
+            except Exception as e:
+                for position in positions:
+                    results[position] = InferenceResult(batch[position][3], None, e)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'maxBatchSize': self.max_batch_size,
+                'maxWaitMs': round(self.max_wait * 1000, 1),
+                'capacity': self.max_pending,
+                'queued': self._pending,
+                'batches': self.batches,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'meanBatchSize': round((self.completed + self.failed) / self.batches, 2) if self.batches else None
+            }
+
+
+# Batches image analyses for the skin condition model (routes/images.py)
+inference_scheduler = InferenceScheduler.from_env()
@@ -0,0 +1,118 @@
+import itertools
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Job priorities: lower runs first
+PRIORITY_URGENT = 0
+PRIORITY_ROUTINE = 1
+
+
+class JobQueue:
+    """Bounded background job runner with priorities.
+
+    Jobs run on a fixed set of worker threads, highest priority first (FIFO within
+    a priority), so an urgent job waits at most for a worker to finish its current
+    job, never behind queued routine ones. At most max_workers + max_pending jobs
+    are accepted at a time (running or waiting); submit() returns False instead of
+    queueing beyond that, so callers can shed load (HTTP 503) rather than build an
+    unbounded backlog. Urgent jobs may use urgent_reserve further places, so they
+    are still accepted when routine work has filled the queue. The workers are
+    started on first use and again in a forked child, so a queue used before a
+    gunicorn fork keeps working in the workers.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 100, urgent_reserve: Optional[int] = None,
+                 name: str = 'jobs'):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.urgent_reserve = max_workers if urgent_reserve is None else urgent_reserve
+        self.name = name
+        self._queue: Optional[queue.PriorityQueue] = None
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._accepted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.urgent = 0
+
+    @classmethod
+    def from_env(cls, prefix: str = 'ANALYSIS_JOB', name: str = 'analysis-job') -> 'JobQueue':
+        """Configure from <prefix>_WORKERS / <prefix>_QUEUE_SIZE / <prefix>_URGENT_RESERVE"""
+        urgent_reserve = os.environ.get(f'{prefix}_URGENT_RESERVE')
+        return cls(
+            max_workers=int(os.environ.get(f'{prefix}_WORKERS', 4)),
+            max_pending=int(os.environ.get(f'{prefix}_QUEUE_SIZE', 100)),
+            urgent_reserve=int(urgent_reserve) if urgent_reserve is not None else None,
+            name=name
+        )
+
+    def _get_queue(self) -> queue.PriorityQueue:
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                # Threads do not survive fork: start over with new workers
+                self._queue = queue.PriorityQueue()
+                self._accepted = 0
+                self._threads = [
+                    threading.Thread(target=self._work, args=(self._queue,), name=f'{self.name}-{index}', daemon=True)
+                    for index in range(self.max_workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+                self._pid = os.getpid()
+            return self._queue
+
+    def submit(self, job: Callable[..., Any], *args: Any, priority: int = PRIORITY_ROUTINE) -> bool:
+        """Queue job(*args); False if the queue is full"""
+        jobs = self._get_queue()
+        limit = self.max_workers + self.max_pending
+        if priority <= PRIORITY_URGENT:
+            limit += self.urgent_reserve
+        with self._lock:
+            if self._accepted >= limit:
+                self.rejected += 1
+                return False
+            self._accepted += 1
+            if priority <= PRIORITY_URGENT:
+                self.urgent += 1
+        jobs.put((priority, next(self._sequence), job, args))
+        return True
+
+    def _work(self, jobs: queue.PriorityQueue) -> None:
+        while True:
+            _, _, job, args = jobs.get()
+            failed = False
+            try:
+                job(*args)
+            except Exception:
+                failed = True
+            with self._lock:
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                if jobs is self._queue:
+                    self._accepted -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = self._queue.qsize() if self._queue is not None else 0
+            return {
+                'workers': self.max_workers,
+                'capacity': self.max_workers + self.max_pending,
+                'urgentReserve': self.urgent_reserve,
+                'active': self._accepted - queued,
+                'queued': queued,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'urgent': self.urgent
+            }
+
+
+# Background runner of asynchronous symptom analyses
+analysis_jobs = JobQueue.from_env()
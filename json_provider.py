@@ -0,0 +1,152 @@
+"""Application-wide JSON provider backed by orjson.
+
+Every jsonify() call in the blueprints goes through app.json. FastJSONProvider
+encodes responses with orjson and falls back to the standard library wherever the
+two could differ, so response bodies stay byte-identical to Flask's default
+provider (sorted keys, compact separators, ASCII-only output with \\uXXXX escapes,
+HTTP dates for datetimes):
+
+- non-ASCII text is escaped after encoding; text containing DEL, U+0080-U+00FF
+  or characters outside the BMP, and floats that Python prints in exponent form
+  (below 1e-4 or from 1e16), are encoded by the standard library instead,
+- NaN and infinities, which orjson writes as null, also go to the standard
+  library (NaN, Infinity, -Infinity, as Flask writes them),
+- values orjson cannot encode (big integers, non-string keys, unknown types) are
+  also left to the standard library,
+- pretty-printed (debug) responses and explicit dumps() arguments use the
+  standard library path unchanged.
+
+Pre-encoded response fragments (see services/response_fragments.py) are emitted
+verbatim when orjson supports it (orjson.Fragment, 3.9+), and spliced by
+response_fragments.encode on the standard library path.
+
+orjson is optional: without it the provider behaves like Flask's default one.
+"""
+import json
+import math
+import re
+from typing import Any, Optional
+
+from flask.json.provider import DefaultJSONProvider
+
+from src.services.response_fragments import FRAGMENT_TYPES, encode
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                       | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS)
+    _ORJSON_FRAGMENT = getattr(orjson, 'Fragment', None)
+
+# Floats orjson prints in exponent form (1e16, 1e-7) where json writes 1e+16 / 1e-07.
+# Scanned on the encoded bytes; a match inside a string only costs a fallback.
+_EXPONENT_FLOAT = re.compile(rb'e-?[0-9]+[,\]}]')
+
+# Digit runs that may be integers beyond 64 bits, which orjson rejects or (before
+# 3.9) decodes as floats; a run inside a string or a float only costs a fallback
+_LONG_DIGITS_TEXT = re.compile(r'[0-9]{19}')
+_LONG_DIGITS_BYTES = re.compile(rb'[0-9]{19}')
+
+# Bytes of characters json escapes differently from backslashreplace: DEL (written
+# raw by orjson), the UTF-8 lead bytes of U+0080-U+00FF (\u00e9, not \xe9) and of
+# characters outside the BMP (surrogate pairs, not \U0001f600)
+_STDLIB_ONLY_BYTES = (b'\x7f', b'\xc2', b'\xc3', b'\xf0', b'\xf1', b'\xf2', b'\xf3', b'\xf4')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson encoding and decoding for the common cases"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._compact_encoder = json.JSONEncoder(
+            ensure_ascii=True, sort_keys=True, separators=(',', ':'), default=self.default
+        )
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if orjson is not None and not kwargs and not _has_long_digits(s):
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                # NaN/Infinity and invalid documents: defer to the standard
+                # library for identical results and error messages
+                pass
+        return super().loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        if not (self.sort_keys and self.ensure_ascii):
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self._orjson_encode(obj)
+        if body is None:
+            body = encode(obj, dumps=self._compact_encoder.encode).encode('ascii')
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+    def _orjson_encode(self, obj: Any) -> Optional[bytes]:
+        """Compact, ASCII-only encoding identical to the standard library's, or None"""
+        if orjson is None:
+            return None
+        try:
+            encoded = orjson.dumps(obj, default=self._orjson_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # orjson.JSONEncodeError: unsupported type, key or integer size
+            return None
+        if encoded[:1] not in (b'{', b'['):
+            # Bare scalars are rare; leave their float formatting to json
+            return None
+        # Float formatting differences: json switches to exponent form below 1e-4
+        # (1e-05 vs 0.00001) and writes a signed, two-digit exponent (1e+16 vs 1e16)
+        if b'0.0000' in encoded or _EXPONENT_FLOAT.search(encoded):
+            return None
+        # orjson writes NaN and infinities as null; only look for them when there is one
+        if b'null' in encoded and _has_non_finite_float(obj):
+            return None
+        if not encoded.isascii():
+            if any(marker in encoded for marker in _STDLIB_ONLY_BYTES):
+                return None
+            # What remains is BMP text from U+0100 (Arabic), which backslashreplace
+            # escapes exactly as json's ensure_ascii does (\u0635)
+            encoded = encoded.decode('utf-8').encode('ascii', 'backslashreplace')
+        elif b'\x7f' in encoded:
+            return None
+        return encoded
+
+    def _orjson_default(self, o: Any) -> Any:
+        if isinstance(o, FRAGMENT_TYPES):
+            if _ORJSON_FRAGMENT is not None:
+                return _ORJSON_FRAGMENT(o.json)
+            return dict(o) if isinstance(o, dict) else list(o)
+        if isinstance(o, dict):
+            return dict(o)
+        if isinstance(o, (list, tuple)):
+            return list(o)
+        if isinstance(o, str):
+            return str(o)
+        return self.default(o)
+
+
+def _has_long_digits(s) -> bool:
+    """Whether a document (str or bytes) has a run of 19 digits"""
+    if isinstance(s, str):
+        return _LONG_DIGITS_TEXT.search(s) is not None
+    return _LONG_DIGITS_BYTES.search(s) is not None
+
+
+def _has_non_finite_float(obj: Any) -> bool:
+    """Whether a NaN or infinite float is nested in obj's dicts, lists and tuples"""
+    stack = [obj]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
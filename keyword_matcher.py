@@ -0,0 +1,187 @@
+from collections import deque
+from typing import Any, Container, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from src.services.text_normalizer import normalize_keyword
+
+# Arabic attaches conjunctions, prepositions and the definite article directly to
+# the word ("والصداع", "بالغثيان"), and possessive/plural endings to its tail
+# ("صداعي", "آلامها"). These are accepted around a keyword hit so that word
+# boundaries still hold for attached Arabic forms.
+ARABIC_PROCLITICS = frozenset([
+    'و', 'ف', 'ب', 'ل', 'ك', 'ال', 'وال', 'فال', 'بال', 'كال', 'لل', 'ولل'
+])
+ARABIC_ENCLITICS = frozenset([
+    'ا', 'ي', 'ه', 'ة', 'ك', 'ها', 'هم', 'هن', 'كم', 'كن', 'نا', 'ات', 'ان', 'ين', 'ون', 'تي', 'ته'
+])
+_AFFIX_MAX_LEN = 3
+
+# Endings accepted after a Latin keyword, alone or chained ("breath" -> "breathless",
+# "breathlessness"; "pain" -> "painfully"): inflections, the endings text_normalizer
+# strips from keyword stems ("nause" -> "nausea", "nauseous") and derivational
+# endings. Any other continuation is a different word, so "hot" does not match
+# "hotel" nor "pain" "painting"
+LATIN_SUFFIXES = frozenset([
+    's', 'es', 'ed', 'ing', 'e', 'a', 'ous', 'ful', 'ish', 'less', 'ness', 'ly', 'y', 'ily', 'ier',
+    'iest', 'iness', 'ated', 'ation', 'ic', 'al'
+])
+_LATIN_SUFFIX_MAX_LEN = max(len(suffix) for suffix in LATIN_SUFFIXES)
+# Longest word tail checked for a chain of endings
+_LATIN_ENDING_MAX_LEN = 12
+
+# Combining marks and tatweel are part of an Arabic word, not separators
+_WORD_MARKS = frozenset([chr(c) for c in range(0x064B, 0x0660)] + ['\u0670', '\u0640'])
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch in _WORD_MARKS
+
+
+def _is_arabic(ch: str) -> bool:
+    return '\u0600' <= ch <= '\u06ff'
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that finds every keyword hit in a single pass over the text.
+
+    Keywords map to one or more payloads (e.g. symptom keys). A hit only counts when it
+    starts at a word boundary and ends at one, or before known endings: a chain of
+    inflectional or derivational endings for Latin keywords ("cough" -> "coughing",
+    "fever" -> "feverish"), an attached suffix for Arabic ones.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Tuple[int, Tuple[Any, ...], bool], ...]] = [()]
+
+        for keyword, payloads in keywords.items():
+            if keyword:
+                self._insert(keyword, tuple(payloads))
+        self._build_fail_links()
+
+    @classmethod
+    def from_symptom_database(cls, symptom_database: Dict[str, Dict[str, Any]],
+                              only: Optional[Container[str]] = None) -> 'KeywordMatcher':
+        """Build a matcher mapping every normalized keyword to the integer ids
+        (knowledge base positions) of the symptoms using it.
+
+        With `only`, just the keywords of those symptom keys are included (ids stay
+        knowledge base positions). Input text must be normalized with
+        text_normalizer.normalize_text before matching.
+        """
+        keywords: Dict[str, List[int]] = {}
+        for symptom_id, (symptom_key, symptom_data) in enumerate(symptom_database.items()):
+            if only is not None and symptom_key not in only:
+                continue
+            for keyword in symptom_data['keywords']:
+                ids = keywords.setdefault(normalize_keyword(keyword), [])
+                if symptom_id not in ids:
+                    ids.append(symptom_id)
+        return cls(keywords)
+
+    @classmethod
+    def from_state(cls, state: Tuple[Any, Any, Any]) -> 'KeywordMatcher':
+        """Restore a matcher from state(), skipping automaton construction"""
+        matcher = cls.__new__(cls)
+        matcher._goto, matcher._fail, matcher._out = state
+        return matcher
+
+    def state(self) -> Tuple[Any, Any, Any]:
+        """Plain (marshal-serializable) automaton tables"""
+        return self._goto, self._fail, self._out
+
+    def _insert(self, keyword: str, payloads: Tuple[Any, ...]) -> None:
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] = self._out[state] + ((len(keyword), payloads, _is_arabic(keyword[-1])),)
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Inherit the hits of the longest proper suffix so a single state lookup
+                # reports every keyword ending at this position
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Tuple[Any, ...]]]:
+        """Yield (start, end, payloads) for every keyword hit that respects word boundaries"""
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        state = 0
+
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                end = i + 1
+                for length, payloads, arabic_tail in out[state]:
+                    start = end - length
+                    if self._starts_word(text, start) and self._ends_word(text, end, arabic_tail):
+                        yield start, end, payloads
+
+    def match(self, text: str) -> Set[Any]:
+        """Return the set of payloads of all keywords found in the text"""
+        found: Set[Any] = set()
+        for _, _, payloads in self.iter_matches(text):
+            found.update(payloads)
+        return found
+
+    @staticmethod
+    def _starts_word(text: str, start: int) -> bool:
+        if start == 0 or not _is_word_char(text[start - 1]):
+            return True
+        for size in range(1, min(_AFFIX_MAX_LEN, start) + 1):
+            prefix_start = start - size
+            if text[prefix_start:start] in ARABIC_PROCLITICS and (
+                    prefix_start == 0 or not _is_word_char(text[prefix_start - 1])):
+                return True
+        return False
+
+    @staticmethod
+    def _ends_word(text: str, end: int, arabic_tail: bool) -> bool:
+        if end == len(text) or not _is_word_char(text[end]):
+            return True
+        if not arabic_tail:
+            word_end = end
+            limit = min(len(text), end + _LATIN_ENDING_MAX_LEN + 1)
+            while word_end < limit and _is_word_char(text[word_end]):
+                word_end += 1
+            return word_end - end <= _LATIN_ENDING_MAX_LEN and _is_latin_ending(text[end:word_end])
+        for size in range(1, _AFFIX_MAX_LEN + 1):
+            suffix_end = end + size
+            if suffix_end > len(text):
+                break
+            if text[end:suffix_end] in ARABIC_ENCLITICS and (
+                    suffix_end == len(text) or not _is_word_char(text[suffix_end])):
+                return True
+        return False
+
+
+def _is_latin_ending(tail: str) -> bool:
+    """Whether tail is a chain of LATIN_SUFFIXES ("lessness" = "less" + "ness")"""
+    # reachable[i]: tail[:i] is a chain of endings
+    reachable = [True] + [False] * len(tail)
+    for start in range(len(tail)):
+        if not reachable[start]:
+            continue
+        for size in range(1, min(_LATIN_SUFFIX_MAX_LEN, len(tail) - start) + 1):
+            if tail[start:start + size] in LATIN_SUFFIXES:
+                reachable[start + size] = True
+    return reachable[-1]
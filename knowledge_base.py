@@ -0,0 +1,394 @@
+"""Symptom knowledge base: JSON source, compiled binary artifact and loader.
+
+The knowledge base is edited as JSON (knowledge_base.json) and compiled into a
+versioned binary artifact holding the interned strings, integer ids, the prebuilt
+keyword matcher, the fuzzy (typo-tolerant) term index and the condition index.
+Loading the artifact maps the file and
+unmarshals ready-made structures, so workers start without rebuilding anything.
+
+Usage:
+    python -m src.services.knowledge_base compile [--source PATH] [--output PATH]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+from src.services.keyword_matcher import KeywordMatcher
+from src.services.fuzzy_index import FuzzyIndex
+from src.services.condition_scoring import InvertedIndexScorer, create_scorer
+from src.services.text_normalizer import NORMALIZER_VERSION
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knowledge_base.json')
+DEFAULT_ARTIFACT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knowledge_base.kb')
+
+# Artifact layout: header (magic, format version, marshal version, source SHA-256,
+# manifest size, payload size), then the marshalled manifest, then every section as
+# a run of independently marshalled frames of at most _FRAME_ITEMS items
+ARTIFACT_MAGIC = b'SYMPTKB\x00'
+ARTIFACT_FORMAT_VERSION = 3
+_HEADER = struct.Struct('<8sHH32sQQ')
+_FRAME_ITEMS = 2048
+
+# Fields whose values are identifiers repeated across entries; interned so the
+# artifact (and the loaded process) keep a single copy of each
+_INTERNED_FIELDS = ('severity', 'category', 'icd10')
+
+
+class KnowledgeBaseError(Exception):
+    """Raised for malformed knowledge base sources or unusable artifacts"""
+
+
+class KnowledgeBase:
+    """Compiled, read-only symptom knowledge base.
+
+    Symptoms and conditions are addressed by integer ids (their position in the
+    source); the keyword matcher and the fuzzy index report symptom ids and the
+    condition index is prebuilt, so an analyzer can be constructed without any per-process building.
+    """
+
+    def __init__(self, version: str, fingerprint: str,
+                 symptom_database: Mapping[str, Any], disease_database: Mapping[str, Any],
+                 red_flags: Mapping[str, Any], matcher: KeywordMatcher,
+                 fuzzy_index: FuzzyIndex, condition_index: InvertedIndexScorer):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.symptom_database = symptom_database
+        self.disease_database = disease_database
+        self.red_flags = red_flags
+        self.symptom_keys = tuple(symptom_database)
+        self.matcher = matcher
+        # Keywords of the red-flag symptoms alone, for pre-triage; a few dozen
+        # keywords, so built on load rather than stored in the artifact
+        self.red_flag_matcher = KeywordMatcher.from_symptom_database(symptom_database, only=red_flags)
+        self.fuzzy_index = fuzzy_index
+        self.condition_index = condition_index
+
+    def __repr__(self):
+        return f'<KnowledgeBase {self.revision}>'
+
+    @property
+    def revision(self) -> str:
+        """Version plus content fingerprint, unique per distinct knowledge base content"""
+        return f'{self.version}@{self.fingerprint[:12]}'
+
+    @classmethod
+    def from_source(cls, source: Dict[str, Any], fingerprint: Optional[str] = None) -> 'KnowledgeBase':
+        """Build a knowledge base from its parsed JSON source"""
+        _validate_source(source)
+        if fingerprint is None:
+            fingerprint = _fingerprint(json.dumps(source, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+
+        symptom_database = _prepare(source['symptoms'])
+        disease_database = _prepare(source['conditions'])
+        red_flags = _prepare(source['red_flags'])
+        return cls(
+            version=str(source['version']),
+            fingerprint=fingerprint,
+            symptom_database=_freeze(symptom_database),
+            disease_database=_freeze(disease_database),
+            red_flags=_freeze(red_flags),
+            matcher=KeywordMatcher.from_symptom_database(symptom_database),
+            fuzzy_index=FuzzyIndex.from_symptom_database(symptom_database),
+            condition_index=InvertedIndexScorer(disease_database)
+        )
+
+    @classmethod
+    def from_source_file(cls, path: str = DEFAULT_SOURCE_PATH) -> 'KnowledgeBase':
+        """Parse and build a knowledge base from a JSON source file"""
+        with open(path, 'rb') as source_file:
+            raw = source_file.read()
+        try:
+            source = json.loads(raw)
+        except ValueError as e:
+            raise KnowledgeBaseError(f'Invalid knowledge base source {path}: {e}')
+        return cls.from_source(source, fingerprint=_fingerprint(raw))
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_ARTIFACT_PATH, expected_fingerprint: Optional[str] = None) -> 'KnowledgeBase':
+        """Load a compiled artifact.
+
+        Raises KnowledgeBaseError if the file is not a compatible artifact or, when
+        expected_fingerprint is given, was compiled from a different source.
+        """
+        with open(path, 'rb') as artifact_file:
+            with mmap.mmap(artifact_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if len(mapped) < _HEADER.size:
+                    raise KnowledgeBaseError(f'{path} is not a knowledge base artifact')
+                magic, format_version, marshal_version, digest, manifest_size, size = _HEADER.unpack_from(mapped)
+                if magic != ARTIFACT_MAGIC:
+                    raise KnowledgeBaseError(f'{path} is not a knowledge base artifact')
+                if format_version != ARTIFACT_FORMAT_VERSION or marshal_version != marshal.version:
+                    raise KnowledgeBaseError(f'{path} was compiled by an incompatible version')
+                if expected_fingerprint is not None and digest.hex() != expected_fingerprint:
+                    raise KnowledgeBaseError(f'{path} is out of date with its source')
+                if len(mapped) != _HEADER.size + size:
+                    raise KnowledgeBaseError(f'{path} is truncated')
+
+                with memoryview(mapped) as view:
+                    position = _HEADER.size
+                    manifest = marshal.loads(view[position:position + manifest_size])
+                    position += manifest_size
+                    if manifest.get('normalizer') != NORMALIZER_VERSION:
+                        # The matcher holds keywords normalized by other rules
+                        raise KnowledgeBaseError(f'{path} was compiled with other text normalization rules')
+                    sections: Dict[str, list] = {}
+                    for name, frame_sizes in manifest['sections']:
+                        items: list = []
+                        for frame_size in frame_sizes:
+                            # One bounded marshal call per frame: a background reload
+                            # gives the GIL back to request threads between frames
+                            items.extend(marshal.loads(view[position:position + frame_size]))
+                            position += frame_size
+                        sections[name] = items
+
+        return cls(
+            version=manifest['version'],
+            fingerprint=digest.hex(),
+            symptom_database=_freeze(dict(sections['symptoms'])),
+            disease_database=_freeze(dict(sections['conditions'])),
+            red_flags=_freeze(dict(sections['red_flags'])),
+            matcher=KeywordMatcher.from_state(
+                (sections['matcher_goto'], sections['matcher_fail'], sections['matcher_out'])
+            ),
+            fuzzy_index=FuzzyIndex.from_state(
+                (dict(sections['fuzzy_terms']), dict(sections['fuzzy_deletes']))
+            ),
+            condition_index=InvertedIndexScorer.from_state(
+                (tuple(sections['condition_keys']), tuple(sections['condition_sizes']),
+                 dict(sections['symptom_conditions']))
+            )
+        )
+
+    def save(self, path: str = DEFAULT_ARTIFACT_PATH) -> None:
+        """Write the compiled artifact atomically (concurrent readers never see a partial file)"""
+        goto, fail, out = self.matcher.state()
+        fuzzy_terms, fuzzy_deletes = self.fuzzy_index.state()
+        condition_keys, condition_sizes, symptom_conditions = self.condition_index.state()
+        sections = (
+            ('symptoms', list(_thaw(self.symptom_database).items())),
+            ('conditions', list(_thaw(self.disease_database).items())),
+            ('red_flags', list(_thaw(self.red_flags).items())),
+            ('matcher_goto', goto),
+            ('matcher_fail', fail),
+            ('matcher_out', out),
+            ('fuzzy_terms', list(fuzzy_terms.items())),
+            ('fuzzy_deletes', list(fuzzy_deletes.items())),
+            ('condition_keys', condition_keys),
+            ('condition_sizes', condition_sizes),
+            ('symptom_conditions', list(symptom_conditions.items())),
+        )
+
+        frames = []
+        manifest_sections = []
+        for name, items in sections:
+            section_frames = [
+                marshal.dumps(tuple(items[start:start + _FRAME_ITEMS]))
+                for start in range(0, len(items), _FRAME_ITEMS)
+            ]
+            frames.extend(section_frames)
+            manifest_sections.append((name, tuple(len(frame) for frame in section_frames)))
+        manifest = marshal.dumps({
+            'version': self.version,
+            'normalizer': NORMALIZER_VERSION,
+            'sections': tuple(manifest_sections)
+        })
+
+        header = _HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_FORMAT_VERSION, marshal.version,
+                              bytes.fromhex(self.fingerprint), len(manifest),
+                              len(manifest) + sum(len(frame) for frame in frames))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(prefix='.knowledge_base.', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as artifact_file:
+                artifact_file.write(header)
+                artifact_file.write(manifest)
+                for frame in frames:
+                    artifact_file.write(frame)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def create_scorer(self, engine: str = 'index'):
+        """Return a condition scorer; the 'index' engine comes prebuilt"""
+        if engine == InvertedIndexScorer.name:
+            return self.condition_index
+        return create_scorer(engine, self.disease_database)
+
+
+def compile_knowledge_base(source_path: str = DEFAULT_SOURCE_PATH,
+                           artifact_path: str = DEFAULT_ARTIFACT_PATH) -> KnowledgeBase:
+    """Compile a JSON source into a binary artifact"""
+    knowledge_base = KnowledgeBase.from_source_file(source_path)
+    knowledge_base.save(artifact_path)
+    return knowledge_base
+
+
+def load_knowledge_base(source_path: Optional[str] = None,
+                        artifact_path: Optional[str] = None) -> KnowledgeBase:
+    """Load the knowledge base, preferring an up-to-date compiled artifact.
+
+    SYMPTOM_KB_SOURCE / SYMPTOM_KB_ARTIFACT override the default paths. A missing,
+    stale or incompatible artifact is recompiled from the source (and rewritten when
+    the directory is writable).
+    """
+    source_path = source_path or os.environ.get('SYMPTOM_KB_SOURCE', DEFAULT_SOURCE_PATH)
+    artifact_path = artifact_path or os.environ.get('SYMPTOM_KB_ARTIFACT', DEFAULT_ARTIFACT_PATH)
+
+    expected_fingerprint = None
+    if os.path.exists(source_path):
+        with open(source_path, 'rb') as source_file:
+            expected_fingerprint = _fingerprint(source_file.read())
+    if os.path.exists(artifact_path):
+        try:
+            return KnowledgeBase.load(artifact_path, expected_fingerprint)
+        except KnowledgeBaseError:
+            pass
+
+    knowledge_base = KnowledgeBase.from_source_file(source_path)
+    try:
+        knowledge_base.save(artifact_path)
+    except OSError:
+        pass  # read-only deployment; keep the in-memory build
+    return knowledge_base
+
+
+class KnowledgeBaseWatcher(threading.Thread):
+    """Background thread that polls the knowledge base files and calls on_change
+    whenever the source or the compiled artifact is modified.
+
+    Only file metadata is checked on each poll; building the new knowledge base is
+    left to the callback, which runs on this thread rather than on request threads.
+    """
+
+    def __init__(self, on_change, interval: float,
+                 source_path: Optional[str] = None, artifact_path: Optional[str] = None):
+        super().__init__(name='knowledge-base-watcher', daemon=True)
+        self.on_change = on_change
+        self.interval = interval
+        self.source_path = source_path or os.environ.get('SYMPTOM_KB_SOURCE', DEFAULT_SOURCE_PATH)
+        self.artifact_path = artifact_path or os.environ.get('SYMPTOM_KB_ARTIFACT', DEFAULT_ARTIFACT_PATH)
+        self._stopped = threading.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        last_seen = self._signature()
+        while not self._stopped.wait(self.interval):
+            signature = self._signature()
+            if signature == last_seen:
+                continue
+            last_seen = signature
+            try:
+                self.on_change()
+            except Exception:
+                # Keep serving the current snapshot; retry on the next change
+                logger.exception('Knowledge base reload failed')
+
+    def _signature(self):
+        signature = []
+        for path in (self.source_path, self.artifact_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+
+def _fingerprint(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _validate_source(source: Any) -> None:
+    if not isinstance(source, dict):
+        raise KnowledgeBaseError('Knowledge base source must be a JSON object')
+    for section in ('version', 'symptoms', 'conditions', 'red_flags'):
+        if section not in source:
+            raise KnowledgeBaseError(f"Knowledge base source is missing '{section}'")
+
+    required = {
+        'symptoms': ('en', 'ar', 'severity', 'category', 'keywords'),
+        'conditions': ('en', 'ar', 'symptoms', 'description', 'icd10', 'severity'),
+        'red_flags': ('en', 'ar'),
+    }
+    for section, fields in required.items():
+        for key, entry in source[section].items():
+            missing = [field for field in fields if field not in entry]
+            if missing:
+                raise KnowledgeBaseError(f"{section}.{key} is missing {', '.join(missing)}")
+
+    for key, condition in source['conditions'].items():
+        unknown = [symptom for symptom in condition['symptoms'] if symptom not in source['symptoms']]
+        if unknown:
+            raise KnowledgeBaseError(f"conditions.{key} references unknown symptoms: {', '.join(unknown)}")
+
+
+def _prepare(section: Dict[str, Any]) -> Dict[str, Any]:
+    """Intern identifier strings and turn lists into tuples ahead of freezing"""
+    prepared = {}
+    for key, entry in section.items():
+        prepared_entry = {}
+        for field, value in entry.items():
+            if isinstance(value, list):
+                value = tuple(sys.intern(item) if isinstance(item, str) and field == 'symptoms' else item
+                              for item in value)
+            elif isinstance(value, str) and field in _INTERNED_FIELDS:
+                value = sys.intern(value)
+            prepared_entry[sys.intern(field)] = value
+        prepared[sys.intern(key)] = prepared_entry
+    return prepared
+
+
+def _freeze(section: Dict[str, Any]) -> Mapping[str, Any]:
+    """Wrap a prepared section (entries of fields, lists already tuples) in read-only mappings"""
+    return MappingProxyType({
+        key: MappingProxyType({
+            field: MappingProxyType(value) if isinstance(value, dict) else value
+            for field, value in entry.items()
+        })
+        for key, entry in section.items()
+    })
+
+
+def _thaw(value: Any) -> Any:
+    """Inverse of _freeze for marshalling (tuples are kept)"""
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return tuple(_thaw(item) for item in value)
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile the symptom knowledge base')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    compile_parser = subcommands.add_parser('compile', help='compile the JSON source into a binary artifact')
+    compile_parser.add_argument('--source', default=DEFAULT_SOURCE_PATH)
+    compile_parser.add_argument('--output', default=DEFAULT_ARTIFACT_PATH)
+    args = parser.parse_args(argv)
+
+    knowledge_base = compile_knowledge_base(args.source, args.output)
+    print(f'Compiled knowledge base {knowledge_base.version} '
+          f'({len(knowledge_base.symptom_database)} symptoms, '
+          f'{len(knowledge_base.disease_database)} conditions) -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,17 +7,25 @@ from flask import Flask, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from src.models.user import db
-from src.models.medical_user import MedicalUser, SymptomAnalysis, ImageAnalysis
+from src.models.medical_user import MedicalUser, SymptomAnalysis, ImageAnalysis, upgrade_schema
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.profile import profile_bp
-from src.routes.symptoms import symptoms_bp
+from src.routes.symptoms import symptoms_bp, recover_stale_analyses
+from src.routes.images import images_bp, collect_image_garbage, recover_stale_image_analyses
 from src.routes.health import health_bp
+from src.routes.metrics import metrics_bp
+from src.json_provider import FastJSONProvider
+from src.services.analysis_pool import analysis_pool
+from src.services.model_registry import ModelRegistryError, model_registry
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 app.config['JWT_SECRET_KEY'] = 'medical-ai-jwt-secret-key-change-in-production'
 
+# orjson-backed JSON for every jsonify() call (output identical to Flask's default)
+app.json = FastJSONProvider(app)
+
 # Enable CORS for all routes
 CORS(app, origins="*")
 
@@ -28,7 +36,9 @@ app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(profile_bp, url_prefix='/api/users')
 app.register_blueprint(symptoms_bp, url_prefix='/api/analysis')
+app.register_blueprint(images_bp, url_prefix='/api/analysis')
 app.register_blueprint(health_bp, url_prefix='/api')
+app.register_blueprint(metrics_bp, url_prefix='/api')
 
 # uncomment if you need to use database
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
@@ -36,6 +46,32 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 with app.app_context():
     db.create_all()
+    # Databases created by earlier releases get the columns added since
+    for column in upgrade_schema():
+        app.logger.warning('Database schema upgraded: added column %s', column)
+
+# Start-up tasks, skipped where multiprocessing re-imports this script (as
+# __mp_main__) in the analysis processes of the development server
+if __name__ != '__mp_main__':
+    # Asynchronous analyses interrupted by a crash or restart are completed again
+    recover_stale_analyses(app)
+    recover_stale_image_analyses(app)
+
+    # Stored images left without an analysis referencing them are removed
+    collect_image_garbage(app)
+
+    # Map and warm up the active skin condition model before the first request
+    try:
+        model_registry.current()
+    except ImportError:
+        pass  # NumPy is not installed: no model can serve image analyses
+    except ModelRegistryError as e:
+        # Image analyses fail until a version is published and activated
+        app.logger.warning('Image analysis unavailable: %s', e)
+
+    # Load the knowledge base in the analysis processes before the first request
+    if analysis_pool.enabled:
+        analysis_pool.start()
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -1,5 +1,7 @@
 from src.models.user import db
 from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
 import uuid
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -109,11 +111,13 @@ class SymptomAnalysis(db.Model):
     recommendations = db.Column(db.JSON, nullable=True)
     red_flags = db.Column(db.JSON, nullable=True)
     confidence_score = db.Column(db.Float, nullable=True)
+    kb_version = db.Column(db.String(80), nullable=True)  # Knowledge base revision that produced the results
     
     # Status and metadata
     status = db.Column(db.String(20), default='processing', nullable=False)  # processing, completed, failed
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     completed_at = db.Column(db.DateTime, nullable=True)
+    requeued_at = db.Column(db.DateTime, nullable=True)  # Last time a stale analysis was claimed and queued again
     
     # Follow-up
     follow_up_questions = db.Column(db.JSON, nullable=True)
@@ -137,6 +141,7 @@ class SymptomAnalysis(db.Model):
             'recommendations': self.recommendations,
             'redFlags': self.red_flags,
             'confidenceScore': self.confidence_score,
+            'kbVersion': self.kb_version,
             'status': self.status,
             'createdAt': self.created_at.isoformat(),
             'completedAt': self.completed_at.isoformat() if self.completed_at else None,
@@ -169,6 +174,7 @@ class ImageAnalysis(db.Model):
     status = db.Column(db.String(20), default='processing', nullable=False)  # processing, completed, failed
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     completed_at = db.Column(db.DateTime, nullable=True)
+    requeued_at = db.Column(db.DateTime, nullable=True)  # Last time a stale analysis was claimed and queued again
     
     # Model information
     model_version = db.Column(db.String(50), nullable=True)
@@ -199,3 +205,32 @@ class ImageAnalysis(db.Model):
             'userFeedback': self.user_feedback
         }
 
+
+
+def upgrade_schema():
+    """Add the nullable columns introduced since a table was created.
+
+    db.create_all() only creates missing tables, so a database created by an
+    earlier release lacks newer columns (symptom_analyses.kb_version and
+    requeued_at, image_analyses.requeued_at) and every query of those tables
+    fails. Call after db.create_all() in an app context; returns the
+    'table.column' names added. Several workers may run it at once: a column
+    another one added meanwhile is skipped.
+    """
+    added = []
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            except (OperationalError, ProgrammingError):
+                # Added by another worker since the inspection
+                if column.name not in {c['name'] for c in inspect(db.engine).get_columns(table.name)}:
+                    raise
+                continue
+            added.append(f'{table.name}.{column.name}')
+    return added
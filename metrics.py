@@ -0,0 +1,78 @@
+from flask import Blueprint, Response, request, jsonify, g
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import hmac
+import os
+import time
+from src.services.metrics_registry import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+http_requests_total = metrics.counter(
+    'http_requests_total', 'HTTP requests handled, by route, method and status code',
+    ('endpoint', 'method', 'status')
+)
+http_request_duration_seconds = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency in seconds, by route', ('endpoint',)
+)
+http_requests_in_flight = metrics.gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled'
+)
+db_queries_total = metrics.counter(
+    'db_queries_total', 'SQL statements executed, by route', ('endpoint',)
+)
+
+def _endpoint():
+    """Route pattern of the current request (bounded label values, no ids)"""
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+@metrics_bp.before_app_request
+def start_request_metrics():
+    metrics.ensure_process()
+    http_requests_in_flight.inc()
+    g.metrics_started = time.perf_counter()
+
+@metrics_bp.after_app_request
+def record_request_metrics(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        endpoint = _endpoint()
+        http_requests_total.inc(endpoint, request.method, str(response.status_code))
+        http_request_duration_seconds.observe(time.perf_counter() - started, endpoint)
+    return response
+
+@metrics_bp.teardown_app_request
+def finish_request_metrics(exc):
+    if g.pop('metrics_started', None) is not None:
+        http_requests_in_flight.dec()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_db_query(conn, cursor, statement, parameters, context, executemany):
+    try:
+        endpoint = _endpoint()
+    except RuntimeError:
+        # Outside a request (startup, CLI)
+        endpoint = 'none'
+    db_queries_total.inc(endpoint)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint (bearer token required when METRICS_TOKEN is set)"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            return jsonify({
+                'success': False,
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'A valid metrics token is required',
+                    'timestamp': datetime.utcnow().isoformat()
+                }
+            }), 401
+
+    return Response(metrics.export(), content_type=PROMETHEUS_CONTENT_TYPE)
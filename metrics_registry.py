@@ -0,0 +1,389 @@
+"""In-process metrics (counters, gauges, histograms) with Prometheus text export.
+
+Updates are lock-free: every thread increments its own shard (plain dicts owned by
+that thread), and only collection takes the registry lock to merge the shards.
+When a thread exits its shard is folded into a retired total, so counters stay
+monotonic without keeping one shard per finished thread.
+
+Across gunicorn worker processes, set METRICS_MULTIPROC_DIR to a directory shared
+by the workers (emptied before the server starts): each worker writes a snapshot
+of its metrics there every METRICS_FLUSH_INTERVAL seconds (and when exporting),
+and export() sums the snapshots of all workers. Snapshots of workers that have
+exited are folded into archive.json when a worker starts and when exporting
+(under a lock file, as prometheus_client's mark_process_dead does): their
+counters and histograms are kept, their gauges are dropped, and the directory
+holds one file per live worker.
+"""
+import bisect
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from functools import wraps
+from typing import Any, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds (cumulative, Prometheus style)
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+LabelValues = Tuple[str, ...]
+MetricKey = Tuple[str, LabelValues]
+
+
+class _Shard:
+    """Metric values updated by a single thread"""
+
+    __slots__ = ('counters', 'gauges', 'histograms')
+
+    def __init__(self):
+        self.counters: Dict[MetricKey, float] = {}
+        self.gauges: Dict[MetricKey, float] = {}
+        # Per key: bucket counts (one per bound plus +Inf), then the sum
+        self.histograms: Dict[MetricKey, List[float]] = {}
+
+
+class _ShardHandle:
+    """Thread-local owner of a shard; its finalizer retires the shard"""
+
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self, shard: _Shard):
+        self.shard = shard
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str,
+                 labelnames: Tuple[str, ...] = ()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        counters = self._registry._shard().counters
+        key = (self.name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        gauges = self._registry._shard().gauges
+        key = (self.name, labels)
+        gauges[key] = gauges.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str,
+                 labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, seconds: float, *labels: str) -> None:
+        histograms = self._registry._shard().histograms
+        key = (self.name, labels)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(self.buckets) + 2)
+        values[bisect.bisect_left(self.buckets, seconds)] += 1
+        values[-1] += seconds
+
+    def time(self, *labels: str):
+        """Decorator observing the duration of every call of the decorated function"""
+        def decorator(function):
+            @wraps(function)
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, *labels)
+            return timed
+        return decorator
+
+
+class MetricsRegistry:
+    """Process-wide metrics with per-thread shards"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._flusher: Optional[threading.Thread] = None
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric '{metric.name}' is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def _shard(self) -> _Shard:
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            shard = _Shard()
+            handle = self._local.handle = _ShardHandle(shard)
+            with self._lock:
+                self._shards.append(shard)
+            weakref.finalize(handle, self._retire, shard)
+        return handle.shard
+
+    def _retire(self, shard: _Shard) -> None:
+        """Fold the shard of a finished thread into the retired totals"""
+        with self._lock:
+            if shard in self._shards:
+                self._shards.remove(shard)
+                _merge(self._retired, shard.counters.copy(), shard.gauges.copy(),
+                       {key: list(values) for key, values in shard.histograms.copy().items()})
+
+    def snapshot(self) -> Dict[str, Dict[MetricKey, Any]]:
+        """Merged values of every thread of this process"""
+        total = _Shard()
+        with self._lock:
+            for shard in [self._retired] + self._shards:
+                # dict.copy / list() are atomic under the GIL, so owners may keep writing
+                _merge(total, shard.counters.copy(), shard.gauges.copy(),
+                       {key: list(values) for key, values in shard.histograms.copy().items()})
+        return {'counters': total.counters, 'gauges': total.gauges, 'histograms': total.histograms}
+
+    def after_fork(self) -> None:
+        """Start over in a forked worker: values inherited from the parent are not ours"""
+        inherited_local = self._local
+        # A parent thread may have held the lock at the fork: it is never released here
+        self._lock = threading.Lock()
+        with self._lock:
+            self._shards = []
+            self._retired = _Shard()
+            self._local = threading.local()
+            self._pid = os.getpid()
+            self._flusher = None
+        # Dropped outside the lock: the finalizers of the inherited shard handles run
+        # _retire, which takes it (and ignores shards that are no longer registered)
+        del inherited_local
+
+    def ensure_process(self) -> None:
+        """Call at the start of each request: handles forks and starts the flusher"""
+        if os.getpid() != self._pid:
+            self.after_fork()
+        if self._flusher is None and os.environ.get('METRICS_MULTIPROC_DIR'):
+            with self._lock:
+                if self._flusher is None:
+                    try:
+                        archive_dead_workers(os.environ['METRICS_MULTIPROC_DIR'])
+                    except OSError:
+                        pass
+                    interval = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+                    self._flusher = threading.Thread(target=self._flush_loop, args=(interval,),
+                                                     name='metrics-flusher', daemon=True)
+                    self._flusher.start()
+
+    def flush(self, directory: str) -> None:
+        """Write this process's snapshot to directory (atomically replaced)"""
+        snapshot = self.snapshot()
+        document: Dict[str, Any] = {
+            section: [[name, list(labels), values] for (name, labels), values in snapshot[section].items()]
+            for section in ('counters', 'gauges', 'histograms')
+        }
+        document['pid'] = os.getpid()
+        _write_snapshot(os.path.join(directory, f'worker_{os.getpid()}.json'), document)
+
+    def _flush_loop(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            directory = os.environ.get('METRICS_MULTIPROC_DIR')
+            if directory:
+                try:
+                    self.flush(directory)
+                except OSError:
+                    pass
+
+    def collect(self) -> Dict[str, Dict[MetricKey, Any]]:
+        """Values of all workers (METRICS_MULTIPROC_DIR) or of this process"""
+        directory = os.environ.get('METRICS_MULTIPROC_DIR')
+        if not directory:
+            return self.snapshot()
+
+        self.flush(directory)
+        archive_dead_workers(directory)
+        total = _Shard()
+        archive = _read_snapshot(os.path.join(directory, ARCHIVE_FILENAME))
+        if archive is not None:
+            _merge_document(total, archive, gauges=False)
+        for filename in _worker_files(directory):
+            document = _read_snapshot(os.path.join(directory, filename))
+            if document is not None:
+                # A worker may have exited since the archiving
+                _merge_document(total, document, gauges=_process_alive(document['pid']))
+        return {'counters': total.counters, 'gauges': total.gauges, 'histograms': total.histograms}
+
+    def export(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        values = self.collect()
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {_escape_help(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            section = values[{'counter': 'counters', 'gauge': 'gauges', 'histogram': 'histograms'}[metric.kind]]
+            series = sorted((labels, value) for (name, labels), value in section.items() if name == metric.name)
+            for labels, value in series:
+                label_pairs = list(zip(metric.labelnames, labels))
+                if metric.kind != 'histogram':
+                    lines.append(f'{metric.name}{_format_labels(label_pairs)} {_format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric.name}_bucket{_format_labels(label_pairs + [("le", le)])} {cumulative}')
+                lines.append(f'{metric.name}_sum{_format_labels(label_pairs)} {_format_value(value[-1])}')
+                lines.append(f'{metric.name}_count{_format_labels(label_pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+ARCHIVE_FILENAME = 'archive.json'
+_LOCK_FILENAME = '.archive.lock'
+
+
+def archive_dead_workers(directory: str) -> None:
+    """Fold the snapshots of exited workers into archive.json and remove them.
+
+    Their counters and histograms are added to the archive, their gauges dropped.
+    Workers serialize on a lock file, so a snapshot is folded exactly once.
+    """
+    with open(os.path.join(directory, _LOCK_FILENAME), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        dead = []
+        for filename in _worker_files(directory):
+            path = os.path.join(directory, filename)
+            document = _read_snapshot(path)
+            if document is not None and not _process_alive(document['pid']):
+                dead.append((path, document))
+        if not dead:
+            return
+        archive_path = os.path.join(directory, ARCHIVE_FILENAME)
+        total = _Shard()
+        for document in [_read_snapshot(archive_path)] + [document for _, document in dead]:
+            if document is not None:
+                _merge_document(total, document, gauges=False)
+        _write_snapshot(archive_path, {
+            'counters': [[name, list(labels), value] for (name, labels), value in total.counters.items()],
+            'gauges': [],
+            'histograms': [[name, list(labels), values] for (name, labels), values in total.histograms.items()]
+        })
+        for path, _ in dead:
+            os.unlink(path)
+
+
+def _worker_files(directory: str) -> List[str]:
+    return [filename for filename in os.listdir(directory)
+            if filename.startswith('worker_') and filename.endswith('.json')]
+
+
+def _read_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as snapshot_file:
+            return json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path: str, document: Dict[str, Any]) -> None:
+    """Write document to path, atomically replaced"""
+    fd, temp_path = tempfile.mkstemp(prefix='.metrics.', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w') as snapshot_file:
+            json.dump(document, snapshot_file)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _merge_document(total: _Shard, document: Dict[str, Any], gauges: bool) -> None:
+    _merge(total,
+           {(name, tuple(labels)): value for name, labels, value in document['counters']},
+           {(name, tuple(labels)): value for name, labels, value in document['gauges']} if gauges else {},
+           {(name, tuple(labels)): values for name, labels, values in document['histograms']})
+
+
+def _merge(total: _Shard, counters, gauges, histograms) -> None:
+    for key, value in counters.items():
+        total.counters[key] = total.counters.get(key, 0) + value
+    for key, value in gauges.items():
+        total.gauges[key] = total.gauges.get(key, 0) + value
+    for key, values in histograms.items():
+        merged = total.histograms.get(key)
+        if merged is None:
+            total.histograms[key] = list(values)
+        else:
+            for index, value in enumerate(values):
+                merged[index] += value
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape_help(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(str(value))}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+# Process-wide registry exported by GET /api/metrics
+metrics = MetricsRegistry()
@@ -0,0 +1,362 @@
+"""Registry of skin condition model versions: memory-mapped weights, warm-up and hot swap.
+
+Published versions live under IMAGE_MODEL_DIR (default src/model_weights):
+
+    <version>/manifest.json   architecture, input size, labels, calibration
+    <version>/<tensor>.npy    one uncompressed array per weight tensor
+    ACTIVE                    name of the version the workers serve
+
+Weights are memory-mapped read-only (np.load with mmap_mode='r'), so nothing is
+copied into the process: the pages come from the page cache and are shared by
+every worker process on the host, whether the version was loaded before a
+gunicorn fork (--preload) or by each worker. A loaded version is warmed up (a
+few predictions at the batch sizes the scheduler uses, which faults the weight
+pages in and sets up BLAS) before it serves a request.
+
+Versions are swapped by replacing the model reference: the inference scheduler
+fetches the model once per batch, so the batch in progress finishes on the old
+version, queued images run on the new one, and none are dropped. activate()
+loads and warms a version, installs it and rewrites ACTIVE; other workers see
+the change within IMAGE_MODEL_CHECK_INTERVAL seconds and load the new version
+on a background thread, serving the old one until it is warm. IMAGE_MODEL_VERSION
+pins a worker to one version instead.
+
+Usage:
+    python -m src.services.model_registry list
+    python -m src.services.model_registry publish-reference VERSION [--seed 1] [--hidden 256] [--temperature 1.0]
+    python -m src.services.model_registry activate VERSION
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed to load models
+    np = None
+
+from src.services.image_store import image_store
+from src.services.metrics_registry import metrics
+from src.services.skin_model import ARCHITECTURES, SKIN_CONDITIONS, ReferenceSkinModel, SkinConditionModel
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model_weights')
+MANIFEST_FILE = 'manifest.json'
+ACTIVE_FILE = 'ACTIVE'
+
+model_load_duration = metrics.histogram(
+    'image_model_load_seconds', 'Model cold start in seconds: mapping the weights (load), then warm-up', ('stage',)
+)
+
+
+class ModelRegistryError(Exception):
+    """Raised for unknown, malformed or conflicting model versions"""
+
+
+def process_memory(mapped_directory: str) -> Optional[Dict[str, int]]:
+    """Resident (RSS) and proportional (PSS) memory of this process, in total and for
+    the files mapped from mapped_directory, from /proc/self/smaps; None where unavailable.
+
+    PSS divides every shared page by the number of processes mapping it, so the
+    weights' PSS drops as more workers share them, while their RSS stays whole.
+    """
+    prefix = os.path.realpath(mapped_directory) + os.sep
+    memory = {'rssBytes': 0, 'pssBytes': 0, 'weightsRssBytes': 0, 'weightsPssBytes': 0}
+    in_weights = False
+    try:
+        with open('/proc/self/smaps') as smaps:
+            for line in smaps:
+                fields = line.split()
+                if not fields[0].endswith(':'):
+                    # Mapping header: address range, permissions, offset, device, inode[, path]
+                    in_weights = len(fields) > 5 and fields[5].startswith(prefix)
+                elif fields[0] in ('Rss:', 'Pss:'):
+                    kind = 'rss' if fields[0] == 'Rss:' else 'pss'
+                    size = int(fields[1]) * 1024
+                    memory[f'{kind}Bytes'] += size
+                    if in_weights:
+                        memory[f'weights{kind.capitalize()}Bytes'] += size
+    except OSError:
+        return None
+    return memory
+
+
+class ModelRegistry:
+    """Published model versions under directory, and the version this process serves"""
+
+    def __init__(self, directory: str = DEFAULT_MODEL_DIR, pinned_version: Optional[str] = None,
+                 warmup_batch_sizes: Sequence[int] = (1, 16), check_interval: float = 10,
+                 input_size: Optional[int] = None):
+        self.directory = directory
+        # Size of the model inputs the versions are run on (None: any); versions
+        # expecting another size are refused when loaded
+        self.input_size = input_size
+        self.pinned_version = pinned_version
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        self.check_interval = check_interval
+        self._model: Optional[SkinConditionModel] = None
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._loading: Optional[str] = None
+        self._failed: Optional[str] = None
+        # Per version loaded by this process: milliseconds to map the weights and to warm up
+        self.cold_starts: Dict[str, Dict[str, float]] = {}
+        self.swaps = 0
+        self.load_failures = 0
+
+    @classmethod
+    def from_env(cls) -> 'ModelRegistry':
+        """Configure from IMAGE_MODEL_DIR / IMAGE_MODEL_VERSION / IMAGE_MODEL_CHECK_INTERVAL;
+        models are warmed up at batch sizes 1 and IMAGE_INFERENCE_MAX_BATCH, and must take
+        the model renditions of image_store (IMAGE_MODEL_INPUT_SIZE)"""
+        return cls(
+            directory=os.environ.get('IMAGE_MODEL_DIR', DEFAULT_MODEL_DIR),
+            pinned_version=os.environ.get('IMAGE_MODEL_VERSION') or None,
+            warmup_batch_sizes=(1, int(os.environ.get('IMAGE_INFERENCE_MAX_BATCH', 16))),
+            check_interval=float(os.environ.get('IMAGE_MODEL_CHECK_INTERVAL', 10)),
+            input_size=image_store.model_input_size
+        )
+
+    def versions(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names
+                      if not name.startswith('.') and os.path.exists(os.path.join(self.directory, name, MANIFEST_FILE)))
+
+    def active_version(self) -> Optional[str]:
+        """The pinned version, else the one named in ACTIVE (None before any is activated)"""
+        if self.pinned_version:
+            return self.pinned_version
+        try:
+            with open(os.path.join(self.directory, ACTIVE_FILE)) as active_file:
+                return active_file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, version: str, manifest: Dict[str, Any], weights: Dict[str, 'np.ndarray']) -> str:
+        """Write a new version (manifest plus one .npy file per tensor); returns its directory.
+
+        The version appears complete or not at all: it is written to a temporary
+        directory and renamed into place. Published versions are never modified.
+        """
+        if not version or version.startswith('.') or os.sep in version or version == ACTIVE_FILE:
+            raise ModelRegistryError(f'Invalid model version name: {version!r}')
+        target = os.path.join(self.directory, version)
+        if os.path.exists(target):
+            raise ModelRegistryError(f'Model version {version} is already published')
+        os.makedirs(self.directory, exist_ok=True)
+        temp_directory = tempfile.mkdtemp(prefix='.tmp.', dir=self.directory)
+        try:
+            for name, array in weights.items():
+                np.save(os.path.join(temp_directory, f'{name}.npy'), np.ascontiguousarray(array))
+            with open(os.path.join(temp_directory, MANIFEST_FILE), 'w') as manifest_file:
+                json.dump({**manifest, 'version': version, 'tensors': sorted(weights)}, manifest_file, indent=2)
+            os.chmod(temp_directory, 0o755)
+            os.rename(temp_directory, target)
+        except OSError:
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            if os.path.exists(os.path.join(target, MANIFEST_FILE)):
+                raise ModelRegistryError(f'Model version {version} is already published')
+            raise
+        return target
+
+    def publish_reference(self, version: str = ReferenceSkinModel.version, seed: int = 1, hidden: int = 256,
+                          input_size: Optional[int] = None, temperature: float = 1.0) -> str:
+        """Publish the stand-in model with weights generated from seed, for inputs of
+        input_size (by default the registry's input size, else 224)"""
+        input_size = input_size or self.input_size or 224
+        model = ReferenceSkinModel(input_size=input_size, hidden=hidden, seed=seed)
+        manifest = {
+            'architecture': ReferenceSkinModel.architecture,
+            'inputSize': input_size,
+            'labels': list(model.labels),
+            'calibration': {'method': 'temperature_scaling', 'temperature': temperature}
+        }
+        return self.publish(version, manifest, model.weights)
+
+    def load(self, version: str) -> SkinConditionModel:
+        """Map the weights of a version and warm the model up; the model is not installed"""
+        if np is None:
+            raise ImportError('Loading skin condition models requires NumPy')
+        started = time.perf_counter()
+        version_directory = os.path.join(self.directory, version)
+        try:
+            with open(os.path.join(version_directory, MANIFEST_FILE)) as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            raise ModelRegistryError(f'Unknown model version {version}')
+        except ValueError as e:
+            raise ModelRegistryError(f'Invalid manifest for model version {version}: {e}')
+        architecture = ARCHITECTURES.get(manifest.get('architecture'))
+        if architecture is None:
+            raise ModelRegistryError(f"Model version {version} has unknown architecture {manifest.get('architecture')!r}")
+        unknown = [label for label in manifest.get('labels', ()) if label not in SKIN_CONDITIONS]
+        if unknown:
+            raise ModelRegistryError(f"Model version {version} has unknown labels: {', '.join(unknown)}")
+        # Stored model renditions have one size: a model expecting another would fail every batch
+        if self.input_size is not None and manifest.get('inputSize') != self.input_size:
+            raise ModelRegistryError(f"Model version {version} takes {manifest.get('inputSize')} pixel inputs, "
+                                     f"but model inputs are stored at {self.input_size} "
+                                     f"(IMAGE_MODEL_INPUT_SIZE)")
+
+        weights = {name: np.load(os.path.join(version_directory, f'{name}.npy'), mmap_mode='r')
+                   for name in manifest['tensors']}
+        model = architecture.from_weights(weights, manifest)
+        if manifest.get('labels'):
+            model.labels = tuple(manifest['labels'])
+        loaded = time.perf_counter()
+        self._warm_up(model)
+        finished = time.perf_counter()
+
+        model_load_duration.observe(loaded - started, 'load')
+        model_load_duration.observe(finished - loaded, 'warmup')
+        self.cold_starts[version] = {
+            'loadMs': round((loaded - started) * 1000, 2),
+            'warmupMs': round((finished - loaded) * 1000, 2)
+        }
+        return model
+
+    def _warm_up(self, model: SkinConditionModel) -> None:
+        for batch_size in self.warmup_batch_sizes:
+            model.predict(np.zeros((batch_size, model.input_size, model.input_size, 3), dtype=np.uint8))
+
+    def current(self) -> SkinConditionModel:
+        """The model to run now, loading the active version on first use.
+
+        Callers fetch it once per batch (see InferenceScheduler). At most every
+        check_interval seconds this also checks whether another version was
+        activated, and if so loads it in the background. Raises
+        ModelRegistryError while no version is active: versions are only
+        published and activated with the command line (see main()).
+        """
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    version = self.active_version()
+                    if version is None:
+                        raise ModelRegistryError('No model version is active')
+                    self._model = self.load(version)
+                    self._checked = time.monotonic()
+                model = self._model
+        elif time.monotonic() - self._checked >= self.check_interval:
+            self._check_active(model)
+        return model
+
+    def _check_active(self, model: SkinConditionModel) -> None:
+        with self._lock:
+            self._checked = time.monotonic()
+            version = self.active_version()
+            if version is None or version in (model.version, self._loading, self._failed):
+                return
+            self._loading = version
+        threading.Thread(target=self._swap_in, args=(version,), name='model-loader', daemon=True).start()
+
+    def _swap_in(self, version: str) -> None:
+        try:
+            model = self.load(version)
+        except Exception:
+            # Keep serving the current version; retry once another version is activated
+            logger.exception('Loading model version %s failed', version)
+            with self._lock:
+                self.load_failures += 1
+                self._failed = version
+                self._loading = None
+            return
+        self._install(model)
+        with self._lock:
+            self._loading = None
+
+    def activate(self, version: str) -> SkinConditionModel:
+        """Load and warm up version, then serve it here and make it the active version of
+        every worker; raises ModelRegistryError for versions that cannot be loaded"""
+        model = self.load(version)
+        self._write_active(version)
+        self._install(model)
+        return model
+
+    def _install(self, model: SkinConditionModel) -> None:
+        with self._lock:
+            if self._model is not None and self._model.version != model.version:
+                self.swaps += 1
+            # A single reference assignment: batches already running keep their model
+            self._model = model
+            self._failed = None
+
+    def _write_active(self, version: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.tmp.', dir=self.directory)
+        with os.fdopen(fd, 'w') as active_file:
+            active_file.write(version + '\n')
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, os.path.join(self.directory, ACTIVE_FILE))
+
+    def stats(self) -> Dict[str, Any]:
+        model = self._model
+        weights = getattr(model, 'weights', None) or {}
+        return {
+            'activeVersion': self.active_version(),
+            'loadedVersion': model.version if model is not None else None,
+            # False while a stand-in is loaded: image analyses fail rather than show it
+            'diagnostic': model.diagnostic if model is not None else None,
+            'pinned': self.pinned_version is not None,
+            'versions': self.versions(),
+            'calibration': model.calibration if model is not None else None,
+            'weightsBytes': sum(array.nbytes for array in weights.values()),
+            'coldStart': dict(self.cold_starts),
+            'swaps': self.swaps,
+            'loadFailures': self.load_failures,
+            'memory': process_memory(self.directory)
+        }
+
+
+# Model versions served by the inference scheduler of this worker
+model_registry = ModelRegistry.from_env()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage skin condition model versions')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    subcommands.add_parser('list', help='list published versions')
+    publish_parser = subcommands.add_parser('publish-reference', help='publish the stand-in model as a new version')
+    publish_parser.add_argument('version')
+    publish_parser.add_argument('--seed', type=int, default=1)
+    publish_parser.add_argument('--hidden', type=int, default=256)
+    publish_parser.add_argument('--temperature', type=float, default=1.0)
+    activate_parser = subcommands.add_parser('activate', help='load, warm up and activate a version')
+    activate_parser.add_argument('version')
+    args = parser.parse_args(argv)
+
+    try:
+        _run_command(args)
+    except ModelRegistryError as e:
+        raise SystemExit(str(e))
+
+
+def _run_command(args):
+    if args.command == 'list':
+        active = model_registry.active_version()
+        for version in model_registry.versions():
+            print(f"{'*' if version == active else ' '} {version}")
+    elif args.command == 'publish-reference':
+        path = model_registry.publish_reference(args.version, seed=args.seed, hidden=args.hidden,
+                                                temperature=args.temperature)
+        print(f'Published model version {args.version} -> {path}')
+    else:
+        model_registry.activate(args.version)
+        print(f'Activated model version {args.version} '
+              f"(load {model_registry.cold_starts[args.version]['loadMs']} ms, "
+              f"warm-up {model_registry.cold_starts[args.version]['warmupMs']} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Frozen, pre-encoded JSON fragments for static parts of API responses.
+
+Recommendation blocks, fallback messages and similar localized text are identical
+for every request. They are built once with freeze(), which returns immutable
+containers (FrozenDict / FrozenList) that also carry their own JSON encoding in a
+`json` attribute. encode() serializes a response and splices those strings in
+verbatim, so the static text is neither rebuilt nor re-encoded per request.
+
+Fragments are ordinary dict/tuple subclasses, so code that reads them, stores them
+in JSON columns or passes them to jsonify keeps working unchanged.
+"""
+import json
+import re
+from typing import Any, Callable, List
+
+# Same output as Flask's JSON responses (ASCII-escaped, sorted keys, compact)
+_encoder = json.JSONEncoder(ensure_ascii=True, sort_keys=True, separators=(',', ':'))
+
+# Stands in for a fragment while the rest of the response is encoded. Any JSON
+# encoder writes it as _ENCODED_PLACEHOLDER. Payload strings (user input) can
+# spell the same text, so encode() checks that it replaced exactly its own
+# placeholders before trusting the splice
+_PLACEHOLDER = '\x00fragment:{}'
+_ENCODED_PLACEHOLDER = re.compile(r'"\\u0000fragment:(\d+)"')
+
+# Smaller fragments are cheaper to let the (C) encoder re-encode than to splice
+MIN_SPLICE_SIZE = 256
+
+
+class FrozenDict(dict):
+    """Immutable dict with its JSON encoding precomputed in `json`"""
+
+    __slots__ = ('json',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.json = _encoder.encode(self)
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(f'{type(self).__name__} is immutable')
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+class FrozenList(tuple):
+    """Tuple (JSON array) with its JSON encoding precomputed in `json`"""
+
+    def __new__(cls, items=()):
+        frozen = super().__new__(cls, items)
+        frozen.json = _encoder.encode(frozen)
+        return frozen
+
+
+FRAGMENT_TYPES = (FrozenDict, FrozenList)
+
+
+def freeze(value: Any) -> Any:
+    """Recursively convert dicts and lists into pre-encoded FrozenDict / FrozenList"""
+    if isinstance(value, FRAGMENT_TYPES):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+def encode(payload: Any, dumps: Callable[[Any], str] = _encoder.encode) -> str:
+    """Serialize payload to JSON, splicing in the pre-encoded form of its fragments"""
+    fragments: List[str] = []
+    substituted = _substitute(payload, fragments)
+    if not fragments:
+        return dumps(payload)
+
+    def fragment(match: 're.Match[str]') -> str:
+        index = int(match.group(1))
+        return fragments[index] if index < len(fragments) else match.group(0)
+
+    spliced, replaced = _ENCODED_PLACEHOLDER.subn(fragment, dumps(substituted))
+    if replaced != len(fragments):
+        # A payload string looks like a placeholder: encode without splicing
+        return dumps(payload)
+    return spliced
+
+
+def _substitute(value: Any, fragments: List[str]) -> Any:
+    """Replace large fragments with placeholders, copying only containers that hold one.
+
+    Fragments are looked for among the values of the payload and of the dicts in
+    its list values: the shape of analysis results and of batches of them. Deeper
+    containers are left to the encoder untouched.
+    """
+    if type(value) is not dict:
+        return value
+    substituted = None
+    for key, item in value.items():
+        item_type = type(item)
+        if item_type is list:
+            replacement = _substitute_items(item, fragments)
+        elif (item_type is FrozenList or item_type is FrozenDict) and len(item.json) >= MIN_SPLICE_SIZE:
+            fragments.append(item.json)
+            replacement = _PLACEHOLDER.format(len(fragments) - 1)
+        else:
+            continue
+        if replacement is not item:
+            if substituted is None:
+                substituted = dict(value)
+            substituted[key] = replacement
+    return value if substituted is None else substituted
+
+
+def _substitute_items(items: List[Any], fragments: List[str]) -> List[Any]:
+    substituted = None
+    for index, item in enumerate(items):
+        if type(item) is not dict:
+            continue
+        replaced = None
+        for key, value in item.items():
+            value_type = type(value)
+            if (value_type is FrozenList or value_type is FrozenDict) and len(value.json) >= MIN_SPLICE_SIZE:
+                if replaced is None:
+                    replaced = dict(item)
+                fragments.append(value.json)
+                replaced[key] = _PLACEHOLDER.format(len(fragments) - 1)
+        if replaced is not None:
+            if substituted is None:
+                substituted = list(items)
+            substituted[index] = replaced
+    return items if substituted is None else substituted
@@ -0,0 +1,189 @@
+"""Skin condition image models: the interface run by the inference scheduler, a
+small stand-in model for tests and benchmarks, and the rendering of predictions
+into analysis results.
+
+A model takes a batch of model inputs (N x size x size x 3 uint8, the 'model'
+rendition of image_store) and returns an N x len(labels) array of class
+probabilities. Batches amortize the per-call cost: the stand-in model, like a
+CNN, spends most of its time in one matrix product over the whole batch.
+Published model versions are loaded and swapped by model_registry.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed to run models
+    np = None
+
+SKIN_CONDITIONS = {
+    'eczema': {
+        'icd10Code': 'L30.9', 'severity': 'moderate', 'risk': 'low',
+        'en': ('Eczema', 'Inflammatory skin condition characterized by red, itchy patches'),
+        'ar': ('الأكزيما', 'حالة جلدية التهابية تتميز ببقع حمراء مثيرة للحكة')
+    },
+    'contact_dermatitis': {
+        'icd10Code': 'L25.9', 'severity': 'mild', 'risk': 'low',
+        'en': ('Contact dermatitis', 'Skin reaction to allergens or irritants'),
+        'ar': ('التهاب الجلد التماسي', 'تفاعل جلدي مع مسببات الحساسية أو المهيجات')
+    },
+    'psoriasis': {
+        'icd10Code': 'L40.0', 'severity': 'moderate', 'risk': 'medium',
+        'en': ('Psoriasis', 'Chronic condition causing thick, scaly plaques'),
+        'ar': ('الصدفية', 'حالة مزمنة تسبب لويحات سميكة متقشرة')
+    },
+    'acne': {
+        'icd10Code': 'L70.0', 'severity': 'mild', 'risk': 'low',
+        'en': ('Acne vulgaris', 'Clogged hair follicles causing pimples and inflammation'),
+        'ar': ('حب الشباب', 'انسداد بصيلات الشعر مما يسبب البثور والالتهاب')
+    },
+    'tinea': {
+        'icd10Code': 'B35.9', 'severity': 'mild', 'risk': 'low',
+        'en': ('Fungal skin infection', 'Ring-shaped, scaly rash caused by a fungal infection'),
+        'ar': ('عدوى فطرية جلدية', 'طفح جلدي متقشر حلقي الشكل ناتج عن عدوى فطرية')
+    },
+    'urticaria': {
+        'icd10Code': 'L50.9', 'severity': 'mild', 'risk': 'medium',
+        'en': ('Urticaria', 'Raised, itchy welts, often from an allergic reaction'),
+        'ar': ('الشرى', 'انتفاخات بارزة مثيرة للحكة غالباً بسبب تفاعل تحسسي')
+    },
+    'benign_nevus': {
+        'icd10Code': 'D22.9', 'severity': 'mild', 'risk': 'low',
+        'en': ('Benign mole', 'Common pigmented skin growth'),
+        'ar': ('شامة حميدة', 'نمو جلدي مصطبغ شائع')
+    },
+    'suspicious_lesion': {
+        'icd10Code': 'D48.5', 'severity': 'severe', 'risk': 'high',
+        'en': ('Suspicious pigmented lesion', 'Irregular pigmented lesion that needs examination by a dermatologist'),
+        'ar': ('آفة مصطبغة مشبوهة', 'آفة مصطبغة غير منتظمة تحتاج إلى فحص من طبيب الأمراض الجلدية')
+    }
+}
+
+RISK_MONITORING = {
+    'en': {
+        'low': 'Monitor for changes over 1-2 weeks',
+        'medium': 'See a doctor if it does not improve within a week',
+        'high': 'See a dermatologist as soon as possible'
+    },
+    'ar': {
+        'low': 'راقب أي تغييرات خلال أسبوع إلى أسبوعين',
+        'medium': 'راجع الطبيب إذا لم تتحسن الحالة خلال أسبوع',
+        'high': 'راجع طبيب الأمراض الجلدية في أقرب وقت ممكن'
+    }
+}
+
+# Probability of a high-risk condition that raises the risk level, even as an alternative
+HIGH_RISK_THRESHOLD = 0.2
+
+
+class SkinConditionModel:
+    """Interface of the image models run by the inference scheduler"""
+
+    version = 'unversioned'
+    input_size = 224
+    labels: Sequence[str] = tuple(SKIN_CONDITIONS)
+    # How the probabilities were calibrated (stored as ImageAnalysis.confidence_calibration)
+    calibration: Optional[Dict[str, Any]] = None
+    # False for stand-ins without medical meaning: analyses they run fail instead of
+    # showing their output as a diagnosis
+    diagnostic = True
+
+    def predict(self, images: 'np.ndarray') -> 'np.ndarray':
+        """Class probabilities (N x len(labels)) for a batch of N x size x size x 3 uint8 images"""
+        raise NotImplementedError
+
+
+class ReferenceSkinModel(SkinConditionModel):
+    """Stand-in model with a CNN-like cost profile and fixed random weights.
+
+    4x4 average pooling, then a dense layer over the pooled pixels and a linear
+    classifier, with temperature-scaled softmax. Without weights it generates them
+    from seed, deterministically; it has no medical meaning, and exercises
+    batching, result rendering and model versions in tests and benchmarks. It is
+    not diagnostic: image analyses never record its predictions.
+    """
+
+    architecture = 'reference'
+    version = 'reference-1'
+    diagnostic = False
+
+    def __init__(self, weights: Optional[Dict[str, 'np.ndarray']] = None, input_size: int = 224,
+                 hidden: int = 256, seed: int = 1, version: Optional[str] = None,
+                 calibration: Optional[Dict[str, Any]] = None):
+        if np is None:
+            raise ImportError('The reference skin model requires NumPy')
+        self.input_size = input_size
+        self.pooled = input_size // 4
+        if weights is None:
+            rng = np.random.default_rng(seed)
+            features = self.pooled * self.pooled * 3
+            weights = {
+                'hidden': (rng.standard_normal((features, hidden)) / np.sqrt(features)).astype(np.float32),
+                'output': rng.standard_normal((hidden, len(self.labels))).astype(np.float32)
+            }
+        self.weights = weights
+        self.version = version or self.version
+        self.calibration = calibration
+        self.temperature = float((calibration or {}).get('temperature', 1.0))
+
+    @classmethod
+    def from_weights(cls, weights: Dict[str, 'np.ndarray'], manifest: Dict[str, Any]) -> 'ReferenceSkinModel':
+        """Model of a published version (see model_registry)"""
+        return cls(weights, input_size=manifest['inputSize'], version=manifest['version'],
+                   calibration=manifest.get('calibration'))
+
+    def predict(self, images):
+        size = self.pooled * 4
+        # 4x4 sums from 16 strided views, accumulated in uint16 (16 x 255 fits)
+        sums = np.zeros((images.shape[0], self.pooled, self.pooled, 3), dtype=np.uint16)
+        for row in range(4):
+            for column in range(4):
+                sums += images[:, row:size:4, column:size:4]
+        centered = sums.reshape(len(sums), -1).astype(np.float32) / (16 * 255.0) - 0.5
+        hidden = np.maximum(centered @ self.weights['hidden'], 0)
+        logits = hidden @ self.weights['output'] / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        exponentials = np.exp(logits)
+        return exponentials / exponentials.sum(axis=1, keepdims=True)
+
+
+# Model classes by the 'architecture' of a published version's manifest
+ARCHITECTURES = {ReferenceSkinModel.architecture: ReferenceSkinModel}
+
+
+def interpret_prediction(probabilities: Sequence[float], labels: Sequence[str],
+                         language: str = 'en', alternatives: int = 2) -> Dict[str, Any]:
+    """skin_condition_analysis and risk_assessment values for one image's probabilities"""
+    language = language if language in ('en', 'ar') else 'en'
+    ranked = sorted(zip(labels, (float(p) for p in probabilities)), key=lambda item: -item[1])
+
+    def diagnosis(label: str, confidence: float) -> Dict[str, Any]:
+        condition = SKIN_CONDITIONS[label]
+        name, description = condition[language]
+        return {
+            'condition': name,
+            'conditionId': label,
+            'confidence': round(confidence, 4),
+            'severity': condition['severity'],
+            'description': description,
+            'icd10Code': condition['icd10Code']
+        }
+
+    primary_label, primary_confidence = ranked[0]
+    level = SKIN_CONDITIONS[primary_label]['risk']
+    factors: List[str] = [diagnosis(primary_label, primary_confidence)['condition']]
+    for label, confidence in ranked[1:]:
+        if SKIN_CONDITIONS[label]['risk'] == 'high' and confidence >= HIGH_RISK_THRESHOLD:
+            level = 'high'
+            factors.append(diagnosis(label, confidence)['condition'])
+
+    return {
+        'skinConditionAnalysis': {
+            'primaryDiagnosis': diagnosis(primary_label, primary_confidence),
+            'alternativeDiagnoses': [diagnosis(label, confidence) for label, confidence in ranked[1:1 + alternatives]]
+        },
+        'riskAssessment': {
+            'level': level,
+            'factors': factors,
+            'monitoring': RISK_MONITORING[language][level]
+        }
+    }
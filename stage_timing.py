@@ -0,0 +1,159 @@
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.services.metrics_registry import metrics
+
+# Stage durations of the current request, collected for the Server-Timing header
+_request_stages: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar('request_stages', default=None)
+
+# Exported by GET /api/metrics
+STAGE_DURATION = metrics.histogram(
+    'analysis_stage_duration_seconds', 'Analysis pipeline stage latency in seconds, by stage', ('stage',)
+)
+
+
+def _summary(buckets: Tuple[float, ...], values: List[float]) -> Dict[str, Any]:
+    """Count, sum and cumulative bucket counts of histogram values, plus estimated percentiles"""
+    counts, total = values[:-1], values[-1]
+    count = sum(counts)
+    cumulative, running = [], 0
+    for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+        running += bucket_count
+        cumulative.append((bound, running))
+    return {
+        'count': count,
+        'sumMs': round(total * 1e3, 3),
+        'meanMs': round(total / count * 1e3, 3) if count else 0.0,
+        'p50Ms': _percentile(cumulative, count, 0.50),
+        'p99Ms': _percentile(cumulative, count, 0.99),
+        'buckets': [['+Inf' if bound == float('inf') else bound, running]
+                    for bound, running in cumulative],
+    }
+
+
+def _percentile(cumulative, count: int, quantile: float) -> float:
+    """Percentile estimated by linear interpolation inside its bucket"""
+    if not count:
+        return 0.0
+    rank = quantile * count
+    lower_bound, lower_count = 0.0, 0
+    for bound, running in cumulative:
+        if running >= rank:
+            if bound == float('inf'):
+                return round(lower_bound * 1e3, 3)
+            fraction = (rank - lower_count) / (running - lower_count)
+            return round((lower_bound + (bound - lower_bound) * fraction) * 1e3, 3)
+        lower_bound, lower_count = bound, running
+    return round(lower_bound * 1e3, 3)
+
+
+class StageTimer:
+    """Times consecutive stages of one operation: lap(name) records the time since
+    the previous lap (or since the timer was created)"""
+
+    __slots__ = ('_timings', '_last')
+
+    def __init__(self, timings: 'StageTimings'):
+        self._timings = timings
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._timings.observe(stage, now - self._last)
+        self._last = now
+
+
+class _NullTimer:
+    """Timer used while timing is disabled: every lap is a no-op"""
+
+    __slots__ = ()
+
+    def lap(self, stage: str) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class StageTimings:
+    """Per-stage latencies of the analysis pipeline, observed by the
+    analysis_stage_duration_seconds histogram of the metrics registry.
+
+    Disabled by default; when disabled, timer() returns NULL_TIMER and timed()
+    a no-op context manager, so instrumented code pays one attribute check and a
+    few empty calls. When a request is being collected (see collect_request), the
+    stage durations of that request are also kept for the Server-Timing header.
+    """
+
+    def __init__(self, enabled: bool = False, server_timing: bool = False):
+        # The Server-Timing header is built from the same measurements
+        self.enabled = enabled or server_timing
+        self.server_timing = server_timing
+
+    @classmethod
+    def from_env(cls) -> 'StageTimings':
+        """Configure from ANALYSIS_STAGE_TIMING / ANALYSIS_SERVER_TIMING ('1' enables)"""
+        return cls(
+            enabled=os.environ.get('ANALYSIS_STAGE_TIMING', '0') == '1',
+            server_timing=os.environ.get('ANALYSIS_SERVER_TIMING', '0') == '1'
+        )
+
+    def timer(self):
+        """A StageTimer, or NULL_TIMER while timing is disabled"""
+        return StageTimer(self) if self.enabled else NULL_TIMER
+
+    def timed(self, stage: str):
+        """Context manager timing its block as one stage"""
+        return self._timed(stage) if self.enabled else nullcontext()
+
+    @contextmanager
+    def _timed(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        STAGE_DURATION.observe(seconds, stage)
+
+        collected = _request_stages.get()
+        if collected is not None:
+            collected.append((stage, seconds))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Histogram summary per stage, for this process (GET /api/metrics sums the workers)"""
+        histograms = metrics.snapshot()['histograms']
+        return {labels[0]: _summary(STAGE_DURATION.buckets, values)
+                for (name, labels), values in sorted(histograms.items()) if name == STAGE_DURATION.name}
+
+    def collect_request(self):
+        """Start collecting the current request's stages; returns a token for finish_request"""
+        if not self.server_timing:
+            return None
+        return _request_stages.set([])
+
+    def finish_request(self, token) -> Optional[str]:
+        """Stop collecting and return the Server-Timing header value (None if empty)"""
+        if token is None:
+            return None
+        collected = _request_stages.get()
+        try:
+            _request_stages.reset(token)
+        except ValueError:
+            # Finished in another context than it was started in
+            _request_stages.set(None)
+        if not collected:
+            return None
+        # Stages repeated within one request are reported once, summed
+        durations: Dict[str, float] = {}
+        for stage, seconds in collected:
+            durations[stage] = durations.get(stage, 0.0) + seconds
+        return ', '.join(f'{stage};dur={seconds * 1e3:.3f}' for stage, seconds in durations.items())
+
+
+# Process-wide stage timings of the analysis pipeline
+stage_timings = StageTimings.from_env()
@@ -1,324 +1,292 @@
+import os
 import re
 import json
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from typing import Dict, List, Any, Iterator, Optional, Sequence, Tuple
 from datetime import datetime
+from src.services.knowledge_base import KnowledgeBase, KnowledgeBaseWatcher, load_knowledge_base
+from src.services.text_normalizer import normalize_text
+from src.services.response_fragments import FrozenList, freeze
+from src.services.stage_timing import NULL_TIMER, stage_timings
+from src.services.metrics_registry import metrics
 
-class SymptomAnalyzer:
-    def __init__(self):
-        # Enhanced symptom database with Arabic translations
-        self.symptom_database = {
-            # Neurological symptoms
-            'headache': {
-                'en': 'headache',
-                'ar': 'صداع',
-                'severity': 'moderate',
-                'category': 'neurological',
-                'keywords': ['head', 'pain', 'ache', 'migraine', 'صداع', 'رأس', 'ألم']
-            },
-            'dizziness': {
-                'en': 'dizziness',
-                'ar': 'دوخة',
-                'severity': 'mild',
-                'category': 'neurological',
-                'keywords': ['dizzy', 'vertigo', 'spinning', 'دوخة', 'دوار', 'عدم توازن']
-            },
-            'nausea': {
-                'en': 'nausea',
-                'ar': 'غثيان',
-                'severity': 'mild',
-                'category': 'gastrointestinal',
-                'keywords': ['nausea', 'sick', 'vomit', 'غثيان', 'قيء', 'استفراغ']
-            },
-            # Respiratory symptoms
-            'cough': {
-                'en': 'cough',
-                'ar': 'سعال',
-                'severity': 'mild',
-                'category': 'respiratory',
-                'keywords': ['cough', 'coughing', 'سعال', 'كحة', 'سعلة']
-            },
-            'shortness_of_breath': {
-                'en': 'shortness of breath',
-                'ar': 'ضيق في التنفس',
-                'severity': 'moderate',
-                'category': 'respiratory',
-                'keywords': ['breath', 'breathing', 'shortness', 'dyspnea', 'تنفس', 'ضيق', 'نهجة']
-            },
-            # General symptoms
-            'fever': {
-                'en': 'fever',
-                'ar': 'حمى',
-                'severity': 'moderate',
-                'category': 'general',
-                'keywords': ['fever', 'temperature', 'hot', 'حمى', 'سخونة', 'حرارة']
-            },
-            'fatigue': {
-                'en': 'fatigue',
-                'ar': 'إرهاق',
-                'severity': 'mild',
-                'category': 'general',
-                'keywords': ['tired', 'fatigue', 'exhausted', 'إرهاق', 'تعب', 'إجهاد']
-            },
-            'chills': {
-                'en': 'chills',
-                'ar': 'قشعريرة',
-                'severity': 'mild',
-                'category': 'general',
-                'keywords': ['chills', 'shivering', 'cold', 'قشعريرة', 'رعشة', 'برد']
-            },
-            # Pain symptoms
-            'chest_pain': {
-                'en': 'chest pain',
-                'ar': 'ألم في الصدر',
-                'severity': 'severe',
-                'category': 'cardiovascular',
-                'keywords': ['chest', 'pain', 'heart', 'صدر', 'ألم', 'قلب']
-            },
-            'abdominal_pain': {
-                'en': 'abdominal pain',
-                'ar': 'ألم في البطن',
-                'severity': 'moderate',
-                'category': 'gastrointestinal',
-                'keywords': ['stomach', 'belly', 'abdomen', 'pain', 'بطن', 'معدة', 'ألم']
-            },
-            'back_pain': {
-                'en': 'back pain',
-                'ar': 'ألم في الظهر',
-                'severity': 'moderate',
-                'category': 'musculoskeletal',
-                'keywords': ['back', 'spine', 'pain', 'ظهر', 'عمود فقري', 'ألم']
-            }
+# Number of ranked conditions returned by analyze_potential_conditions
+MAX_POTENTIAL_CONDITIONS = 5
+
+SUPPORTED_LANGUAGES = ('en', 'ar')
+
+# Static, localized response text. Built once, frozen and pre-encoded (see
+# response_fragments.py) instead of being rebuilt for every analysis.
+GENERAL_RECOMMENDATIONS = freeze({
+    'en': [
+        {
+            'action': 'Monitor your symptoms and track any changes',
+            'type': 'monitoring',
+            'priority': 'medium',
+            'precautions': [
+                'Keep a symptom diary',
+                'Note the time and severity of symptoms',
+                'Record any triggers or patterns'
+            ]
+        },
+        {
+            'action': 'Stay hydrated and get adequate rest',
+            'type': 'lifestyle',
+            'priority': 'high',
+            'precautions': [
+                'Drink plenty of fluids',
+                'Get 7-8 hours of sleep',
+                'Avoid strenuous activities'
+            ]
+        },
+        {
+            'action': 'Consult with a healthcare professional for proper diagnosis',
+            'type': 'medical',
+            'priority': 'high',
+            'precautions': [
+                'Schedule an appointment with your doctor',
+                'Bring your symptom diary',
+                'List all medications you are taking'
+            ]
         }
-        
-        # Enhanced disease database with Arabic translations
-        self.disease_database = {
-            'common_cold': {
-                'en': 'Common Cold',
-                'ar': 'نزلة برد عادية',
-                'symptoms': ['cough', 'fever', 'fatigue', 'headache'],
-                'description': {
-                    'en': 'A viral infection of the upper respiratory tract',
-                    'ar': 'عدوى فيروسية في الجهاز التنفسي العلوي'
-                },
-                'icd10': 'J00',
-                'severity': 'mild'
-            },
-            'influenza': {
-                'en': 'Influenza (Flu)',
-                'ar': 'الأنفلونزا',
-                'symptoms': ['fever', 'cough', 'fatigue', 'headache', 'chills'],
-                'description': {
-                    'en': 'A viral infection that attacks the respiratory system',
-                    'ar': 'عدوى فيروسية تهاجم الجهاز التنفسي'
-                },
-                'icd10': 'J11',
-                'severity': 'moderate'
-            },
-            'migraine': {
-                'en': 'Migraine',
-                'ar': 'الشقيقة',
-                'symptoms': ['headache', 'nausea', 'dizziness'],
-                'description': {
-                    'en': 'A neurological condition characterized by severe headaches',
-                    'ar': 'حالة عصبية تتميز بصداع شديد'
-                },
-                'icd10': 'G43',
-                'severity': 'moderate'
-            },
-            'gastroenteritis': {
-                'en': 'Gastroenteritis',
-                'ar': 'التهاب المعدة والأمعاء',
-                'symptoms': ['nausea', 'abdominal_pain', 'fever', 'fatigue'],
-                'description': {
-                    'en': 'Inflammation of the stomach and intestines',
-                    'ar': 'التهاب في المعدة والأمعاء'
-                },
-                'icd10': 'K59.1',
-                'severity': 'moderate'
-            },
-            'pneumonia': {
-                'en': 'Pneumonia',
-                'ar': 'الالتهاب الرئوي',
-                'symptoms': ['cough', 'fever', 'shortness_of_breath', 'chest_pain', 'fatigue'],
-                'description': {
-                    'en': 'Infection that inflames air sacs in one or both lungs',
-                    'ar': 'عدوى تسبب التهاب الحويصلات الهوائية في الرئتين'
-                },
-                'icd10': 'J18',
-                'severity': 'severe'
-            }
+    ],
+    'ar': [
+        {
+            'action': 'راقب أعراضك وتتبع أي تغييرات',
+            'type': 'monitoring',
+            'priority': 'medium',
+            'precautions': [
+                'احتفظ بمذكرة للأعراض',
+                'سجل وقت وشدة الأعراض',
+                'سجل أي محفزات أو أنماط'
+            ]
+        },
+        {
+            'action': 'حافظ على الترطيب واحصل على راحة كافية',
+            'type': 'lifestyle',
+            'priority': 'high',
+            'precautions': [
+                'اشرب الكثير من السوائل',
+                'احصل على 7-8 ساعات من النوم',
+                'تجنب الأنشطة الشاقة'
+            ]
+        },
+        {
+            'action': 'استشر أخصائي رعاية صحية للحصول على تشخيص صحيح',
+            'type': 'medical',
+            'priority': 'high',
+            'precautions': [
+                'حدد موعداً مع طبيبك',
+                'أحضر مذكرة الأعراض',
+                'اذكر جميع الأدوية التي تتناولها'
+            ]
         }
+    ]
+})
+
+URGENT_RECOMMENDATION = freeze({
+    'en': {
+        'action': 'Seek immediate medical attention due to potentially serious condition',
+        'type': 'urgent',
+        'priority': 'critical',
+        'precautions': [
+            'Go to emergency room if symptoms worsen',
+            'Call emergency services if experiencing severe symptoms',
+            'Do not delay medical care'
+        ]
+    },
+    'ar': {
+        'action': 'اطلب العناية الطبية الفورية بسبب حالة محتملة خطيرة',
+        'type': 'urgent',
+        'priority': 'critical',
+        'precautions': [
+            'اذهب إلى غرفة الطوارئ إذا ساءت الأعراض',
+            'اتصل بخدمات الطوارئ إذا كنت تعاني من أعراض شديدة',
+            'لا تؤخر الرعاية الطبية'
+        ]
+    }
+})
+
+FALLBACK_RESPONSE = freeze({
+    'en': {
+        'message': 'I could not identify specific symptoms from your description. Please try describing your symptoms more specifically, such as "I have a headache and fever" or "I feel nauseous and tired".',
+        'suggestions': [
+            'Use specific symptom names (headache, fever, cough, etc.)',
+            'Describe the location of pain or discomfort',
+            'Mention how long you have been experiencing symptoms',
+            'Include severity (mild, moderate, severe)'
+        ]
+    },
+    'ar': {
+        'message': 'لم أتمكن من تحديد أعراض محددة من وصفك. يرجى محاولة وصف أعراضك بشكل أكثر تحديداً، مثل "أعاني من صداع وحمى" أو "أشعر بالغثيان والتعب".',
+        'suggestions': [
+            'استخدم أسماء أعراض محددة (صداع، حمى، سعال، إلخ)',
+            'اوصف موقع الألم أو عدم الراحة',
+            'اذكر منذ متى تعاني من الأعراض',
+            'اذكر الشدة (خفيف، متوسط، شديد)'
+        ]
+    }
+})
+
+ERROR_MESSAGE = {
+    'en': 'I apologize, but I encountered an issue while analyzing your symptoms. Please try rephrasing your symptoms or contact support if the problem persists.',
+    'ar': 'أعتذر، لكنني واجهت مشكلة أثناء تحليل أعراضك. يرجى إعادة صياغة أعراضك أو الاتصال بالدعم إذا استمرت المشكلة.'
+}
+
+# Complete recommendation lists by (language, urgent)
+_RECOMMENDATIONS = {
+    (language, urgent): FrozenList(
+        ([URGENT_RECOMMENDATION[language]] if urgent else []) + list(GENERAL_RECOMMENDATIONS[language])
+    )
+    for language in SUPPORTED_LANGUAGES
+    for urgent in (False, True)
+}
+
+# (knowledge base fingerprint, symptom ids, ((condition id, matching symptoms), ...))
+CompactAnalysis = Tuple[str, Tuple[int, ...], Tuple[Tuple[int, int], ...]]
+
+# Exported by GET /api/metrics
+ANALYSIS_DURATION = metrics.histogram(
+    'symptom_analyzer_duration_seconds', 'SymptomAnalyzer call latency in seconds, by method', ('method',)
+)
+
+
+class SymptomAnalyzer:
+    """Rule-based symptom analyzer.
+
+    The symptom, condition and red-flag knowledge comes from a compiled, read-only
+    KnowledgeBase (see knowledge_base.py). Instances are immutable once constructed,
+    so a single analyzer can be shared by every request thread (see
+    get_shared_analyzer).
+    """
+
+    def __init__(self, knowledge_base: Optional[KnowledgeBase] = None, scoring_engine: str = 'index'):
+        if knowledge_base is None:
+            knowledge_base = load_knowledge_base()
+        
+        self.knowledge_base = knowledge_base
+        self.scoring_engine = scoring_engine
+        self.symptom_database = knowledge_base.symptom_database
+        self.disease_database = knowledge_base.disease_database
         
         # Red flag symptoms that require immediate medical attention
-        self.red_flags = {
-            'chest_pain': {
-                'en': 'Chest pain can indicate serious heart conditions. Seek immediate medical attention.',
-                'ar': 'ألم الصدر قد يشير إلى حالات قلبية خطيرة. اطلب العناية الطبية الفورية.'
-            },
-            'shortness_of_breath': {
-                'en': 'Severe breathing difficulties require immediate medical evaluation.',
-                'ar': 'صعوبات التنفس الشديدة تتطلب تقييماً طبياً فورياً.'
-            },
-            'severe_headache': {
-                'en': 'Sudden severe headache may indicate serious neurological conditions.',
-                'ar': 'الصداع الشديد المفاجئ قد يشير إلى حالات عصبية خطيرة.'
+        self.red_flags = knowledge_base.red_flags
+        
+        # Prebuilt keyword automaton: extraction is a single pass over the input text
+        self._symptom_matcher = knowledge_base.matcher
+        
+        # Typo-tolerant fallback, consulted only when no keyword matches exactly
+        self._fuzzy_index = knowledge_base.fuzzy_index
+        
+        # Condition scoring backend ('index' for interactive requests, 'matrix' for
+        # vectorized bulk scoring over large knowledge bases)
+        self._scorer = knowledge_base.create_scorer(scoring_engine)
+        
+        # Static responses, complete except for the timestamp
+        self._fallback_results = {
+            language: {
+                'success': True,
+                'extractedSymptoms': FrozenList(),
+                'potentialDiagnoses': FrozenList(),
+                'recommendations': FrozenList(),
+                'redFlags': FrozenList(),
+                'confidenceScore': 0.0,
+                'helpfulMessage': FALLBACK_RESPONSE[language]['message'],
+                'suggestions': FALLBACK_RESPONSE[language]['suggestions'],
+                'timestamp': None,
+                'kbVersion': knowledge_base.revision
             }
+            for language in SUPPORTED_LANGUAGES
         }
+        self._error_results = {
+            language: {
+                'success': False,
+                'error': freeze({
+                    'message': ERROR_MESSAGE[language],
+                    'code': 'ANALYSIS_ERROR'
+                }),
+                'timestamp': None,
+                'kbVersion': knowledge_base.revision
+            }
+            for language in SUPPORTED_LANGUAGES
+        }
+        
+        self._frozen = True
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f'{type(self).__name__} is immutable once constructed')
+        super().__setattr__(name, value)
 
     def extract_symptoms(self, text: str, language: str = 'en') -> List[Dict[str, Any]]:
         """Extract symptoms from user input text"""
-        text_lower = text.lower()
+        return self._symptom_entries(self.match_symptom_ids(text), language)
+
+    def match_symptom_ids(self, text: str) -> List[int]:
+        """Ids of the symptoms mentioned in text, in knowledge base order, each once"""
+        normalized_text = normalize_text(text)
+        matched_ids = self._symptom_matcher.match(normalized_text)
+        if not matched_ids:
+            # Nothing matched verbatim: accept misspelled symptom words ("hedache")
+            matched_ids = self._fuzzy_index.lookup(normalized_text)
+        return sorted(matched_ids)
+
+    def _symptom_entries(self, symptom_ids: Sequence[int], language: str) -> List[Dict[str, Any]]:
+        """Build the response entries of the given symptoms"""
+        symptom_keys = self.knowledge_base.symptom_keys
         extracted_symptoms = []
-        
-        for symptom_key, symptom_data in self.symptom_database.items():
-            for keyword in symptom_data['keywords']:
-                if keyword.lower() in text_lower:
-                    extracted_symptoms.append({
-                        'symptom': symptom_data[language],
-                        'key': symptom_key,
-                        'severity': symptom_data['severity'],
-                        'category': symptom_data['category']
-                    })
-                    break
-        
-        # Remove duplicates
-        seen = set()
-        unique_symptoms = []
-        for symptom in extracted_symptoms:
-            if symptom['key'] not in seen:
-                seen.add(symptom['key'])
-                unique_symptoms.append(symptom)
-        
-        return unique_symptoms
+        for symptom_id in symptom_ids:
+            symptom_key = symptom_keys[symptom_id]
+            symptom_data = self.symptom_database[symptom_key]
+            extracted_symptoms.append({
+                'symptom': symptom_data[language],
+                'key': symptom_key,
+                'severity': symptom_data['severity'],
+                'category': symptom_data['category']
+            })
+        return extracted_symptoms
 
     def analyze_potential_conditions(self, symptoms: List[str], language: str = 'en') -> List[Dict[str, Any]]:
         """Analyze potential medical conditions based on symptoms"""
-        potential_conditions = []
-        
-        for condition_key, condition_data in self.disease_database.items():
-            matching_symptoms = set(symptoms) & set(condition_data['symptoms'])
-            if matching_symptoms:
-                probability = len(matching_symptoms) / len(condition_data['symptoms'])
-                
-                potential_conditions.append({
-                    'condition': condition_data[language],
-                    'key': condition_key,
-                    'probability': probability,
-                    'description': condition_data['description'][language],
-                    'icd10Code': condition_data['icd10'],
-                    'severity': condition_data['severity'],
-                    'matching_symptoms': len(matching_symptoms),
-                    'total_symptoms': len(condition_data['symptoms'])
-                })
-        
-        # Sort by probability (highest first)
-        potential_conditions.sort(key=lambda x: x['probability'], reverse=True)
-        
-        return potential_conditions[:5]  # Return top 5 matches
+        return [
+            self._condition_result(condition_id, matching, language)
+            for condition_id, matching in self._scorer.score(symptoms, MAX_POTENTIAL_CONDITIONS)
+        ]
 
-    def generate_recommendations(self, symptoms: List[str], conditions: List[Dict], language: str = 'en') -> List[Dict[str, Any]]:
-        """Generate medical recommendations based on analysis"""
-        recommendations = []
-        
-        # General recommendations based on language
-        general_recs = {
-            'en': [
-                {
-                    'action': 'Monitor your symptoms and track any changes',
-                    'type': 'monitoring',
-                    'priority': 'medium',
-                    'precautions': [
-                        'Keep a symptom diary',
-                        'Note the time and severity of symptoms',
-                        'Record any triggers or patterns'
-                    ]
-                },
-                {
-                    'action': 'Stay hydrated and get adequate rest',
-                    'type': 'lifestyle',
-                    'priority': 'high',
-                    'precautions': [
-                        'Drink plenty of fluids',
-                        'Get 7-8 hours of sleep',
-                        'Avoid strenuous activities'
-                    ]
-                },
-                {
-                    'action': 'Consult with a healthcare professional for proper diagnosis',
-                    'type': 'medical',
-                    'priority': 'high',
-                    'precautions': [
-                        'Schedule an appointment with your doctor',
-                        'Bring your symptom diary',
-                        'List all medications you are taking'
-                    ]
-                }
-            ],
-            'ar': [
-                {
-                    'action': 'راقب أعراضك وتتبع أي تغييرات',
-                    'type': 'monitoring',
-                    'priority': 'medium',
-                    'precautions': [
-                        'احتفظ بمذكرة للأعراض',
-                        'سجل وقت وشدة الأعراض',
-                        'سجل أي محفزات أو أنماط'
-                    ]
-                },
-                {
-                    'action': 'حافظ على الترطيب واحصل على راحة كافية',
-                    'type': 'lifestyle',
-                    'priority': 'high',
-                    'precautions': [
-                        'اشرب الكثير من السوائل',
-                        'احصل على 7-8 ساعات من النوم',
-                        'تجنب الأنشطة الشاقة'
-                    ]
-                },
-                {
-                    'action': 'استشر أخصائي رعاية صحية للحصول على تشخيص صحيح',
-                    'type': 'medical',
-                    'priority': 'high',
-                    'precautions': [
-                        'حدد موعداً مع طبيبك',
-                        'أحضر مذكرة الأعراض',
-                        'اذكر جميع الأدوية التي تتناولها'
-                    ]
-                }
-            ]
+    def analyze_potential_conditions_many(self, symptom_lists: List[List[str]],
+                                          language: str = 'en') -> List[List[Dict[str, Any]]]:
+        """Analyze potential conditions for several symptom lists in one scoring pass"""
+        return [
+            [self._condition_result(condition_id, matching, language) for condition_id, matching in scored]
+            for scored in self._scorer.score_many(symptom_lists, MAX_POTENTIAL_CONDITIONS)
+        ]
+
+    def _condition_result(self, condition_id: int, matching: int, language: str) -> Dict[str, Any]:
+        """Build the response entry for a scored condition"""
+        condition_key = self._scorer.condition_keys[condition_id]
+        condition_data = self.disease_database[condition_key]
+        total = self._scorer.condition_sizes[condition_id]
+        return {
+            'condition': condition_data[language],
+            'key': condition_key,
+            'probability': matching / total,
+            'description': condition_data['description'][language],
+            'icd10Code': condition_data['icd10'],
+            'severity': condition_data['severity'],
+            'matching_symptoms': matching,
+            'total_symptoms': total
         }
+
+    def generate_recommendations(self, symptoms: List[str], conditions: List[Dict], language: str = 'en') -> Sequence[Dict[str, Any]]:
+        """Generate medical recommendations based on analysis.
         
-        recommendations.extend(general_recs[language])
-        
-        # Add specific recommendations based on conditions
-        if conditions:
-            highest_prob_condition = conditions[0]
-            if highest_prob_condition['severity'] == 'severe':
-                urgent_rec = {
-                    'en': {
-                        'action': 'Seek immediate medical attention due to potentially serious condition',
-                        'type': 'urgent',
-                        'priority': 'critical',
-                        'precautions': [
-                            'Go to emergency room if symptoms worsen',
-                            'Call emergency services if experiencing severe symptoms',
-                            'Do not delay medical care'
-                        ]
-                    },
-                    'ar': {
-                        'action': 'اطلب العناية الطبية الفورية بسبب حالة محتملة خطيرة',
-                        'type': 'urgent',
-                        'priority': 'critical',
-                        'precautions': [
-                            'اذهب إلى غرفة الطوارئ إذا ساءت الأعراض',
-                            'اتصل بخدمات الطوارئ إذا كنت تعاني من أعراض شديدة',
-                            'لا تؤخر الرعاية الطبية'
-                        ]
-                    }
-                }
-                recommendations.insert(0, urgent_rec[language])
-        
-        return recommendations
+        The result is one of the prebuilt, immutable recommendation lists (see
+        _RECOMMENDATIONS); it is shared between calls and must not be modified.
+        """
+        # Urgent advice leads when the most likely condition is severe
+        urgent = bool(conditions) and conditions[0]['severity'] == 'severe'
+        return _RECOMMENDATIONS[language, urgent]
 
     def check_red_flags(self, symptoms: List[str], language: str = 'en') -> List[Dict[str, Any]]:
         """Check for red flag symptoms that require immediate attention"""
@@ -339,88 +307,229 @@ class SymptomAnalyzer:
         
         return red_flags_found
 
+    def triage(self, text: str, language: str = 'en') -> List[Dict[str, Any]]:
+        """Red flags mentioned in text, found with the keywords of the red-flag symptoms only.
+
+        A cheap pre-check run before the full analysis (e.g. to prioritize queued
+        analyses): entries are shaped like check_red_flags results. Misspelled
+        words are not recognized here; the full analysis still reports them.
+        """
+        symptom_keys = self.knowledge_base.symptom_keys
+        matched_ids = self.knowledge_base.red_flag_matcher.match(normalize_text(text))
+        return [
+            {'condition': symptom_keys[symptom_id], 'action': self.red_flags[symptom_keys[symptom_id]][language]}
+            for symptom_id in sorted(matched_ids)
+        ]
+
+    @ANALYSIS_DURATION.time('analyze_symptoms')
     def analyze_symptoms(self, symptoms_text: str, language: str = 'en', additional_info: Dict = None) -> Dict[str, Any]:
         """Main method to analyze symptoms and return comprehensive results"""
+        # Per-stage latency histograms (a no-op timer unless stage timing is enabled)
+        timer = stage_timings.timer()
         try:
             # Extract symptoms from text
             extracted_symptoms = self.extract_symptoms(symptoms_text, language)
+            timer.lap('extraction')
             
             if not extracted_symptoms:
                 # If no symptoms found, provide helpful response instead of error
-                fallback_response = {
-                    'en': {
-                        'message': 'I could not identify specific symptoms from your description. Please try describing your symptoms more specifically, such as "I have a headache and fever" or "I feel nauseous and tired".',
-                        'suggestions': [
-                            'Use specific symptom names (headache, fever, cough, etc.)',
-                            'Describe the location of pain or discomfort',
-                            'Mention how long you have been experiencing symptoms',
-                            'Include severity (mild, moderate, severe)'
-                        ]
-                    },
-                    'ar': {
-                        'message': 'لم أتمكن من تحديد أعراض محددة من وصفك. يرجى محاولة وصف أعراضك بشكل أكثر تحديداً، مثل "أعاني من صداع وحمى" أو "أشعر بالغثيان والتعب".',
-                        'suggestions': [
-                            'استخدم أسماء أعراض محددة (صداع، حمى، سعال، إلخ)',
-                            'اوصف موقع الألم أو عدم الراحة',
-                            'اذكر منذ متى تعاني من الأعراض',
-                            'اذكر الشدة (خفيف، متوسط، شديد)'
-                        ]
-                    }
-                }
-                
-                return {
-                    'success': True,
-                    'extractedSymptoms': [],
-                    'potentialDiagnoses': [],
-                    'recommendations': [],
-                    'redFlags': [],
-                    'confidenceScore': 0.0,
-                    'helpfulMessage': fallback_response[language]['message'],
-                    'suggestions': fallback_response[language]['suggestions'],
-                    'timestamp': datetime.now().isoformat()
-                }
+                return self._fallback_result(language)
             
             # Get symptom keys for analysis
             symptom_keys = [s['key'] for s in extracted_symptoms]
             
             # Analyze potential conditions
             potential_conditions = self.analyze_potential_conditions(symptom_keys, language)
+            timer.lap('conditions')
             
             # Generate recommendations
             recommendations = self.generate_recommendations(symptom_keys, potential_conditions, language)
+            timer.lap('recommendations')
+            
+            return self._analysis_result(extracted_symptoms, potential_conditions, recommendations, language, timer)
             
-            # Check for red flags
+        except Exception as e:
+            # Log error but don't expose it to user
+            return self._error_result(language)
+
+    def analyze_symptoms_stages(self, symptoms_text: str, language: str = 'en') -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Analyze symptoms incrementally, yielding (event, partial result) pairs.
+
+        Events come in the order the client can use them: 'symptoms', then
+        'redFlags' (they only depend on the extracted symptoms, so urgent warnings
+        are not held back by condition scoring), 'diagnoses', 'recommendations' and
+        finally 'complete'. Merging the partial results gives the analyze_symptoms
+        result. Input without symptoms yields only 'complete' with the fallback
+        result; a failure yields 'error' with the generic error result.
+        """
+        timer = stage_timings.timer()
+        started = time.perf_counter()
+        try:
+            extracted_symptoms = self.extract_symptoms(symptoms_text, language)
+            timer.lap('extraction')
+            if not extracted_symptoms:
+                yield 'complete', self._fallback_result(language)
+                return
+            yield 'symptoms', {'extractedSymptoms': extracted_symptoms}
+            
+            symptom_keys = [s['key'] for s in extracted_symptoms]
             red_flags = self.check_red_flags(symptom_keys, language)
+            timer.lap('red_flags')
+            yield 'redFlags', {'redFlags': red_flags}
             
-            # Calculate confidence score
+            potential_conditions = self.analyze_potential_conditions(symptom_keys, language)
+            timer.lap('conditions')
             confidence_score = self._calculate_confidence(extracted_symptoms, potential_conditions)
+            timer.lap('confidence')
+            yield 'diagnoses', {'potentialDiagnoses': potential_conditions, 'confidenceScore': confidence_score}
             
-            return {
+            recommendations = self.generate_recommendations(symptom_keys, potential_conditions, language)
+            timer.lap('recommendations')
+            yield 'recommendations', {'recommendations': recommendations}
+            
+            yield 'complete', {
                 'success': True,
-                'extractedSymptoms': extracted_symptoms,
-                'potentialDiagnoses': potential_conditions,
-                'recommendations': recommendations,
-                'redFlags': red_flags,
-                'confidenceScore': confidence_score,
                 'timestamp': datetime.now().isoformat(),
-                'language': language
+                'language': language,
+                'kbVersion': self.knowledge_base.revision
             }
             
-        except Exception as e:
-            # Log error but don't expose it to user
-            error_message = {
-                'en': 'I apologize, but I encountered an issue while analyzing your symptoms. Please try rephrasing your symptoms or contact support if the problem persists.',
-                'ar': 'أعتذر، لكنني واجهت مشكلة أثناء تحليل أعراضك. يرجى إعادة صياغة أعراضك أو الاتصال بالدعم إذا استمرت المشكلة.'
-            }
+        except Exception:
+            yield 'error', self._error_result(language)
+        finally:
+            ANALYSIS_DURATION.observe(time.perf_counter() - started, 'analyze_symptoms_stages')
+
+    @ANALYSIS_DURATION.time('analyze_many')
+    def analyze_many(self, texts: List[str], language: str = 'en') -> List[Dict[str, Any]]:
+        """Analyze several symptom descriptions at once.
+
+        Condition scoring runs once for the whole batch (and once per distinct symptom
+        set); recommendation lists are prebuilt and shared. Results are returned in
+        input order; a failure in one item only turns that item into an
+        error result.
+        """
+        if language not in SUPPORTED_LANGUAGES:
+            raise ValueError(f"Unsupported language '{language}'")
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        pending: List[Any] = []
+        symptom_sets: Dict[tuple, int] = {}
+        
+        for index, text in enumerate(texts):
+            try:
+                extracted_symptoms = self.extract_symptoms(text, language)
+                if not extracted_symptoms:
+                    results[index] = self._fallback_result(language)
+                    continue
+                symptom_keys = tuple(s['key'] for s in extracted_symptoms)
+                symptom_sets.setdefault(symptom_keys, len(symptom_sets))
+                pending.append((index, extracted_symptoms, symptom_keys))
+            except Exception:
+                results[index] = self._error_result(language)
+        
+        try:
+            scored = self.analyze_potential_conditions_many(list(symptom_sets), language)
+        except Exception:
+            for index, _, _ in pending:
+                results[index] = self._error_result(language)
+            return results
+        
+        for index, extracted_symptoms, symptom_keys in pending:
+            try:
+                potential_conditions = [dict(c) for c in scored[symptom_sets[symptom_keys]]]
+                recommendations = self.generate_recommendations(
+                    list(symptom_keys), potential_conditions, language
+                )
+                results[index] = self._analysis_result(
+                    extracted_symptoms, potential_conditions, recommendations, language
+                )
+            except Exception:
+                results[index] = self._error_result(language)
+        
+        return results
+
+    def analyze_compact_many(self, texts: List[str]) -> List[Optional[CompactAnalysis]]:
+        """Language-independent core of analyze_symptoms for several texts.
+
+        Each analysis is returned in a compact, picklable form: (knowledge base
+        fingerprint, matched symptom ids, scored (condition id, matching symptoms)
+        pairs), or None if it failed. analysis_from_compact() renders it in a
+        language. Used to run the CPU-heavy part in another process (see
+        analysis_pool.py); conditions are scored once per distinct symptom set.
+        """
+        matched: List[Optional[List[int]]] = []
+        for text in texts:
+            try:
+                matched.append(self.match_symptom_ids(text))
+            except Exception:
+                matched.append(None)
+        
+        symptom_keys = self.knowledge_base.symptom_keys
+        symptom_sets = {tuple(ids): None for ids in matched if ids}
+        scored_sets = self._scorer.score_many(
+            [[symptom_keys[symptom_id] for symptom_id in ids] for ids in symptom_sets], MAX_POTENTIAL_CONDITIONS
+        )
+        for ids, scored in zip(symptom_sets, scored_sets):
+            symptom_sets[ids] = tuple((int(condition_id), int(matching)) for condition_id, matching in scored)
+        
+        fingerprint = self.knowledge_base.fingerprint
+        return [
+            None if ids is None else (fingerprint, tuple(ids), symptom_sets[tuple(ids)] if ids else ())
+            for ids in matched
+        ]
+
+    def analysis_from_compact(self, compact: CompactAnalysis, language: str = 'en') -> Dict[str, Any]:
+        """Render a compact analysis (see analyze_compact_many) as an analyze_symptoms result"""
+        fingerprint, symptom_ids, scored = compact
+        if fingerprint != self.knowledge_base.fingerprint:
+            raise ValueError('Compact analysis was produced with another knowledge base')
+        try:
+            extracted_symptoms = self._symptom_entries(symptom_ids, language)
+            if not extracted_symptoms:
+                return self._fallback_result(language)
             
-            return {
-                'success': False,
-                'error': {
-                    'message': error_message[language],
-                    'code': 'ANALYSIS_ERROR'
-                },
-                'timestamp': datetime.now().isoformat()
-            }
+            symptom_keys = [s['key'] for s in extracted_symptoms]
+            potential_conditions = [
+                self._condition_result(condition_id, matching, language) for condition_id, matching in scored
+            ]
+            recommendations = self.generate_recommendations(symptom_keys, potential_conditions, language)
+            return self._analysis_result(extracted_symptoms, potential_conditions, recommendations, language)
+            
+        except Exception:
+            return self._error_result(language)
+
+    def _analysis_result(self, extracted_symptoms: List[Dict], potential_conditions: List[Dict],
+                         recommendations: Sequence[Dict], language: str, timer=NULL_TIMER) -> Dict[str, Any]:
+        """Assemble the response for an analysis that identified symptoms"""
+        symptom_keys = [s['key'] for s in extracted_symptoms]
+        
+        # Check for red flags
+        red_flags = self.check_red_flags(symptom_keys, language)
+        timer.lap('red_flags')
+        
+        # Calculate confidence score
+        confidence_score = self._calculate_confidence(extracted_symptoms, potential_conditions)
+        timer.lap('confidence')
+        
+        return {
+            'success': True,
+            'extractedSymptoms': extracted_symptoms,
+            'potentialDiagnoses': potential_conditions,
+            'recommendations': recommendations,
+            'redFlags': red_flags,
+            'confidenceScore': confidence_score,
+            'timestamp': datetime.now().isoformat(),
+            'language': language,
+            'kbVersion': self.knowledge_base.revision
+        }
+
+    def _fallback_result(self, language: str) -> Dict[str, Any]:
+        """Helpful response for input in which no symptoms could be identified"""
+        return {**self._fallback_results[language], 'timestamp': datetime.now().isoformat()}
+
+    def _error_result(self, language: str) -> Dict[str, Any]:
+        """Generic failure response that does not expose internal errors"""
+        return {**self._error_results[language], 'timestamp': datetime.now().isoformat()}
 
     def _calculate_confidence(self, symptoms: List[Dict], conditions: List[Dict]) -> float:
         """Calculate confidence score for the analysis"""
@@ -455,3 +564,50 @@ class SymptomAnalyzer:
         else:
             raise Exception(result['error']['message'])
 
+
+_shared_analyzer: Optional[SymptomAnalyzer] = None
+_shared_analyzer_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_watcher: Optional[KnowledgeBaseWatcher] = None
+
+
+def get_shared_analyzer() -> SymptomAnalyzer:
+    """Return the process-wide analyzer, building it on first use.
+
+    The analyzer is created lazily (after a gunicorn fork, not before) and then shared
+    by all request threads of the worker. SYMPTOM_SCORING_ENGINE selects its condition
+    scoring engine. Callers should fetch it once per request: a knowledge base reload
+    swaps in a new analyzer, and a request keeps working on the snapshot it fetched.
+    """
+    global _shared_analyzer, _watcher
+    analyzer = _shared_analyzer
+    if analyzer is None:
+        with _shared_analyzer_lock:
+            if _shared_analyzer is None:
+                _shared_analyzer = SymptomAnalyzer(
+                    scoring_engine=os.environ.get('SYMPTOM_SCORING_ENGINE', 'index')
+                )
+                interval = float(os.environ.get('SYMPTOM_KB_RELOAD_INTERVAL', '10'))
+                if interval > 0:
+                    _watcher = KnowledgeBaseWatcher(reload_shared_analyzer, interval)
+                    _watcher.start()
+            analyzer = _shared_analyzer
+    return analyzer
+
+
+def reload_shared_analyzer() -> bool:
+    """Rebuild the shared analyzer from the current knowledge base files and swap it in.
+
+    The new knowledge base and analyzer are built completely before a single
+    reference assignment publishes them, so request threads never wait and
+    in-flight analyses finish on the snapshot they started with. Returns True if a
+    knowledge base with different content was installed.
+    """
+    global _shared_analyzer
+    with _reload_lock:
+        current = get_shared_analyzer()
+        knowledge_base = load_knowledge_base()
+        if knowledge_base.fingerprint == current.knowledge_base.fingerprint:
+            return False
+        _shared_analyzer = SymptomAnalyzer(knowledge_base, scoring_engine=current.scoring_engine)
+        return True
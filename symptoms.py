@@ -1,12 +1,53 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, g, stream_with_context, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
+from sqlalchemy import or_
+from datetime import datetime, timedelta
 from src.models.medical_user import MedicalUser, SymptomAnalysis, db
-from src.services.symptom_analyzer import SymptomAnalyzer
+from src.services.symptom_analyzer import get_shared_analyzer, SUPPORTED_LANGUAGES, URGENT_RECOMMENDATION
+from src.services.analysis_cache import result_cache, inflight_analyses
+from src.services.stage_timing import stage_timings
+from src.services.response_fragments import encode
+from src.services.job_queue import analysis_jobs, PRIORITY_ROUTINE, PRIORITY_URGENT
+from src.services.analysis_pool import analysis_pool
+from src.services.metrics_registry import metrics
+import os
 import uuid
 
 symptoms_bp = Blueprint('symptoms', __name__)
 
+# Maximum number of symptom descriptions accepted by one batch request
+MAX_BATCH_SIZE = 500
+
+analyses_coalesced_total = metrics.counter(
+    'symptom_analyses_coalesced_total', 'Public analyses served from an identical analysis already in progress'
+)
+
+# Asynchronous analyses still 'processing' after this long were lost (worker crash
+# or restart) and are queued again
+STALE_ANALYSIS_AGE = timedelta(seconds=float(os.environ.get('ANALYSIS_JOB_STALE_SECONDS', 300)))
+
+def _analyze(analyzer, symptoms_text, language, additional_info=None):
+    """Analyze in the process pool when it is enabled (ANALYSIS_PROCESSES), else in this thread"""
+    if analysis_pool.enabled:
+        return analysis_pool.analyze(analyzer, symptoms_text, language)
+    return analyzer.analyze_symptoms(
+        symptoms_text=symptoms_text,
+        language=language,
+        additional_info=additional_info
+    )
+
+@symptoms_bp.before_request
+def start_stage_timing():
+    g.stage_timing_token = stage_timings.collect_request()
+
+@symptoms_bp.after_request
+def add_server_timing_header(response):
+    """Report the analysis stages of this request in a Server-Timing header (if enabled)"""
+    server_timing = stage_timings.finish_request(g.pop('stage_timing_token', None))
+    if server_timing:
+        response.headers['Server-Timing'] = server_timing
+    return response
+
 @symptoms_bp.route('/analyze', methods=['POST'])
 def analyze_symptoms():
     """Public endpoint for symptom analysis"""
@@ -26,15 +67,42 @@ def analyze_symptoms():
         language = data.get('language', 'en')
         additional_info = data.get('additional_info', {})
         
-        # Initialize the symptom analyzer
-        analyzer = SymptomAnalyzer()
+        # Shared, read-only analyzer for this worker
+        analyzer = get_shared_analyzer()
         
-        # Analyze symptoms using the new method
-        result = analyzer.analyze_symptoms(
-            symptoms_text=symptoms_text,
-            language=language,
-            additional_info=additional_info
-        )
+        # Identical inputs against the same knowledge base are served from the cache
+        cache_key = None
+        if isinstance(symptoms_text, str):
+            cache_key = result_cache.make_key(symptoms_text, language, analyzer.knowledge_base.fingerprint)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                return jsonify(cached)
+        
+        if cache_key is None:
+            result = _analyze(
+                analyzer,
+                symptoms_text=symptoms_text,
+                language=language,
+                additional_info=additional_info
+            )
+            return jsonify(result)
+        
+        def analyze_and_cache():
+            result = _analyze(
+                analyzer,
+                symptoms_text=symptoms_text,
+                language=language,
+                additional_info=additional_info
+            )
+            # Cached before the in-flight entry ends, so later requests find it
+            if result['success']:
+                result_cache.put(cache_key, result)
+            return result
+        
+        # Concurrent identical requests wait for one analysis and share its result
+        result, shared = inflight_analyses.do(cache_key, analyze_and_cache)
+        if shared:
+            analyses_coalesced_total.inc()
         
         return jsonify(result)
         
@@ -47,6 +115,111 @@ def analyze_symptoms():
             }
         }), 500
 
+@symptoms_bp.route('/analyze/stream', methods=['POST'])
+def analyze_symptoms_stream():
+    """Public endpoint streaming the analysis stages as server-sent events"""
+    data = request.get_json(silent=True)
+    symptoms_text = data.get('symptoms') if isinstance(data, dict) else None
+    
+    if not isinstance(symptoms_text, str) or not symptoms_text.strip():
+        return jsonify({
+            'success': False,
+            'error': {
+                'message': 'Symptoms text is required',
+                'code': 'VALIDATION_ERROR'
+            }
+        }), 400
+    
+    language = data.get('language', 'en')
+    if language not in SUPPORTED_LANGUAGES:
+        return jsonify({
+            'success': False,
+            'error': {
+                'message': 'Language must be "en" or "ar"',
+                'code': 'VALIDATION_ERROR'
+            }
+        }), 400
+    
+    stages = get_shared_analyzer().analyze_symptoms_stages(symptoms_text, language)
+    
+    def events():
+        for event, payload in stages:
+            yield f'event: {event}\ndata: {encode(payload)}\n\n'
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Send each event as soon as it is written (no proxy buffering, e.g. nginx)
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@symptoms_bp.route('/analyze/batch', methods=['POST'])
+def analyze_symptoms_batch():
+    """Public endpoint analyzing many symptom descriptions in one request"""
+    try:
+        data = request.get_json()
+        texts = data.get('symptoms') if isinstance(data, dict) else None
+        
+        if not isinstance(texts, list) or not texts:
+            return jsonify({
+                'success': False,
+                'error': {
+                    'message': 'A non-empty list of symptom descriptions is required',
+                    'code': 'VALIDATION_ERROR'
+                }
+            }), 400
+        
+        if len(texts) > MAX_BATCH_SIZE:
+            return jsonify({
+                'success': False,
+                'error': {
+                    'message': f'A batch may contain at most {MAX_BATCH_SIZE} symptom descriptions',
+                    'code': 'VALIDATION_ERROR'
+                }
+            }), 400
+        
+        language = data.get('language', 'en')
+        if language not in SUPPORTED_LANGUAGES:
+            return jsonify({
+                'success': False,
+                'error': {
+                    'message': 'Language must be "en" or "ar"',
+                    'code': 'VALIDATION_ERROR'
+                }
+            }), 400
+        
+        # Invalid items get their own error result; the rest are analyzed together
+        valid_indexes = [index for index, text in enumerate(texts) if isinstance(text, str) and text.strip()]
+        valid_texts = [texts[index] for index in valid_indexes]
+        if analysis_pool.enabled:
+            analyzed = analysis_pool.analyze_many(get_shared_analyzer(), valid_texts, language)
+        else:
+            analyzed = get_shared_analyzer().analyze_many(valid_texts, language)
+        
+        results = [{
+            'success': False,
+            'error': {
+                'message': 'Symptoms text is required',
+                'code': 'VALIDATION_ERROR'
+            }
+        }] * len(texts)
+        for index, result in zip(valid_indexes, analyzed):
+            results[index] = result
+        
+        return jsonify({
+            'success': True,
+            'count': len(results),
+            'results': results
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'message': 'An error occurred while analyzing symptoms. Please try again.',
+                'code': 'ANALYSIS_ERROR'
+            }
+        }), 500
+
 @symptoms_bp.route('/symptoms', methods=['POST'])
 @jwt_required()
 def analyze_symptoms_authenticated():
@@ -101,6 +274,12 @@ def analyze_symptoms_authenticated():
                 }
             }), 400
         
+        run_async = data.get('async') is True or 'respond-async' in request.headers.get('Prefer', '')
+        
+        # Pre-triage for queued analyses: red flags found by their keywords alone are
+        # returned at once, and those analyses skip ahead of routine ones
+        red_flags = get_shared_analyzer().triage(data['symptoms'], language) if run_async else None
+        
         # Create analysis record
         analysis = SymptomAnalysis(
             user_id=current_user_id,
@@ -108,34 +287,67 @@ def analyze_symptoms_authenticated():
             language=language,
             additional_info=data.get('additionalInfo'),
             follow_up_answers=data.get('followUpAnswers'),
+            red_flags=red_flags,
             status='processing'
         )
         
         db.session.add(analysis)
-        db.session.commit()
+        with stage_timings.timed('db_insert'):
+            db.session.commit()
+        
+        # Asynchronous mode: a job worker completes the analysis and the client polls
+        # GET /symptoms/<analysis_id>
+        if run_async:
+            priority = PRIORITY_URGENT if red_flags else PRIORITY_ROUTINE
+            if not analysis_jobs.submit(_run_analysis_job, current_app._get_current_object(), analysis.id,
+                                        priority=priority):
+                db.session.delete(analysis)
+                db.session.commit()
+                error_response = {
+                    'success': False,
+                    'error': {
+                        'code': 'SERVICE_BUSY',
+                        'message': 'Too many analyses are in progress. Please try again shortly.',
+                        'timestamp': datetime.utcnow().isoformat()
+                    }
+                }
+                if red_flags:
+                    error_response['redFlags'] = red_flags
+                return jsonify(error_response), 503, {'Retry-After': '5'}
+            
+            response_data = {
+                'analysisId': analysis.id,
+                'status': analysis.status,
+                'priority': 'urgent' if red_flags else 'routine',
+                'redFlags': red_flags
+            }
+            if red_flags:
+                # Minimal urgent response; the full analysis follows
+                response_data['recommendations'] = [URGENT_RECOMMENDATION[language]]
+            return jsonify({
+                'success': True,
+                'data': response_data
+            }), 202, {'Location': url_for('symptoms.get_symptom_analysis', analysis_id=analysis.id)}
         
-        # Initialize symptom analyzer
-        analyzer = SymptomAnalyzer()
+        # Shared, read-only analyzer for this worker
+        analyzer = get_shared_analyzer()
         
         try:
             # Perform analysis
-            result = analyzer.analyze_symptoms(
+            result = _analyze(
+                analyzer,
                 symptoms_text=data['symptoms'],
                 language=language,
                 additional_info=data.get('additionalInfo')
             )
             
+            # Update analysis with results
+            for column, value in _result_columns(result).items():
+                setattr(analysis, column, value)
+            
             if result['success']:
-                # Update analysis with results
-                analysis.extracted_symptoms = result.get('extractedSymptoms')
-                analysis.potential_diagnoses = result.get('potentialDiagnoses')
-                analysis.recommendations = result.get('recommendations')
-                analysis.red_flags = result.get('redFlags')
-                analysis.confidence_score = result.get('confidenceScore')
-                analysis.status = 'completed'
-                analysis.completed_at = datetime.utcnow()
-                
-                db.session.commit()
+                with stage_timings.timed('db_update'):
+                    db.session.commit()
                 
                 # Prepare response
                 response_data = {
@@ -146,6 +358,7 @@ def analyze_symptoms_authenticated():
                     'redFlags': analysis.red_flags,
                     'medicalDisclaimer': 'This analysis is for informational purposes only and does not replace professional medical advice. Please consult with a healthcare professional for proper diagnosis and treatment.',
                     'confidenceScore': analysis.confidence_score,
+                    'kbVersion': analysis.kb_version,
                     'analysisTimestamp': analysis.completed_at.isoformat()
                 }
                 
@@ -155,14 +368,15 @@ def analyze_symptoms_authenticated():
                 }), 200
             else:
                 # Analysis failed
-                analysis.status = 'failed'
-                db.session.commit()
+                with stage_timings.timed('db_update'):
+                    db.session.commit()
                 return jsonify(result), 422
             
         except Exception as analysis_error:
             # Update analysis status to failed
             analysis.status = 'failed'
-            db.session.commit()
+            with stage_timings.timed('db_update'):
+                db.session.commit()
             
             return jsonify({
                 'success': False,
@@ -184,6 +398,98 @@ def analyze_symptoms_authenticated():
             }
         }), 500
 
+def _result_columns(result):
+    """SymptomAnalysis column values recording an analyzer result"""
+    if not result['success']:
+        return {'status': 'failed', 'kb_version': result.get('kbVersion')}
+    return {
+        'extracted_symptoms': result.get('extractedSymptoms'),
+        'potential_diagnoses': result.get('potentialDiagnoses'),
+        'recommendations': result.get('recommendations'),
+        'red_flags': result.get('redFlags'),
+        'confidence_score': result.get('confidenceScore'),
+        'kb_version': result.get('kbVersion'),
+        'status': 'completed',
+        'completed_at': datetime.utcnow()
+    }
+
+def _run_analysis_job(app, analysis_id):
+    """Complete a queued analysis (runs on an analysis job worker)"""
+    with app.app_context():
+        analysis = SymptomAnalysis.query.get(analysis_id)
+        if analysis is None or analysis.status != 'processing':
+            return
+        try:
+            result = _analyze(
+                get_shared_analyzer(),
+                symptoms_text=analysis.symptoms_text,
+                language=analysis.language,
+                additional_info=analysis.additional_info
+            )
+            columns = _result_columns(result)
+        except Exception:
+            columns = {'status': 'failed'}
+        
+        # Only a row still processing is updated: a recovered job may run twice
+        with stage_timings.timed('db_update'):
+            SymptomAnalysis.query.filter_by(id=analysis_id, status='processing').update(
+                columns, synchronize_session=False
+            )
+            db.session.commit()
+
+def _claim_stale(analysis_id):
+    """Mark a stale analysis as requeued now; False if it is not stale or another
+    worker or request already claimed it within STALE_ANALYSIS_AGE.
+
+    The check and the update are one conditional UPDATE, so however many workers
+    recover at start-up or poll the same analysis, it is queued again once.
+    """
+    now = datetime.utcnow()
+    cutoff = now - STALE_ANALYSIS_AGE
+    claimed = SymptomAnalysis.query.filter(
+        SymptomAnalysis.id == analysis_id,
+        SymptomAnalysis.status == 'processing',
+        SymptomAnalysis.created_at < cutoff,
+        or_(SymptomAnalysis.requeued_at.is_(None), SymptomAnalysis.requeued_at < cutoff)
+    ).update({'requeued_at': now}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def _requeue(app, analyses):
+    """Claim and queue (analysis id, triaged red flags) pairs again, urgent ones
+    first; returns how many were queued"""
+    queued = 0
+    with app.app_context():
+        for analysis_id, red_flags in sorted(analyses, key=lambda analysis: not analysis[1]):
+            if not _claim_stale(analysis_id):
+                continue
+            priority = PRIORITY_URGENT if red_flags else PRIORITY_ROUTINE
+            if analysis_jobs.submit(_run_analysis_job, app, analysis_id, priority=priority):
+                queued += 1
+            else:
+                # Release the claim so the next fetch can try again
+                SymptomAnalysis.query.filter_by(id=analysis_id).update(
+                    {'requeued_at': None}, synchronize_session=False
+                )
+                db.session.commit()
+    return queued
+
+def recover_stale_analyses(app):
+    """Requeue analyses left 'processing' by a crashed or restarted worker.
+
+    Called at start-up by every worker; each row is claimed (see _claim_stale)
+    before it is queued, so only one of them queues it. Rows the queue cannot
+    take now are retried when they are next fetched (see get_symptom_analysis).
+    """
+    with app.app_context():
+        stale = [
+            tuple(row) for row in db.session.query(SymptomAnalysis.id, SymptomAnalysis.red_flags).filter(
+                SymptomAnalysis.status == 'processing',
+                SymptomAnalysis.created_at < datetime.utcnow() - STALE_ANALYSIS_AGE
+            )
+        ]
+    return _requeue(app, stale)
+
 @symptoms_bp.route('/symptoms/<analysis_id>', methods=['GET'])
 @jwt_required()
 def get_symptom_analysis(analysis_id):
@@ -207,10 +513,17 @@ def get_symptom_analysis(analysis_id):
                 }
             }), 404
         
+        headers = {}
+        if analysis.status == 'processing':
+            if datetime.utcnow() - analysis.created_at > STALE_ANALYSIS_AGE:
+                _requeue(current_app._get_current_object(), [(analysis.id, analysis.red_flags)])
+            # Still running: tell the client when to poll again
+            headers['Retry-After'] = '1'
+        
         return jsonify({
             'success': True,
             'data': analysis.to_dict()
-        }), 200
+        }), 200, headers
         
     except Exception as e:
         return jsonify({
@@ -0,0 +1,119 @@
+"""Tests of the analysis result cache: keys, expiry, LRU bounds and knowledge base changes.
+
+Usage:
+    python -m pytest src/test_analysis_cache.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from src.services import analysis_cache
+from src.services.analysis_cache import AnalysisCache
+
+
+class FakeTime:
+    """Stands in for the time module of analysis_cache: monotonic() is set by the test"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(analysis_cache, 'time', fake)
+    return fake
+
+
+def result(text, timestamp='2024-01-01T00:00:00'):
+    return {'success': True, 'symptoms': [text], 'timestamp': timestamp}
+
+
+def test_hit_returns_the_result_with_a_fresh_timestamp(clock):
+    cache = AnalysisCache()
+    key = cache.make_key('headache', 'en', 'kb1')
+    assert cache.get(key) is None
+
+    cache.put(key, result('headache'))
+    cached = cache.get(key)
+    assert cached['symptoms'] == ['headache']
+    assert cached['timestamp'] != '2024-01-01T00:00:00'
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_key_is_the_text_the_matchers_see():
+    make_key = AnalysisCache.make_key
+    assert make_key('  I have a HEADACHE\n', 'en', 'kb1') == make_key('i have a headache', 'en', 'kb1')
+    # Arabic orthographic variants (hamza on alef) are analyzed identically
+    assert make_key('أعاني من صداع', 'ar', 'kb1') == make_key('اعاني من صداع', 'ar', 'kb1')
+    assert make_key('headache', 'en', 'kb1') != make_key('headache', 'ar', 'kb1')
+    assert make_key('headache', 'en', 'kb1') != make_key('headaches', 'en', 'kb1')
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = AnalysisCache(ttl=60)
+    key = cache.make_key('fever', 'en', 'kb1')
+    cache.put(key, result('fever'))
+
+    clock.now += 59.9
+    assert cache.get(key) is not None
+    clock.now += 0.1
+    assert cache.get(key) is None
+    assert cache.stats()['expirations'] == 1
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['bytes'] == 0
+
+
+def test_least_recently_used_entry_is_evicted_first(clock):
+    cache = AnalysisCache(max_entries=2)
+    first, second, third = (cache.make_key(text, 'en', 'kb1') for text in ('cough', 'fever', 'rash'))
+    cache.put(first, result('cough'))
+    cache.put(second, result('fever'))
+    assert cache.get(first) is not None
+
+    cache.put(third, result('rash'))
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.get(third) is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_memory_bound_evicts_and_skips_oversized_results(clock):
+    small = result('cough')
+    entry_size = (analysis_cache._estimate_size(AnalysisCache.make_key('cough', 'en', 'kb1'))
+                  + analysis_cache._estimate_size(small))
+    cache = AnalysisCache(max_bytes=entry_size * 2 + entry_size // 2)
+    keys = [cache.make_key(text, 'en', 'kb1') for text in ('cough', 'fever', 'rash')]
+    for key in keys:
+        cache.put(key, result(key[0]))
+
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['bytes'] <= cache.max_bytes
+    assert cache.get(keys[0]) is None
+
+    cache.put(cache.make_key('big', 'en', 'kb1'), result('x' * cache.max_bytes))
+    assert cache.get(cache.make_key('big', 'en', 'kb1')) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_new_knowledge_base_fingerprint_drops_older_results(clock):
+    cache = AnalysisCache()
+    old_keys = [cache.make_key(text, 'en', 'kb1') for text in ('cough', 'fever')]
+    for key in old_keys:
+        cache.put(key, result(key[0]))
+
+    new_key = cache.make_key('cough', 'en', 'kb2')
+    assert cache.get(new_key) is None
+    cache.put(new_key, result('cough'))
+
+    assert all(cache.get(key) is None for key in old_keys)
+    assert cache.get(new_key) is not None
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['evictions'] == 2
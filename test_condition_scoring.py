@@ -0,0 +1,95 @@
+"""Tests of the condition scoring engines against the linear scan they replaced.
+
+Usage:
+    python -m pytest src/test_condition_scoring.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itertools
+import random
+
+import pytest
+
+from src.services.condition_scoring import np, create_scorer
+from src.services.symptom_analyzer import MAX_POTENTIAL_CONDITIONS, SymptomAnalyzer
+
+ENGINES = ['index', pytest.param('matrix', marks=pytest.mark.skipif(np is None, reason='NumPy is not installed'))]
+
+
+def baseline_scores(disease_database, symptoms, top_k=MAX_POTENTIAL_CONDITIONS):
+    """(condition id, matching count) pairs of the original scan over every condition:
+    a stable sort by probability, so ties keep knowledge base order"""
+    scored = []
+    for condition_id, condition_data in enumerate(disease_database.values()):
+        matching_symptoms = set(symptoms) & set(condition_data['symptoms'])
+        if matching_symptoms:
+            probability = len(matching_symptoms) / len(condition_data['symptoms'])
+            scored.append((probability, condition_id, len(matching_symptoms)))
+    scored.sort(key=lambda entry: entry[0], reverse=True)
+    return [(condition_id, matching) for _, condition_id, matching in scored[:top_k]]
+
+
+def synthetic_disease_database(conditions, symptoms, seed=7):
+    """Many conditions over few symptoms, so that probabilities often tie"""
+    rng = random.Random(seed)
+    symptom_keys = [f'symptom_{i}' for i in range(symptoms)]
+    return {
+        f'condition_{i}': {'symptoms': rng.sample(symptom_keys, rng.randint(1, 6))}
+        for i in range(conditions)
+    }, symptom_keys
+
+
+@pytest.fixture(scope='module')
+def knowledge_base():
+    return SymptomAnalyzer().knowledge_base
+
+
+def knowledge_base_queries(disease_database, symptom_keys):
+    """Every single symptom and pair, each condition's own symptoms, and random sets
+    (with unknown and repeated keys)"""
+    rng = random.Random(3)
+    queries = [[key] for key in symptom_keys]
+    queries += [list(pair) for pair in itertools.combinations(symptom_keys, 2)]
+    queries += [list(condition_data['symptoms']) for condition_data in disease_database.values()]
+    queries += [rng.sample(symptom_keys, rng.randint(1, min(6, len(symptom_keys)))) + ['unknown']
+                for _ in range(200)]
+    queries += [[symptom_keys[0]] * 3, [], ['unknown']]
+    return queries
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_knowledge_base_scores_match_the_linear_scan(knowledge_base, engine):
+    disease_database = knowledge_base.disease_database
+    scorer = knowledge_base.create_scorer(engine)
+    queries = knowledge_base_queries(disease_database, list(knowledge_base.symptom_keys))
+
+    expected = [baseline_scores(disease_database, symptoms) for symptoms in queries]
+    assert [scorer.score(symptoms, MAX_POTENTIAL_CONDITIONS) for symptoms in queries] == expected
+    assert scorer.score_many(queries, MAX_POTENTIAL_CONDITIONS) == expected
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('top_k', [1, MAX_POTENTIAL_CONDITIONS, 50])
+def test_tied_scores_keep_knowledge_base_order(engine, top_k):
+    disease_database, symptom_keys = synthetic_disease_database(conditions=2000, symptoms=12)
+    scorer = create_scorer(engine, disease_database)
+    rng = random.Random(5)
+    queries = [rng.sample(symptom_keys, rng.randint(1, 5)) for _ in range(100)]
+
+    expected = [baseline_scores(disease_database, symptoms, top_k) for symptoms in queries]
+    assert scorer.score_many(queries, top_k) == expected
+    assert [scorer.score(symptoms, top_k) for symptoms in queries] == expected
+
+
+def test_analyzer_results_match_the_linear_scan(knowledge_base):
+    analyzer = SymptomAnalyzer(knowledge_base)
+    condition_keys = list(knowledge_base.disease_database)
+    symptoms = list(knowledge_base.symptom_keys)[:3]
+
+    results = analyzer.analyze_potential_conditions(symptoms, 'en')
+    expected = baseline_scores(knowledge_base.disease_database, symptoms)
+    assert [result['key'] for result in results] == [condition_keys[condition_id] for condition_id, _ in expected]
+    assert [result['matching_symptoms'] for result in results] == [matching for _, matching in expected]
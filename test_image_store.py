@@ -0,0 +1,134 @@
+"""Tests of the content-addressed image store: deduplication, renditions and garbage collection.
+
+Usage:
+    python -m pytest src/test_image_store.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hashlib
+import io
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+
+from src.services.image_store import RENDITIONS, ImageStore
+
+GRACE_PERIOD = 60
+
+
+def png_bytes(seed):
+    pixels = np.random.default_rng(seed).integers(0, 256, (300, 400, 3), dtype=np.uint8)
+    image = io.BytesIO()
+    Image.fromarray(pixels).save(image, 'PNG')
+    return image.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(directory=str(tmp_path), thumbnail_size=64, model_input_size=32,
+                      grace_period=GRACE_PERIOD)
+
+
+def upload(store, data, name='upload.part'):
+    """Write data as a validated upload would leave it, then put it in the store"""
+    path = os.path.join(store.directory, name)
+    with open(path, 'wb') as upload_file:
+        upload_file.write(data)
+    return store.put(path, hashlib.sha256(data).hexdigest(), '.png'), path
+
+
+def age(store, key, seconds=GRACE_PERIOD * 2):
+    """Make a blob and its renditions look stored seconds ago"""
+    then = time.time() - seconds
+    for path in [store.path(key)] + [store.rendition_path(key, name) for name in RENDITIONS]:
+        os.utime(path, (then, then))
+
+
+def test_same_content_is_stored_once(store):
+    data = png_bytes(1)
+    (key, created), first_path = upload(store, data, 'first.part')
+    (duplicate_key, duplicate_created), second_path = upload(store, data, 'second.part')
+
+    digest = hashlib.sha256(data).hexdigest()
+    assert key == duplicate_key == f'objects/{digest[:2]}/{digest}.png'
+    assert (created, duplicate_created) == (True, False)
+    assert not os.path.exists(first_path) and not os.path.exists(second_path)
+    with open(store.path(key), 'rb') as blob:
+        assert blob.read() == data
+    assert store.stats()['stored'] == 1
+    assert store.stats()['duplicates'] == 1
+
+    (other_key, other_created), _ = upload(store, png_bytes(2))
+    assert other_key != key and other_created
+
+
+def test_renditions_are_derived_when_a_blob_is_stored(store):
+    (key, _), _ = upload(store, png_bytes(1))
+
+    with Image.open(store.rendition_path(key, 'thumbnail')) as thumbnail:
+        assert max(thumbnail.size) == 64
+    model_input = store.load_model_input(key)
+    assert model_input.shape == (32, 32, 3)
+    assert model_input.dtype == np.uint8
+
+    # A missing rendition is derived again on use
+    os.unlink(store.rendition_path(key, 'model'))
+    assert store.load_model_input(key).shape == (32, 32, 3)
+
+
+def test_duplicate_upload_protects_an_old_blob_from_collection(store):
+    data = png_bytes(1)
+    (key, _), _ = upload(store, data)
+    age(store, key)
+
+    upload(store, data)
+    assert store.collect_garbage(set()) == 0
+    assert os.path.exists(store.path(key))
+
+
+def test_garbage_collection_keeps_referenced_and_recent_blobs(store):
+    (referenced, _), _ = upload(store, png_bytes(1))
+    (unreferenced, _), _ = upload(store, png_bytes(2))
+    (recent, _), _ = upload(store, png_bytes(3))
+    age(store, referenced)
+    age(store, unreferenced)
+
+    assert store.collect_garbage({referenced}) == 1
+    assert os.path.exists(store.path(referenced))
+    assert os.path.exists(store.path(recent))
+    assert not os.path.exists(store.path(unreferenced))
+    assert not any(os.path.exists(store.rendition_path(unreferenced, name)) for name in RENDITIONS)
+    assert all(os.path.exists(store.rendition_path(referenced, name)) for name in RENDITIONS)
+    assert store.stats()['removed'] == 1
+
+
+def test_garbage_collection_removes_old_orphan_renditions(store):
+    (key, _), _ = upload(store, png_bytes(1))
+    age(store, key)
+    os.unlink(store.path(key))
+
+    assert store.collect_garbage(set()) == 0
+    assert not any(os.path.exists(store.rendition_path(key, name)) for name in RENDITIONS)
+
+
+def test_release_removes_only_old_content_addressed_blobs(store):
+    (old, _), _ = upload(store, png_bytes(1))
+    (recent, _), _ = upload(store, png_bytes(2))
+    age(store, old)
+
+    assert store.release([old, recent, 'legacy/upload.png']) == 1
+    assert not os.path.exists(store.path(old))
+    assert os.path.exists(store.path(recent))
+
+
+def test_keys_cannot_leave_the_store(store):
+    with pytest.raises(ValueError):
+        store.path('../outside.png')
+    with pytest.raises(ValueError):
+        store.path('objects/../../outside.png')
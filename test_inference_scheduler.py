@@ -0,0 +1,262 @@
+"""Tests of the micro-batching inference scheduler, with an injected model and inputs.
+
+Usage:
+    python -m pytest src/test_inference_scheduler.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+import uuid
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.services.inference_scheduler import InferenceScheduler
+from src.services.model_registry import ModelRegistryError
+from src.services.skin_model import SKIN_CONDITIONS, SkinConditionModel
+
+TIMEOUT = 5
+
+
+class RecordingModel(SkinConditionModel):
+    """Uniform probabilities; records batch sizes and can hold the first batch"""
+
+    version = 'test-1'
+
+    def __init__(self, hold_first=False):
+        self.batch_sizes = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold_first:
+            self.release.set()
+
+    def predict(self, images):
+        self.batch_sizes.append(len(images))
+        self.started.set()
+        self.release.wait(TIMEOUT)
+        return np.full((len(images), len(self.labels)), 1 / len(self.labels))
+
+
+class Collector:
+    """Result handler recording every (results, model) call until count results arrived"""
+
+    def __init__(self, count):
+        self.count = count
+        self.calls = []
+        self.done = threading.Event()
+
+    def __call__(self, results, model):
+        self.calls.append((results, model))
+        if sum(len(results) for results, _ in self.calls) >= self.count:
+            self.done.set()
+
+    @property
+    def results(self):
+        return [result for results, _ in self.calls for result in results]
+
+
+def load_input(key):
+    if key == 'missing':
+        raise FileNotFoundError(key)
+    return np.zeros((4, 4, 3), dtype=np.uint8)
+
+
+def make_scheduler(model, **options):
+    return InferenceScheduler(model_provider=lambda: model, load_input=load_input, **options)
+
+
+def test_batches_hold_at_most_max_batch_size():
+    model = RecordingModel()
+    scheduler = make_scheduler(model, max_batch_size=4, max_wait=0.2)
+    handler = Collector(10)
+
+    for index in range(10):
+        assert scheduler.submit(handler, 'image', index)
+
+    assert handler.done.wait(TIMEOUT)
+    assert model.batch_sizes == [4, 4, 2]
+    assert sorted(result.args[0] for result in handler.results) == list(range(10))
+    stats = scheduler.stats()
+    assert stats['batches'] == 3
+    assert stats['completed'] == 10
+    assert stats['queued'] == 0
+
+
+def test_partial_batch_runs_after_max_wait():
+    model = RecordingModel()
+    scheduler = make_scheduler(model, max_batch_size=16, max_wait=0.1)
+    handler = Collector(2)
+
+    started = time.monotonic()
+    scheduler.submit(handler, 'image', 'first')
+    time.sleep(0.02)
+    scheduler.submit(handler, 'image', 'second')
+    assert handler.done.wait(TIMEOUT)
+    elapsed = time.monotonic() - started
+
+    # Both images share one batch, which waited for max_wait but not much longer
+    assert model.batch_sizes == [2]
+    assert 0.1 <= elapsed < 0.1 + 1
+    assert len(handler.calls) == 1
+
+
+def test_results_and_errors_reach_their_own_handler():
+    model = RecordingModel()
+    scheduler = make_scheduler(model, max_batch_size=8, max_wait=0.2)
+    first, second = Collector(2), Collector(2)
+
+    scheduler.submit(first, 'image', 'readable')
+    scheduler.submit(first, 'missing', 'unreadable')
+    scheduler.submit(second, 'image', 'ok')
+    scheduler.submit(second, 'image', 'also ok')
+
+    assert first.done.wait(TIMEOUT) and second.done.wait(TIMEOUT)
+    assert model.batch_sizes == [3]
+    by_args = {result.args[0]: result for result in first.results + second.results}
+    assert [result.args[0] for result in first.results] == ['readable', 'unreadable']
+    assert isinstance(by_args['unreadable'].error, FileNotFoundError)
+    assert by_args['unreadable'].probabilities is None
+    assert by_args['readable'].error is None
+    assert [result.args[0] for result in second.results] == ['ok', 'also ok']
+    assert all(result.error is None and len(result.probabilities) == len(SKIN_CONDITIONS)
+               for result in second.results)
+    # One handler call per handler and batch, with the model that ran it
+    assert [len(results) for results, _ in first.calls + second.calls] == [2, 2]
+    assert all(batch_model is model for _, batch_model in first.calls + second.calls)
+    assert scheduler.stats()['failed'] == 1
+
+
+def test_failed_prediction_fails_every_image_of_the_batch():
+    class BrokenModel(SkinConditionModel):
+        def predict(self, images):
+            raise RuntimeError('broken')
+
+    scheduler = make_scheduler(BrokenModel(), max_wait=0.01)
+    handler = Collector(1)
+    scheduler.submit(handler, 'image', 'a')
+
+    assert handler.done.wait(TIMEOUT)
+    result, = handler.results
+    assert isinstance(result.error, RuntimeError)
+    assert scheduler.stats()['failed'] == 1
+
+
+def test_handler_gets_no_model_when_none_can_be_fetched():
+    def no_model():
+        raise ModelRegistryError('No model version is active')
+
+    scheduler = InferenceScheduler(max_wait=0.01, model_provider=no_model, load_input=load_input)
+    handler = Collector(2)
+    scheduler.submit(handler, 'image', 'a')
+    scheduler.submit(handler, 'image', 'b')
+
+    assert handler.done.wait(TIMEOUT)
+    assert all(model is None for _, model in handler.calls)
+    assert all(isinstance(result.error, ModelRegistryError) for result in handler.results)
+
+
+def test_failing_handler_is_logged_and_counted(caplog):
+    def failing_handler(results, model):
+        raise RuntimeError('database is down')
+
+    model = RecordingModel()
+    scheduler = make_scheduler(model, max_wait=0.01)
+    other = Collector(1)
+    scheduler.submit(failing_handler, 'image', 'a')
+    scheduler.submit(other, 'image', 'b')
+
+    assert other.done.wait(TIMEOUT)
+    deadline = time.monotonic() + TIMEOUT
+    while scheduler.stats()['failed'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert scheduler.stats()['failed'] == 1
+    assert 'Result handler failed' in caplog.text
+
+
+def test_submit_refuses_images_beyond_max_pending():
+    model = RecordingModel(hold_first=True)
+    scheduler = make_scheduler(model, max_batch_size=1, max_wait=0, max_pending=2)
+    handler = Collector(3)
+
+    scheduler.submit(handler, 'image', 0)
+    assert model.started.wait(TIMEOUT)
+    assert scheduler.submit(handler, 'image', 1)
+    assert scheduler.submit(handler, 'image', 2)
+    assert not scheduler.submit(handler, 'image', 3)
+    assert scheduler.stats()['rejected'] == 1
+
+    model.release.set()
+    assert handler.done.wait(TIMEOUT)
+    assert scheduler.submit(handler, 'image', 4)
+
+
+def test_upload_answers_503_when_the_queue_is_full(monkeypatch):
+    image_module = pytest.importorskip('PIL.Image')
+    import io
+    from flask_jwt_extended import create_access_token
+    from src.main import app
+    from src.models.medical_user import ImageAnalysis, MedicalUser, db
+    from src.routes import images
+
+    monkeypatch.setattr(images, 'inference_scheduler', make_scheduler(RecordingModel(), max_pending=0))
+    with app.app_context():
+        user = MedicalUser(email=f'{uuid.uuid4()}@example.com', password_hash='x',
+                           consent_to_medical_analysis=True)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        token = create_access_token(identity=user_id)
+
+    # Noise passes the quality check: sharp, mid brightness, full contrast
+    pixels = np.random.default_rng(0).integers(0, 256, (600, 600, 3), dtype=np.uint8)
+    image = io.BytesIO()
+    image_module.fromarray(pixels).save(image, 'PNG')
+    image.seek(0)
+    response = app.test_client().post(
+        '/api/analysis/images/upload',
+        data={'image': (image, 'skin.png'), 'metadata': '{"language": "en"}'},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 503
+    assert response.get_json()['error']['code'] == 'SERVICE_BUSY'
+    assert response.headers['Retry-After'] == '5'
+    with app.app_context():
+        assert ImageAnalysis.query.filter_by(user_id=user_id).count() == 0
+        db.session.delete(db.session.get(MedicalUser, user_id))
+        db.session.commit()
+
+
+def test_results_without_a_model_fail_their_analyses():
+    from src.main import app
+    from src.models.medical_user import ImageAnalysis, MedicalUser, db
+    from src.routes.images import _record_inference_results
+    from src.services.inference_scheduler import InferenceResult
+
+    with app.app_context():
+        user = MedicalUser(email=f'{uuid.uuid4()}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        analysis = ImageAnalysis(user_id=user.id, image_path='missing.png')
+        db.session.add(analysis)
+        db.session.commit()
+        user_id, analysis_id = user.id, analysis.id
+
+    # Even a result without an error: no model, no diagnosis
+    probabilities = np.full(len(SKIN_CONDITIONS), 1 / len(SKIN_CONDITIONS))
+    _record_inference_results([InferenceResult((app, analysis_id, 'en'), probabilities, None)], None)
+
+    with app.app_context():
+        analysis = db.session.get(ImageAnalysis, analysis_id)
+        assert analysis.status == 'failed'
+        assert analysis.model_version is None
+        assert analysis.skin_condition_analysis is None
+        db.session.delete(analysis)
+        db.session.delete(db.session.get(MedicalUser, user_id))
+        db.session.commit()
@@ -0,0 +1,105 @@
+"""Tests of the background job queue: capacity, urgent reserve and priority order.
+
+Usage:
+    python -m pytest src/test_job_queue.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+
+from src.services.job_queue import PRIORITY_URGENT, JobQueue
+
+TIMEOUT = 5
+
+
+class Recorder:
+    """Jobs appending their name to .order; the first one holds its worker until released"""
+
+    def __init__(self):
+        self.order = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.finished = threading.Semaphore(0)
+
+    def blocking(self, name):
+        self.started.set()
+        self.release.wait(TIMEOUT)
+        self.record(name)
+
+    def record(self, name):
+        self.order.append(name)
+        self.finished.release()
+
+    def wait(self, count):
+        return all(self.finished.acquire(timeout=TIMEOUT) for _ in range(count))
+
+
+def wait_for(condition):
+    """Call condition() until it is true, for at most TIMEOUT seconds"""
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_urgent_jobs_use_the_reserve_when_routine_work_fills_the_queue():
+    jobs = JobQueue(max_workers=1, max_pending=2, urgent_reserve=1)
+    recorder = Recorder()
+
+    assert jobs.submit(recorder.blocking, 'running')
+    assert recorder.started.wait(TIMEOUT)
+    assert jobs.submit(recorder.record, 'routine 1')
+    assert jobs.submit(recorder.record, 'routine 2')
+    assert not jobs.submit(recorder.record, 'routine 3')
+    assert jobs.submit(recorder.record, 'urgent 1', priority=PRIORITY_URGENT)
+    assert not jobs.submit(recorder.record, 'urgent 2', priority=PRIORITY_URGENT)
+
+    stats = jobs.stats()
+    assert stats['capacity'] == 3
+    assert stats['urgentReserve'] == 1
+    assert stats['active'] == 1
+    assert stats['queued'] == 3
+    assert stats['rejected'] == 2
+    assert stats['urgent'] == 1
+
+    recorder.release.set()
+    assert recorder.wait(4)
+    # The urgent job overtakes the routine ones queued before it
+    assert recorder.order == ['running', 'urgent 1', 'routine 1', 'routine 2']
+
+
+def test_reserve_defaults_to_the_worker_count():
+    jobs = JobQueue(max_workers=3, max_pending=0)
+    recorder = Recorder()
+    assert jobs.urgent_reserve == 3
+
+    for index in range(3):
+        assert jobs.submit(recorder.blocking, f'routine {index}')
+    assert not jobs.submit(recorder.record, 'routine 3')
+    for index in range(3):
+        assert jobs.submit(recorder.record, f'urgent {index}', priority=PRIORITY_URGENT)
+    assert not jobs.submit(recorder.record, 'urgent 3', priority=PRIORITY_URGENT)
+
+    recorder.release.set()
+    assert recorder.wait(6)
+
+
+def test_places_are_freed_by_finished_and_failed_jobs():
+    jobs = JobQueue(max_workers=1, max_pending=0, urgent_reserve=0)
+    recorder = Recorder()
+
+    def failing():
+        raise RuntimeError('job failed')
+
+    assert jobs.submit(failing)
+    assert wait_for(lambda: jobs.stats()['failed'] == 1)
+    assert wait_for(lambda: jobs.submit(recorder.record, 'next'))
+    assert recorder.wait(1)
+    assert wait_for(lambda: jobs.stats()['completed'] == 1)
+    assert jobs.stats()['active'] == 0
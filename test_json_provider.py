@@ -0,0 +1,66 @@
+"""Tests of the orjson JSON provider: response bodies identical to Flask's default provider.
+
+Usage:
+    python -m pytest src/test_json_provider.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from src.json_provider import FastJSONProvider
+from src.services.response_fragments import FrozenDict, FrozenList
+
+NAN, INF = float('nan'), float('inf')
+
+PAYLOADS = {
+    'ascii': {'success': True, 'data': {'confidence': 0.57, 'conditions': ['flu', 'cold'], 'note': None}},
+    'arabic': {'message': 'صداع وحمى'},
+    'latin-1 text': {'name': 'Zoë Müller', 'note': 'café'},
+    'emoji': {'message': 'feeling better 😀'},
+    'control chars': {'text': 'line\nbreak\ttab\x00\x7f'},
+    'datetime': {'at': datetime(2024, 1, 2, 3, 4, 5), 'id': uuid.UUID(int=7), 'dose': Decimal('2.50')},
+    'floats': {'values': [0.57, 1e-05, 0.0001, 1e16, 1.5e300, -0.0, 123456789.125]},
+    'nan': {'score': NAN, 'missing': None},
+    'infinities': {'bounds': [-INF, 0.5, INF]},
+    'nested nan': {'results': [{'id': 1, 'scores': (0.1, None)}, {'id': 2, 'scores': (NAN,)}]},
+    'nan in fragment': {'cached': FrozenDict(score=NAN, tags=FrozenList(['a'])), 'other': None},
+    'null without floats': {'value': None, 'items': [None, 'null']},
+    'big int': {'value': 2 ** 70},
+    'list': [1, 'two', None, False],
+}
+
+
+@pytest.fixture(scope='module')
+def providers():
+    app = Flask(__name__)
+    with app.app_context():
+        yield DefaultJSONProvider(app), FastJSONProvider(app)
+
+
+@pytest.mark.parametrize('name', sorted(PAYLOADS))
+def test_response_body_matches_the_default_provider(providers, name):
+    stdlib_provider, fast_provider = providers
+    payload = PAYLOADS[name]
+    assert fast_provider.response(payload).get_data() == stdlib_provider.response(payload).get_data()
+
+
+def test_non_finite_floats_are_not_written_as_null(providers):
+    _, fast_provider = providers
+    body = fast_provider.response({'values': [NAN, INF, -INF], 'missing': None}).get_data()
+    assert body == b'{"missing":null,"values":[NaN,Infinity,-Infinity]}\n'
+
+
+def test_loads_accepts_what_the_default_provider_accepts(providers):
+    stdlib_provider, fast_provider = providers
+    for document in ('{"a": [1, 2.5, null]}', '[NaN, Infinity]', '{"big": 123456789012345678901234567890}'):
+        loaded, expected = fast_provider.loads(document), stdlib_provider.loads(document)
+        assert repr(loaded) == repr(expected)
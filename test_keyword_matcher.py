@@ -0,0 +1,105 @@
+"""Tests of the single-pass keyword matcher against the substring scan it replaced.
+
+Usage:
+    python -m pytest src/test_keyword_matcher.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import re
+
+import pytest
+
+from src.services.keyword_matcher import LATIN_SUFFIXES, KeywordMatcher
+from src.services.symptom_analyzer import SymptomAnalyzer
+from src.services.text_normalizer import normalize_text
+
+# Derived forms of every vocabulary keyword: single and chained endings for Latin
+# keywords, attached prefixes and suffixes for Arabic ones
+LATIN_ENDINGS = [''] + sorted(LATIN_SUFFIXES) + ['fully', 'lessness', 'ishness']
+ARABIC_PREFIXES = ['', 'و', 'ب', 'ال', 'وال', 'بال', 'لل']
+ARABIC_SUFFIXES = ['', 'ي', 'ها', 'ات', 'ه', 'هم']
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return SymptomAnalyzer()
+
+
+def baseline_symptoms(symptom_database, text):
+    """Symptom keys found by the original `keyword in text.lower()` scan.
+
+    The matcher must respect word boundaries, so Latin hits starting inside another
+    word ("ache" in "stomache") are left out; Arabic keywords keep the plain
+    substring test, which allows attached prefixes.
+    """
+    text_lower = text.lower()
+    found = set()
+    for symptom_key, symptom_data in symptom_database.items():
+        for keyword in symptom_data['keywords']:
+            keyword = keyword.lower()
+            if keyword.isascii():
+                hit = re.search(r'(?<!\w)' + re.escape(keyword), text_lower)
+            else:
+                hit = keyword in text_lower
+            if hit:
+                found.add(symptom_key)
+                break
+    return found
+
+
+def vocabulary_texts(symptom_database):
+    for symptom_data in symptom_database.values():
+        for keyword in symptom_data['keywords']:
+            if keyword.isascii():
+                for ending in LATIN_ENDINGS:
+                    yield keyword + ending
+                    yield f'i have had {keyword + ending} since yesterday'
+            else:
+                for prefix in ARABIC_PREFIXES:
+                    for suffix in ARABIC_SUFFIXES:
+                        yield prefix + keyword + suffix
+                        yield f'أعاني من {prefix + keyword + suffix} منذ أمس'
+
+
+def test_matcher_agrees_with_the_substring_scan_over_the_vocabulary(analyzer):
+    database = analyzer.symptom_database
+    differences = []
+    for text in vocabulary_texts(database):
+        expected = baseline_symptoms(database, text)
+        found = {symptom['key'] for symptom in analyzer.extract_symptoms(text, 'en')}
+        if found != expected:
+            differences.append((text, sorted(expected - found), sorted(found - expected)))
+    assert differences == []
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('painful throat', {'headache', 'chest_pain', 'abdominal_pain', 'back_pain'}),
+    ('feeling feverish', {'fever'}),
+    ('breathless at night', {'shortness_of_breath'}),
+    ('nauseated and coughing', {'nausea', 'cough'}),
+    ('أعاني من الصداع', {'headache'}),
+])
+def test_derived_forms_match(analyzer, text, expected):
+    assert {symptom['key'] for symptom in analyzer.extract_symptoms(text, 'en')} >= expected
+
+
+@pytest.mark.parametrize('text', ['a hotel room', 'painting the fence', 'headphones'])
+def test_other_words_do_not_match(text):
+    matcher = KeywordMatcher({'hot': ['hot'], 'pain': ['pain'], 'head': ['head']})
+    assert matcher.match(normalize_text(text)) == set()
+
+
+def test_overlapping_keywords_all_match():
+    matcher = KeywordMatcher({'chest pain': [1], 'pain': [2], 'chest': [3]})
+    assert matcher.match('sharp chest pain') == {1, 2, 3}
+    assert [(start, end) for start, end, _ in matcher.iter_matches('chest pain')] == [(0, 5), (0, 10), (6, 10)]
+
+
+def test_restored_matcher_matches_like_the_original():
+    matcher = KeywordMatcher({'cough': ['cough'], 'صداع': ['headache']})
+    restored = KeywordMatcher.from_state(matcher.state())
+    text = normalize_text('Coughing and صداعي')
+    assert restored.match(text) == matcher.match(text) == {'cough', 'headache'}
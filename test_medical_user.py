@@ -0,0 +1,48 @@
+"""Tests of the medical data models.
+
+Usage:
+    python -m pytest src/test_medical_user.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import inspect, text
+
+from src.models.medical_user import ImageAnalysis, MedicalUser, SymptomAnalysis, db, upgrade_schema
+
+NEW_COLUMNS = {'symptom_analyses': {'kb_version', 'requeued_at'}, 'image_analyses': {'requeued_at'}}
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+
+def test_upgrade_adds_the_columns_of_newer_releases(tmp_path):
+    app = make_app(tmp_path / 'app.db')
+    with app.app_context():
+        db.create_all()
+        # As created by the release before these columns existed
+        with db.engine.begin() as connection:
+            for table, columns in NEW_COLUMNS.items():
+                for column in columns:
+                    connection.execute(text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+
+        assert sorted(upgrade_schema()) == ['image_analyses.requeued_at', 'symptom_analyses.kb_version',
+                                            'symptom_analyses.requeued_at']
+        for table, columns in NEW_COLUMNS.items():
+            assert columns <= {column['name'] for column in inspect(db.engine).get_columns(table)}
+        # Queries of the upgraded tables work, and a second run has nothing to do
+        user = MedicalUser(email='upgrade@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(SymptomAnalysis(user_id=user.id, symptoms_text='fever', language='en', kb_version='v1'))
+        db.session.commit()
+        assert SymptomAnalysis.query.one().kb_version == 'v1'
+        assert ImageAnalysis.query.count() == 0
+        assert upgrade_schema() == []
@@ -0,0 +1,100 @@
+"""Tests of the in-process metrics registry.
+
+Usage:
+    python -m pytest src/test_metrics_registry.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+
+import pytest
+
+from src.services.metrics_registry import MetricsRegistry, archive_dead_workers
+
+TIMEOUT = 5
+
+
+def test_threads_are_merged_and_retired():
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', 'Test counter', ('kind',))
+    histogram = registry.histogram('test_seconds', 'Test histogram', buckets=(0.1, 1))
+
+    def work():
+        for _ in range(100):
+            counter.inc('a')
+        histogram.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc('b', amount=2)
+
+    snapshot = registry.snapshot()
+    assert snapshot['counters'] == {('test_total', ('a',)): 400, ('test_total', ('b',)): 2}
+    assert snapshot['histograms'][('test_seconds', ())] == [0, 4, 0, 2.0]
+    assert 'test_total{kind="a"} 400' in registry.export()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_worker_starts_over_without_deadlock():
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', 'Test counter')
+    # The parent thread owns a shard when forking, as after importing main.py
+    counter.inc()
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            registry.ensure_process()
+            counter.inc(amount=5)
+            if registry.snapshot()['counters'] == {('test_total', ()): 5}:
+                status = 0
+        finally:
+            os._exit(status)
+
+    deadline = time.monotonic() + TIMEOUT
+    while True:
+        finished, status = os.waitpid(pid, os.WNOHANG)
+        if finished:
+            break
+        if time.monotonic() > deadline:
+            os.kill(pid, 9)
+            os.waitpid(pid, 0)
+            pytest.fail('The forked process hung in ensure_process()')
+        time.sleep(0.01)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+    assert registry.snapshot()['counters'] == {('test_total', ()): 1}
+
+
+def test_snapshots_of_exited_workers_are_archived(tmp_path):
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', 'Test counter')
+    gauge = registry.gauge('test_gauge', 'Test gauge')
+    counter.inc(amount=3)
+    gauge.inc()
+    registry.flush(str(tmp_path))
+    # Written by a worker that has exited (pid 2**22 + 1 is above pid_max on most systems)
+    dead = tmp_path / f'worker_{os.getpid()}.json'
+    dead.rename(tmp_path / 'worker_4194305.json')
+    contents = (tmp_path / 'worker_4194305.json').read_text().replace(f'"pid": {os.getpid()}', '"pid": 4194305')
+    (tmp_path / 'worker_4194305.json').write_text(contents)
+
+    archive_dead_workers(str(tmp_path))
+    assert not (tmp_path / 'worker_4194305.json').exists()
+    assert (tmp_path / 'archive.json').exists()
+
+    os.environ['METRICS_MULTIPROC_DIR'] = str(tmp_path)
+    try:
+        values = registry.collect()
+    finally:
+        del os.environ['METRICS_MULTIPROC_DIR']
+    # This process's own snapshot plus the archived counters; the dead gauge is dropped
+    assert values['counters'][('test_total', ())] == 6
+    assert values['gauges'][('test_gauge', ())] == 1
@@ -0,0 +1,48 @@
+"""Tests of the model registry: publishing, activation and the checks on load.
+
+Usage:
+    python -m pytest src/test_model_registry.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from src.services.model_registry import ModelRegistry, ModelRegistryError
+
+
+def test_no_active_version_leaves_no_model(tmp_path):
+    registry = ModelRegistry(str(tmp_path), input_size=32)
+    with pytest.raises(ModelRegistryError):
+        registry.current()
+    # Nothing is published or activated behind the operator's back
+    assert registry.versions() == []
+    assert registry.active_version() is None
+
+
+def test_activated_version_is_served(tmp_path):
+    registry = ModelRegistry(str(tmp_path), input_size=32)
+    registry.publish_reference('v1', hidden=8)
+    registry.activate('v1')
+
+    assert registry.active_version() == 'v1'
+    assert registry.current().version == 'v1'
+    assert registry.current().input_size == 32
+    # Another worker follows the ACTIVE file
+    assert ModelRegistry(str(tmp_path), input_size=32).current().version == 'v1'
+
+
+def test_version_for_another_input_size_is_refused(tmp_path):
+    registry = ModelRegistry(str(tmp_path), input_size=32)
+    registry.publish_reference('v1', hidden=8)
+    registry.publish_reference('v2', hidden=8, input_size=64)
+    registry.activate('v1')
+
+    with pytest.raises(ModelRegistryError, match='64 pixel inputs'):
+        registry.activate('v2')
+    assert registry.active_version() == 'v1'
+    assert registry.current().version == 'v1'
@@ -0,0 +1,145 @@
+"""Tests of the skin condition models and of the rendering of their predictions.
+
+Usage:
+    python -m pytest src/test_skin_model.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.services.inference_scheduler import InferenceScheduler
+from src.services.skin_model import (HIGH_RISK_THRESHOLD, SKIN_CONDITIONS, ReferenceSkinModel,
+                                     SkinConditionModel, interpret_prediction)
+
+LABELS = tuple(SKIN_CONDITIONS)
+
+
+def probabilities(**by_label):
+    """Probability vector over LABELS, the rest spread evenly"""
+    rest = (1 - sum(by_label.values())) / (len(LABELS) - len(by_label))
+    return [by_label.get(label, rest) for label in LABELS]
+
+
+def test_reference_model_returns_a_distribution_per_image():
+    model = ReferenceSkinModel(input_size=32, hidden=16)
+    images = np.random.default_rng(0).integers(0, 256, (5, 32, 32, 3), dtype=np.uint8)
+
+    result = model.predict(images)
+
+    assert result.shape == (5, len(LABELS))
+    assert np.allclose(result.sum(axis=1), 1)
+    assert (result >= 0).all()
+    # Same seed, same weights: predictions are reproducible, and batching does not change them
+    assert np.allclose(ReferenceSkinModel(input_size=32, hidden=16).predict(images[:1]), result[:1], atol=1e-6)
+
+
+def test_reference_model_temperature_flattens_probabilities():
+    images = np.random.default_rng(1).integers(0, 256, (3, 32, 32, 3), dtype=np.uint8)
+    sharp = ReferenceSkinModel(input_size=32, hidden=16).predict(images)
+    flat = ReferenceSkinModel(input_size=32, hidden=16, calibration={'temperature': 10.0}).predict(images)
+
+    assert (flat.max(axis=1) < sharp.max(axis=1)).all()
+    assert (flat.argmax(axis=1) == sharp.argmax(axis=1)).all()
+
+
+def test_only_real_models_are_diagnostic():
+    assert SkinConditionModel.diagnostic
+    assert not ReferenceSkinModel(input_size=32, hidden=16).diagnostic
+
+
+def test_interpret_prediction_ranks_conditions():
+    interpreted = interpret_prediction(probabilities(acne=0.6, eczema=0.2), LABELS, 'en')
+
+    analysis = interpreted['skinConditionAnalysis']
+    assert analysis['primaryDiagnosis']['conditionId'] == 'acne'
+    assert analysis['primaryDiagnosis']['confidence'] == 0.6
+    assert analysis['primaryDiagnosis']['icd10Code'] == SKIN_CONDITIONS['acne']['icd10Code']
+    assert [diagnosis['conditionId'] for diagnosis in analysis['alternativeDiagnoses']][0] == 'eczema'
+    assert len(analysis['alternativeDiagnoses']) == 2
+    assert interpreted['riskAssessment']['level'] == 'low'
+
+
+def test_likely_high_risk_alternative_raises_the_risk_level():
+    interpreted = interpret_prediction(
+        probabilities(benign_nevus=0.5, suspicious_lesion=HIGH_RISK_THRESHOLD), LABELS, 'en')
+
+    assert interpreted['skinConditionAnalysis']['primaryDiagnosis']['conditionId'] == 'benign_nevus'
+    risk = interpreted['riskAssessment']
+    assert risk['level'] == 'high'
+    assert risk['factors'] == ['Benign mole', 'Suspicious pigmented lesion']
+
+    unlikely = interpret_prediction(
+        probabilities(benign_nevus=0.5, suspicious_lesion=HIGH_RISK_THRESHOLD / 2), LABELS, 'en')
+    assert unlikely['riskAssessment']['level'] == 'low'
+
+
+def test_interpret_prediction_is_localized():
+    interpreted = interpret_prediction(probabilities(psoriasis=0.7), LABELS, 'ar')
+
+    assert interpreted['skinConditionAnalysis']['primaryDiagnosis']['condition'] == SKIN_CONDITIONS['psoriasis']['ar'][0]
+    assert interpreted['riskAssessment']['monitoring'] == 'راجع الطبيب إذا لم تتحسن الحالة خلال أسبوع'
+    # Unsupported languages fall back to English
+    fallback = interpret_prediction(probabilities(psoriasis=0.7), LABELS, 'fr')
+    assert fallback['skinConditionAnalysis']['primaryDiagnosis']['condition'] == 'Psoriasis'
+
+
+def test_image_analyses_record_only_diagnostic_models():
+    import uuid
+    from src.main import app
+    from src.models.medical_user import ImageAnalysis, MedicalUser, db
+    from src.routes import images
+
+    class DiagnosticModel(SkinConditionModel):
+        version = 'diagnostic-1'
+
+        def predict(self, batch):
+            return np.array([probabilities(tinea=0.9)] * len(batch))
+
+    with app.app_context():
+        user = MedicalUser(email=f'{uuid.uuid4()}@example.com', password_hash='x',
+                           consent_to_medical_analysis=True)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    def analyze(model):
+        with app.app_context():
+            analysis = ImageAnalysis(user_id=user_id, image_path='test', image_metadata={}, status='processing',
+                                     created_at=datetime.utcnow())
+            db.session.add(analysis)
+            db.session.commit()
+            analysis_id = analysis.id
+        done = threading.Event()
+
+        def handler(results, batch_model):
+            images._record_inference_results(results, batch_model)
+            done.set()
+
+        scheduler = InferenceScheduler(max_wait=0, model_provider=lambda: model,
+                                       load_input=lambda key: np.zeros((32, 32, 3), dtype=np.uint8))
+        scheduler.submit(handler, 'test', app, analysis_id, 'en')
+        assert done.wait(5)
+        with app.app_context():
+            return db.session.get(ImageAnalysis, analysis_id).to_dict()
+
+    try:
+        completed = analyze(DiagnosticModel())
+        assert completed['status'] == 'completed'
+        assert completed['modelVersion'] == 'diagnostic-1'
+        assert completed['skinConditionAnalysis']['primaryDiagnosis']['conditionId'] == 'tinea'
+
+        stand_in = analyze(ReferenceSkinModel(input_size=32, hidden=16))
+        assert stand_in['status'] == 'failed'
+        assert stand_in['skinConditionAnalysis'] is None
+    finally:
+        with app.app_context():
+            db.session.delete(db.session.get(MedicalUser, user_id))
+            db.session.commit()
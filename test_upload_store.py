@@ -0,0 +1,143 @@
+"""Tests of the resumable upload sessions of the upload store, in a temporary directory.
+
+Usage:
+    python -m pytest src/test_upload_store.py
+"""
+import os
+import sys
+# Same import root as main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hashlib
+import io
+import time
+import uuid
+
+import pytest
+
+from src.services.upload_store import UploadError, UploadStore
+
+# PNG signature followed by filler: enough for the store, which only sniffs the type
+IMAGE = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 40
+
+
+def make_store(tmp_path, **options):
+    options.setdefault('chunk_size', 1000)
+    return UploadStore(directory=str(tmp_path), **options)
+
+
+def send(store, session, data):
+    return store.append(session, session.offset, io.BytesIO(data).read)
+
+
+def test_chunks_resume_at_the_reported_offset(tmp_path):
+    store = make_store(tmp_path)
+    session = store.new_session('user', len(IMAGE), 'skin.png')
+
+    assert send(store, session, IMAGE[:3000]) == 3000
+    assert store.get_session(session.upload_id).offset == 3000
+    assert send(store, session, IMAGE[3000:]) == len(IMAGE)
+
+    stored = store.complete(session)
+    assert stored.size == len(IMAGE)
+    assert stored.sha256 == hashlib.sha256(IMAGE).hexdigest()
+    assert stored.content_type == 'image/png'
+    assert store.get_session(session.upload_id) is None
+
+
+def test_chunk_at_another_offset_is_refused(tmp_path):
+    store = make_store(tmp_path)
+    session = store.new_session('user', len(IMAGE))
+    send(store, session, IMAGE[:100])
+
+    for offset in (0, 50, 200):
+        with pytest.raises(UploadError) as error:
+            store.append(session, offset, io.BytesIO(IMAGE[offset:]).read)
+        assert error.value.code == 'OFFSET_MISMATCH'
+        assert error.value.status == 409
+    assert store.get_session(session.upload_id).offset == 100
+
+
+def test_dropped_request_keeps_the_bytes_received(tmp_path):
+    store = make_store(tmp_path)
+    session = store.new_session('user', len(IMAGE))
+    body = io.BytesIO(IMAGE[:2500])
+
+    def read(size):
+        data = body.read(size)
+        if not data:
+            raise ConnectionResetError('client went away')
+        return data
+
+    with pytest.raises(ConnectionResetError):
+        store.append(session, 0, read)
+    session = store.get_session(session.upload_id)
+    assert session.offset == 2500
+    send(store, session, IMAGE[2500:])
+    assert store.complete(session).sha256 == hashlib.sha256(IMAGE).hexdigest()
+
+
+def test_another_worker_catches_up_on_the_hash(tmp_path):
+    first, second = make_store(tmp_path), make_store(tmp_path)
+    session = first.new_session('user', len(IMAGE))
+    send(first, session, IMAGE[:4096])
+
+    # The second worker has no running hash: it hashes the part on disk first
+    session = second.get_session(session.upload_id)
+    send(second, session, IMAGE[4096:])
+    assert second.complete(session).sha256 == hashlib.sha256(IMAGE).hexdigest()
+
+
+def test_bytes_past_the_length_or_missing_are_refused(tmp_path):
+    store = make_store(tmp_path)
+    session = store.new_session('user', 100)
+    with pytest.raises(UploadError) as error:
+        send(store, session, IMAGE[:101])
+    assert error.value.code == 'FILE_TOO_LARGE'
+
+    session = store.get_session(session.upload_id)
+    with pytest.raises(UploadError) as error:
+        store.complete(session)
+    assert error.value.code == 'UPLOAD_INCOMPLETE'
+
+    with pytest.raises(UploadError) as error:
+        store.new_session('user', store.max_size + 1)
+    assert error.value.code == 'FILE_TOO_LARGE'
+
+
+def test_unknown_uploads_leave_no_session_lock(tmp_path):
+    store = make_store(tmp_path)
+    for _ in range(3):
+        with pytest.raises(UploadError) as error:
+            store.discard(str(uuid.uuid4()))
+        assert error.value.code == 'UPLOAD_NOT_FOUND'
+    assert store.get_session(str(uuid.uuid4())) is None
+    assert store.get_session('not an id') is None
+    assert store.stats()['sessionLocks'] == 0
+
+    session = store.new_session('user', len(IMAGE))
+    send(store, session, IMAGE[:10])
+    store.discard(session.upload_id)
+    assert store.stats()['sessionLocks'] == 0
+    with pytest.raises(UploadError):
+        send(store, session, IMAGE[10:])
+    assert store.stats()['sessionLocks'] == 0
+
+
+def test_purge_forgets_expired_sessions(tmp_path):
+    store = make_store(tmp_path, session_ttl=60)
+    expired = store.new_session('user', len(IMAGE))
+    send(store, expired, IMAGE[:10])
+    active = store.new_session('user', len(IMAGE))
+    send(store, active, IMAGE[:10])
+    assert store.stats()['sessionLocks'] == 2
+
+    idle_since = time.time() - 120
+    for name in (f'{expired.upload_id}.part', f'{expired.upload_id}.json'):
+        os.utime(os.path.join(store.partial_directory, name), (idle_since, idle_since))
+
+    assert store.purge_expired() == 1
+    assert store.get_session(expired.upload_id) is None
+    assert store.get_session(active.upload_id).offset == 10
+    assert store.stats() == {'maxSize': store.max_size, 'chunkSize': 1000,
+                             'cachedHashers': 1, 'sessionLocks': 1}
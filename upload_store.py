@@ -0,0 +1,428 @@
+"""Streaming storage of uploaded skin images.
+
+Uploads are never held in memory as a whole: the request body is read in
+fixed-size chunks (IMAGE_UPLOAD_CHUNK_SIZE, 64 KiB by default) that are hashed
+(SHA-256) and written to disk as they arrive, so the memory used by an upload is
+bounded by one chunk whatever the image size or the number of concurrent uploads.
+
+Two ways in:
+
+- one request: ImageWriter is the werkzeug stream_factory target of a
+  multipart form (see routes/images.py), store() then validates the image,
+- resumable sessions for flaky mobile connections: new_session() reserves an
+  upload of a known length, append() adds the chunk starting at the current
+  offset (a dropped request keeps what was written, and the client resumes from
+  the offset reported by get_session()), complete() validates the image.
+
+A validated image (StoredImage) is still a file of this store; the caller moves
+it into the content-addressed image store (image_store.put) or removes it.
+
+Session state is kept on disk (IMAGE_UPLOAD_DIR/partial), so any worker can take
+the next chunk of a session. The running hash of a session is cached by the
+worker that received its last chunk; another worker first catches up by hashing
+the part already on disk. Sessions idle for longer than IMAGE_UPLOAD_SESSION_TTL
+seconds are removed.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: sessions are only locked within a process
+    fcntl = None
+
+DEFAULT_UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
+
+# Leading bytes of the accepted image formats
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', '.png'),
+)
+
+
+class UploadError(Exception):
+    """Rejected upload; code, status and details are returned to the client"""
+
+    def __init__(self, code: str, message: str, status: int = 400, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.details = details
+
+
+def sniff_image_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """(content type, file extension) of an accepted image, from its first 12 bytes"""
+    for signature, content_type, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp', '.webp'
+    return None
+
+
+class StoredImage:
+    """A complete, validated upload"""
+
+    __slots__ = ('upload_id', 'path', 'size', 'sha256', 'content_type', 'extension')
+
+    def __init__(self, upload_id: str, path: str, size: int, sha256: str, content_type: str, extension: str):
+        self.upload_id = upload_id
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+        self.extension = extension
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'uploadId': self.upload_id, 'size': self.size, 'sha256': self.sha256, 'contentType': self.content_type}
+
+
+class ImageWriter:
+    """Writable file for one incoming image: hashes and counts the bytes as they are written.
+
+    Raises UploadError (413) once more than max_size bytes were written. seek() only
+    flushes: werkzeug rewinds its file containers, but this one is never read back.
+    """
+
+    def __init__(self, upload_id: str, path: str, max_size: int):
+        self.upload_id = upload_id
+        self.path = path
+        self.max_size = max_size
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        self._file = open(path, 'wb')
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadError('FILE_TOO_LARGE', f'Images are limited to {self.max_size} bytes', 413)
+        self.hasher.update(data)
+        return self._file.write(data)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self._file.flush()
+        return self.size
+
+    def close(self) -> None:
+        self._file.close()
+
+    def discard(self) -> None:
+        self.close()
+        _remove(self.path)
+
+
+class UploadSession:
+    """A resumable upload in progress"""
+
+    __slots__ = ('upload_id', 'user_id', 'length', 'offset', 'filename', 'metadata', 'created_at')
+
+    def __init__(self, upload_id: str, user_id: str, length: int, offset: int = 0,
+                 filename: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None,
+                 created_at: Optional[float] = None):
+        self.upload_id = upload_id
+        self.user_id = user_id
+        self.length = length
+        self.offset = offset
+        self.filename = filename
+        self.metadata = metadata
+        self.created_at = created_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'uploadId': self.upload_id,
+            'length': self.length,
+            'offset': self.offset,
+            'filename': self.filename,
+            'complete': self.offset == self.length
+        }
+
+
+class UploadStore:
+    """Incoming images and resumable sessions on disk, under directory/partial"""
+
+    def __init__(self, directory: str = DEFAULT_UPLOAD_DIR, max_size: int = 20 * 1024 * 1024,
+                 chunk_size: int = 64 * 1024, session_ttl: float = 24 * 3600, cached_hashers: int = 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.session_ttl = session_ttl
+        self.cached_hashers = cached_hashers
+        self.partial_directory = os.path.join(directory, 'partial')
+        # upload id -> (offset, running hash of the first offset bytes)
+        self._hashers: 'OrderedDict[str, Tuple[int, Any]]' = OrderedDict()
+        self._session_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'UploadStore':
+        """Configure from IMAGE_UPLOAD_DIR / IMAGE_UPLOAD_MAX_BYTES / IMAGE_UPLOAD_CHUNK_SIZE /
+        IMAGE_UPLOAD_SESSION_TTL"""
+        return cls(
+            directory=os.environ.get('IMAGE_UPLOAD_DIR', DEFAULT_UPLOAD_DIR),
+            max_size=int(os.environ.get('IMAGE_UPLOAD_MAX_BYTES', 20 * 1024 * 1024)),
+            chunk_size=int(os.environ.get('IMAGE_UPLOAD_CHUNK_SIZE', 64 * 1024)),
+            session_ttl=float(os.environ.get('IMAGE_UPLOAD_SESSION_TTL', 24 * 3600))
+        )
+
+    def _ensure_directories(self) -> None:
+        os.makedirs(self.partial_directory, exist_ok=True)
+
+    # One-request uploads
+
+    def open_writer(self) -> ImageWriter:
+        """Writer for an image received in one request; pass it to store() or discard() it"""
+        self._ensure_directories()
+        upload_id = str(uuid.uuid4())
+        return ImageWriter(upload_id, os.path.join(self.partial_directory, f'{upload_id}.incoming'), self.max_size)
+
+    def store(self, writer: ImageWriter) -> StoredImage:
+        """Validate a written image"""
+        writer.close()
+        return self._validate(writer.upload_id, writer.path, writer.size, writer.hasher.hexdigest())
+
+    def _validate(self, upload_id: str, path: str, size: int, sha256: str) -> StoredImage:
+        """The image at path, if it is a non-empty JPEG, PNG or WebP; else it is removed"""
+        if size == 0:
+            _remove(path)
+            raise UploadError('VALIDATION_ERROR', 'The image is empty')
+        with open(path, 'rb') as image_file:
+            image_type = sniff_image_type(image_file.read(12))
+        if image_type is None:
+            _remove(path)
+            raise UploadError('UNSUPPORTED_MEDIA_TYPE', 'Images must be JPEG, PNG or WebP', 415)
+        content_type, extension = image_type
+        return StoredImage(upload_id, path, size, sha256, content_type, extension)
+
+    # Resumable sessions
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.partial_directory, f'{upload_id}.part')
+
+    def _session_path(self, upload_id: str) -> str:
+        return os.path.join(self.partial_directory, f'{upload_id}.json')
+
+    def new_session(self, user_id: str, length: int, filename: Optional[str] = None,
+                    metadata: Optional[Dict[str, Any]] = None) -> UploadSession:
+        """Reserve an upload of length bytes"""
+        if length <= 0:
+            raise UploadError('VALIDATION_ERROR', 'Upload length must be a positive number of bytes')
+        if length > self.max_size:
+            raise UploadError('FILE_TOO_LARGE', f'Images are limited to {self.max_size} bytes', 413)
+        self._ensure_directories()
+        self.purge_expired()
+
+        session = UploadSession(str(uuid.uuid4()), user_id, length, filename=filename,
+                                metadata=metadata, created_at=time.time())
+        open(self._part_path(session.upload_id), 'wb').close()
+        with open(self._session_path(session.upload_id), 'w') as session_file:
+            json.dump({
+                'userId': session.user_id,
+                'length': session.length,
+                'filename': session.filename,
+                'metadata': session.metadata,
+                'createdAt': session.created_at
+            }, session_file)
+        return session
+
+    def get_session(self, upload_id: str) -> Optional[UploadSession]:
+        """The session with its current offset, or None if unknown, expired or completed"""
+        try:
+            uuid.UUID(upload_id)
+            with open(self._session_path(upload_id)) as session_file:
+                document = json.load(session_file)
+            offset = os.path.getsize(self._part_path(upload_id))
+        except (ValueError, OSError):
+            return None
+        return UploadSession(upload_id, document['userId'], document['length'], offset,
+                             document.get('filename'), document.get('metadata'), document.get('createdAt'))
+
+    def append(self, session: UploadSession, offset: int, read: Callable[[int], bytes]) -> int:
+        """Write the body read by read(n) at offset; returns the new offset.
+
+        offset must be the current offset of the session. If reading fails midway
+        (the client went away), the bytes received so far are kept and the client
+        resumes from the offset then reported.
+        """
+        with self._locked(session.upload_id) as part_file:
+            current = part_file.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadError('OFFSET_MISMATCH', f'Upload offset is {current}, not {offset}', 409)
+
+            hasher = self._hasher_at(session.upload_id, part_file, current)
+            remaining = session.length - current
+            try:
+                while True:
+                    data = read(min(self.chunk_size, remaining + 1))
+                    if not data:
+                        break
+                    if len(data) > remaining:
+                        raise UploadError('FILE_TOO_LARGE', 'The chunk goes past the upload length', 413)
+                    part_file.write(data)
+                    hasher.update(data)
+                    current += len(data)
+                    remaining -= len(data)
+            finally:
+                part_file.flush()
+                if part_file.tell() == current:
+                    self._cache_hasher(session.upload_id, current, hasher)
+                else:
+                    self._drop_hasher(session.upload_id)
+        session.offset = current
+        return current
+
+    def complete(self, session: UploadSession) -> StoredImage:
+        """Validate the image of a session whose bytes have all been received"""
+        with self._locked(session.upload_id) as part_file:
+            size = part_file.seek(0, os.SEEK_END)
+            if size != session.length:
+                raise UploadError('UPLOAD_INCOMPLETE', f'{size} of {session.length} bytes received', 409)
+            sha256 = self._hasher_at(session.upload_id, part_file, size).hexdigest()
+            try:
+                return self._validate(session.upload_id, self._part_path(session.upload_id), size, sha256)
+            finally:
+                # Kept or rejected, the session is over
+                self._forget(session.upload_id)
+
+    def discard(self, upload_id: str) -> None:
+        """Abandon a session and its bytes"""
+        with self._locked(upload_id):
+            self._forget(upload_id)
+            _remove(self._part_path(upload_id))
+
+    def purge_expired(self) -> int:
+        """Remove sessions idle for longer than session_ttl; returns how many"""
+        cutoff = time.time() - self.session_ttl
+        purged = 0
+        try:
+            names = os.listdir(self.partial_directory)
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.partial_directory, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+            except OSError:
+                continue
+            if name.endswith('.part'):
+                self._forget(name[:-len('.part')])
+                purged += 1
+            elif not name.endswith('.incoming'):
+                continue
+            _remove(path)
+        return purged
+
+    def _forget(self, upload_id: str) -> None:
+        self._drop_hasher(upload_id)
+        _remove(self._session_path(upload_id))
+        with self._lock:
+            self._session_locks.pop(upload_id, None)
+
+    def _locked(self, upload_id: str):
+        path = self._part_path(upload_id)
+        with self._lock:
+            # No lock entry for unknown or removed sessions, they would never be forgotten
+            if not os.path.exists(path):
+                self._session_locks.pop(upload_id, None)
+                raise UploadError('UPLOAD_NOT_FOUND', 'Upload not found or expired', 404)
+            lock = self._session_locks.setdefault(upload_id, threading.Lock())
+        return _SessionFile(path, lock, lambda: self._drop_lock(upload_id, lock))
+
+    def _drop_lock(self, upload_id: str, lock: threading.Lock) -> None:
+        with self._lock:
+            if self._session_locks.get(upload_id) is lock:
+                del self._session_locks[upload_id]
+
+    # Running hashes
+
+    def _hasher_at(self, upload_id: str, part_file, offset: int):
+        """Hash of the first offset bytes of the part file: cached, or computed from disk"""
+        with self._lock:
+            cached = self._hashers.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+        # The previous chunk went to another worker (or this one restarted)
+        hasher = hashlib.sha256()
+        part_file.seek(0)
+        remaining = offset
+        while remaining:
+            data = part_file.read(min(self.chunk_size, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+        part_file.seek(offset)
+        return hasher
+
+    def _cache_hasher(self, upload_id: str, offset: int, hasher) -> None:
+        with self._lock:
+            self._hashers[upload_id] = (offset, hasher)
+            self._hashers.move_to_end(upload_id)
+            while len(self._hashers) > self.cached_hashers:
+                self._hashers.popitem(last=False)
+
+    def _drop_hasher(self, upload_id: str) -> None:
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'maxSize': self.max_size,
+                'chunkSize': self.chunk_size,
+                'cachedHashers': len(self._hashers),
+                'sessionLocks': len(self._session_locks)
+            }
+
+
+class _SessionFile:
+    """Context manager opening a session's part file under its thread lock and,
+    on POSIX, an exclusive file lock shared with the other workers"""
+
+    def __init__(self, path: str, lock: threading.Lock, on_missing: Callable[[], None]):
+        self.path = path
+        self.lock = lock
+        self.on_missing = on_missing
+        self.file = None
+
+    def __enter__(self):
+        if not self.lock.acquire(blocking=False):
+            raise UploadError('UPLOAD_BUSY', 'Another request is writing to this upload', 409)
+        try:
+            self.file = open(self.path, 'r+b')
+        except FileNotFoundError:
+            # Removed since _locked() looked
+            self.lock.release()
+            self.on_missing()
+            raise UploadError('UPLOAD_NOT_FOUND', 'Upload not found or expired', 404)
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.file.close()
+                self.lock.release()
+                raise UploadError('UPLOAD_BUSY', 'Another request is writing to this upload', 409)
+        return self.file
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+        self.lock.release()
+        return False
+
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# Image uploads of this worker (routes/images.py)
+upload_store = UploadStore.from_env()